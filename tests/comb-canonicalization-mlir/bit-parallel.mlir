@@ -0,0 +1,41 @@
+// RUN: verify-pdl "%s" -opt -bit-parallel -max-bitwidth 4 | filecheck "%s"
+
+// Patterns of bitwise operations are only verified on one bit
+
+// and(x, x) -> x
+pdl.pattern @AndSame : benefit(0) {
+    %t = pdl.type : !transfer.integer
+    %x = pdl.operand : %t
+
+    %and_op = pdl.operation "comb.and"(%x, %x : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+
+    pdl.rewrite %and_op {
+        pdl.replace %and_op with (%x : !pdl.value)
+    }
+}
+
+// CHECK:      Verifying pattern AndSame:
+// CHECK-NEXT: with types (1,) and all larger bitwidths: SOUND
+
+// add(x, 0) -> x
+pdl.pattern @AddZero : benefit(0) {
+    %t = pdl.type : !transfer.integer
+    %x = pdl.operand : %t
+
+    %zero_attr = pdl.apply_native_rewrite "get_zero_attr"(%t : !pdl.type) : !pdl.attribute
+    %zero_op = pdl.operation "hw.constant" {"value" = %zero_attr} -> (%t : !pdl.type)
+    %zero = pdl.result 0 of %zero_op
+
+    %add_op = pdl.operation "comb.add"(%x, %zero : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+
+    pdl.rewrite %add_op {
+        pdl.replace %add_op with (%x : !pdl.value)
+    }
+}
+
+// CHECK-NEXT: Verifying pattern AddZero:
+// CHECK-NEXT: with types (1,): SOUND
+// CHECK-NEXT: with types (2,): SOUND
+// CHECK-NEXT: with types (3,): SOUND
+// CHECK-NEXT: with types (4,): SOUND
+// CHECK-NEXT: All patterns are sound
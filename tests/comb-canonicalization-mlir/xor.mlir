@@ -1,4 +1,5 @@
 // RUN: verify-pdl "%s" -opt | filecheck "%s"
+// RUN: verify-pdl "%s" -opt -workers 2 | filecheck "%s"
 
 // extracts only of xor(...) -> xor(extract()...)
 
@@ -1,4 +1,5 @@
 // RUN: xdsl-smt-run %s --args="false,false,true" | FileCheck %s
+// RUN: xdsl-smt-run %s --compile --args="false,false,true" | FileCheck %s
 
 func.func @main(%cond : !smt.bool, %then : !smt.bool, %else : !smt.bool) -> !smt.bool {
   %r = "smt.ite"(%cond, %then, %else) : (!smt.bool, !smt.bool, !smt.bool) -> !smt.bool
@@ -0,0 +1,19 @@
+from typing import Callable
+
+import pytest
+
+from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult
+
+SetBitwidths = Callable[[set[int], set[int], set[int]], None]
+
+
+@pytest.fixture
+def eval_bitwidths(monkeypatch: pytest.MonkeyPatch) -> SetBitwidths:
+    "Sets the low, med and high bitwidths of EvalResult for the test only"
+
+    def set_bitwidths(lbws: set[int], mbws: set[int], hbws: set[int]) -> None:
+        monkeypatch.setattr(EvalResult, "lbws", lbws)
+        monkeypatch.setattr(EvalResult, "mbws", mbws)
+        monkeypatch.setattr(EvalResult, "hbws", hbws)
+
+    return set_bitwidths
@@ -0,0 +1,52 @@
+import itertools
+
+from xdsl.builder import Builder
+from xdsl.dialects.builtin import IntegerAttr, ModuleOp
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects import smt_dialect as smt
+from xdsl_smt.interpreters.compiled import build_compiled, interpret_compiled
+from xdsl_smt.interpreters.vectorized import (
+    all_inputs,
+    build_vectorized,
+    interpret_vectorized,
+)
+
+
+def program() -> ModuleOp:
+    # x sdiv y, x smod y, ashr x y, and x <s y, on 4 bits
+    ty = bv.BitVectorType(4)
+    func = FuncOp("main", ([ty, ty], [ty, ty, ty, smt.BoolType()]))
+    builder = Builder(InsertPoint.at_end(func.body.block))
+    x, y = func.body.block.args
+    sdiv = builder.insert(bv.SDivOp(x, y)).res
+    smod = builder.insert(bv.SModOp(x, y)).res
+    ashr = builder.insert(bv.AShrOp(x, y)).res
+    slt = builder.insert(bv.SltOp(x, y)).res
+    builder.insert(ReturnOp(sdiv, smod, ashr, slt))
+    return ModuleOp([func])
+
+
+def test_compiled_vectorized():
+    module = program()
+    function = build_compiled(module)
+    # Compiled functions are cached on the module
+    assert build_compiled(module) is function
+
+    inputs = all_inputs([bv.BitVectorType(4)] * 2)
+    expected = interpret_vectorized(build_vectorized(module), inputs)
+    for i, (lhs, rhs) in enumerate(itertools.product(range(16), range(16))):
+        assert function(lhs, rhs) == tuple(values[i] for values in expected)
+
+
+def test_interpret_compiled():
+    function = build_compiled(program())
+    arguments = [IntegerAttr.from_int_and_width(v, 4) for v in (-7, 2)]
+    assert interpret_compiled(function, arguments) == (
+        bv.BitVectorAttr(13, bv.BitVectorType(4)),
+        bv.BitVectorAttr(1, bv.BitVectorType(4)),
+        bv.BitVectorAttr(14, bv.BitVectorType(4)),
+        True,
+    )
@@ -0,0 +1,184 @@
+from pathlib import Path
+
+from xdsl.builder import Builder
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Block, Region, SSAValue
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects.smt_dialect import (
+    AssertOp,
+    BoolType,
+    CheckSatOp,
+    DeclareConstOp,
+    DistinctOp,
+    EqOp,
+    EvalOp,
+    ForallOp,
+    ImpliesOp,
+    NotOp,
+    YieldOp,
+)
+from xdsl_smt.dialects.smt_utils_dialect import FirstOp, PairOp
+from xdsl_smt.utils.dialect_to_z3 import (
+    BITBLAST_TACTIC,
+    DEFAULT_PORTFOLIO,
+    SolverSettings,
+    Z3Solver,
+    configure_solver,
+    get_solver,
+)
+from xdsl_smt.utils.solver_cache import SolverCache
+
+
+def script(valid: bool) -> ModuleOp:
+    """
+    Check that x + x == x * 2, and that the first element of (x, b) is x for
+    all b, or a satisfiable variant of these if valid is not set.
+    """
+    module = ModuleOp([])
+    builder = Builder(InsertPoint.at_end(module.body.block))
+
+    x = builder.insert(DeclareConstOp(bv.BitVectorType(8))).res
+    add = builder.insert(bv.AddOp(x, x)).res
+    two = builder.insert(bv.ConstantOp(2, 8)).res
+    mul = builder.insert(bv.MulOp(x, two)).res
+    cmp = DistinctOp(add, mul) if valid else EqOp(add, mul)
+    builder.insert(AssertOp(builder.insert(cmp).res))
+
+    forall = builder.insert(
+        ForallOp.from_variables([BoolType()], Region(Block(arg_types=[BoolType()])))
+    )
+    body = Builder(InsertPoint.at_end(forall.body.block))
+    pair = body.insert(PairOp(x, forall.body.block.args[0])).res
+    first = body.insert(FirstOp(pair)).res
+    eq = body.insert(bv.UleOp(first, x) if valid else DistinctOp(first, x)).res
+    body.insert(YieldOp(eq))
+    builder.insert(AssertOp(builder.insert(NotOp(forall.res)).res))
+
+    builder.insert(CheckSatOp())
+    return module
+
+
+def test_check_script():
+    solver = Z3Solver()
+    # The solver is reused, each script is checked in a scope of its own
+    for _ in range(2):
+        assert solver.is_unsat(script(True))
+        assert not solver.is_unsat(script(False))
+    assert len(solver.solver.assertions()) == 0
+
+
+def test_check_assumptions():
+    module = ModuleOp([])
+    builder = Builder(InsertPoint.at_end(module.body.block))
+
+    x = builder.insert(DeclareConstOp(bv.BitVectorType(8))).res
+    add = builder.insert(bv.AddOp(x, x)).res
+    two = builder.insert(bv.ConstantOp(2, 8)).res
+    mul = builder.insert(bv.MulOp(x, two)).res
+    assumptions = [builder.insert(DeclareConstOp(BoolType())).res for _ in range(3)]
+    for assumption, cmp in zip(assumptions, [DistinctOp(add, mul), EqOp(add, mul)]):
+        implies = builder.insert(ImpliesOp(assumption, builder.insert(cmp).res))
+        builder.insert(AssertOp(implies.result))
+
+    solver = Z3Solver()
+    # Each assumption only enables its own assertion, the last one none
+    assert solver.is_unsat_under(module, assumptions) == [True, False, False]
+    assert len(solver.solver.assertions()) == 0
+
+
+def model_script() -> tuple[ModuleOp, list[SSAValue]]:
+    module = ModuleOp([])
+    builder = Builder(InsertPoint.at_end(module.body.block))
+
+    x = builder.insert(DeclareConstOp(bv.BitVectorType(8))).res
+    two = builder.insert(bv.ConstantOp(2, 8)).res
+    mul = builder.insert(bv.MulOp(x, two)).res
+    six = builder.insert(bv.ConstantOp(6, 8)).res
+    b = builder.insert(DeclareConstOp(BoolType())).res
+    builder.insert(EvalOp(builder.insert(PairOp(x, b)).res))
+    assumptions = [builder.insert(DeclareConstOp(BoolType())).res for _ in range(2)]
+    for assumption, cmp in zip(assumptions, [EqOp(mul, six), NotOp(b)]):
+        implies = builder.insert(ImpliesOp(assumption, builder.insert(cmp).res))
+        builder.insert(AssertOp(implies.result))
+    builder.insert(AssertOp(builder.insert(bv.UltOp(x, six)).res))
+    builder.insert(AssertOp(builder.insert(EqOp(mul, x)).res))
+    return module, assumptions
+
+
+def test_check_assumptions_model():
+    module, assumptions = model_script()
+    solver = Z3Solver()
+    # x * 2 == x only holds for x == 0 below 6, and 0 * 2 != 6
+    (first, second) = solver.check_unsat_under(module, assumptions)
+    assert first == (True, [])
+    assert second == (False, [(0, False)])
+
+
+def test_solver_cache(tmp_path: Path):
+    module, assumptions = model_script()
+    cache = SolverCache(tmp_path)
+    for solver in [Z3Solver(cache), Z3Solver(cache)]:
+        assert solver.is_unsat(script(True))
+        assert not solver.is_unsat(script(False))
+        assert solver.check_unsat_under(module, assumptions) == [
+            (True, []),
+            (False, [(0, False)]),
+        ]
+    assert (cache.hits, cache.misses) == (3, 3)
+
+    # Options are part of the key
+    solver = Z3Solver(cache)
+    solver.set_option("timeout", 10000)
+    assert solver.is_unsat(script(True))
+    assert cache.misses == 4
+
+
+def test_solver_portfolio():
+    module, assumptions = model_script()
+    solver = Z3Solver(settings=SolverSettings(portfolio=DEFAULT_PORTFOLIO))
+    for _ in range(2):
+        assert solver.check_unsat(script(True)) is True
+        assert solver.check_unsat(script(False)) is False
+    (first, second) = solver.check_unsat_under(module, assumptions)
+    assert first == (True, [])
+    assert second == (False, [(0, False)])
+    assert len(solver.solver.assertions()) == 0
+
+
+def test_bitblast_solver():
+    module, assumptions = model_script()
+    solver = Z3Solver(settings=SolverSettings(tactic=BITBLAST_TACTIC))
+    (first, second) = solver.check_unsat_under(module, assumptions)
+    assert first == (True, [])
+    assert second == (False, [(0, False)])
+
+    configure_solver(SolverSettings(bitblast_max_width=8))
+    try:
+        assert get_solver(8).settings.tactic == BITBLAST_TACTIC
+        assert get_solver(9) is get_solver()
+        assert get_solver().settings.tactic is None
+    finally:
+        configure_solver(SolverSettings())
+
+
+def test_solver_timeout():
+    # Factoring a 128 bits semiprime does not finish in the time limit
+    module = ModuleOp([])
+    builder = Builder(InsertPoint.at_end(module.body.block))
+    x = builder.insert(DeclareConstOp(bv.BitVectorType(128))).res
+    y = builder.insert(DeclareConstOp(bv.BitVectorType(128))).res
+    semiprime = (2**64 - 59) * (2**64 - 83)
+    c = builder.insert(bv.ConstantOp(semiprime, 128)).res
+    one = builder.insert(bv.ConstantOp(1, 128)).res
+    mul = builder.insert(bv.MulOp(x, y)).res
+    builder.insert(AssertOp(builder.insert(EqOp(mul, c)).res))
+    builder.insert(AssertOp(builder.insert(DistinctOp(x, one)).res))
+    builder.insert(AssertOp(builder.insert(DistinctOp(y, one)).res))
+    builder.insert(CheckSatOp())
+
+    for portfolio in [(), DEFAULT_PORTFOLIO]:
+        solver = Z3Solver(settings=SolverSettings(100, portfolio=portfolio))
+        assert solver.check_unsat(module) is None
+        assert not solver.is_unsat(module)
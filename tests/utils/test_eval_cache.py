@@ -0,0 +1,112 @@
+import logging
+from typing import Callable
+
+from xdsl.builder import Builder
+from xdsl.dialects.arith import AddiOp, MuliOp, SubiOp
+from xdsl.dialects.builtin import i32
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult, PerBitRes
+from xdsl_smt.utils.synthesizer_utils.eval_cache import EvalCache
+from xdsl_smt.utils.synthesizer_utils.function_with_condition import (
+    FunctionWithCondition,
+)
+from xdsl_smt.utils.synthesizer_utils.solution_set import UnsizedSolutionSet
+from xdsl_smt.utils.synthesizer_utils.verifier_utils import Counterexample
+
+
+def candidate(op_type: type[AddiOp | SubiOp | MuliOp], name: str = "f"):
+    func = FuncOp(name, ([i32, i32], [i32]))
+    builder = Builder(InsertPoint.at_end(func.body.block))
+    lhs, rhs = func.body.block.args
+    builder.insert(ReturnOp(builder.insert(op_type(lhs, rhs)).result))
+    return FunctionWithCondition(func)
+
+
+def result(dist: float) -> EvalResult:
+    return EvalResult([PerBitRes(4, 4, 4, 0, dist, dist, 4, 0, dist)])
+
+
+def no_dce(func: FuncOp) -> FuncOp:
+    return func
+
+
+def test_eval_cache_lru():
+    cache = EvalCache("data", no_dce, capacity=2)
+    fingerprint = cache.fingerprint([candidate(SubiOp)])
+    add, sub, mul = candidate(AddiOp), candidate(SubiOp), candidate(MuliOp)
+
+    # Names do not matter, only the canonical program does
+    assert cache.key(candidate(AddiOp, "g"), fingerprint) == cache.key(add, fingerprint)
+    for i, c in enumerate([add, sub]):
+        cache.put(cache.key(c, fingerprint), result(i))
+    # A hit makes add the most recently used, so sub is evicted
+    assert cache.get(cache.key(add, fingerprint)) is not None
+    cache.put(cache.key(mul, fingerprint), result(2))
+    assert cache.get(cache.key(sub, fingerprint)) is None
+    assert cache.get(cache.key(add, fingerprint)) is not None
+    assert cache.get(cache.key(mul, fingerprint)) is not None
+    assert len(cache.results) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_eval_cache_keys():
+    cache = EvalCache("data", no_dce)
+    add = candidate(AddiOp)
+    fingerprint = cache.fingerprint([candidate(SubiOp)])
+    cache.put(cache.key(add, fingerprint), result(0))
+
+    # The order of the solutions does not matter, but their set does
+    both = [candidate(SubiOp), candidate(MuliOp)]
+    assert cache.fingerprint(both) == cache.fingerprint(both[::-1])
+    assert cache.get(cache.key(add, cache.fingerprint(both))) is None
+    assert cache.get(cache.key(add, cache.fingerprint([]))) is None
+    other_dir = EvalCache("other", no_dce)
+    other_dir.results = cache.results
+    assert other_dir.get(other_dir.key(add, fingerprint)) is None
+    assert cache.get(cache.key(add, fingerprint)) is not None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_eval_cache_invalidation(
+    eval_bitwidths: Callable[[set[int], set[int], set[int]], None]
+):
+    eval_bitwidths({4}, set(), {8})
+    evaluated: list[int] = []
+    counterexamples: list[Counterexample] = []
+
+    def eval_func(
+        transfers: list[FunctionWithCondition],
+        solutions: list[FunctionWithCondition],
+    ) -> list[EvalResult]:
+        evaluated.append(len(transfers))
+        return [result(i) for i in range(max(len(transfers), 1))]
+
+    cache = EvalCache("data", no_dce)
+    solution_set = UnsizedSolutionSet(
+        [],
+        lambda func: "",
+        eval_func,
+        lambda solutions, samples, seed: None,
+        logging.getLogger(__name__),
+        no_dce,
+        eval_cache=cache,
+        counterexample_func=counterexamples.extend,
+    )
+    candidates = [candidate(AddiOp), candidate(SubiOp)]
+    solution_set.eval_improve(candidates)
+    solution_set.eval_improve(candidates)
+    assert evaluated == [2]
+
+    # Counterexamples at low bitwidths are already in the test vectors
+    solution_set.add_counterexamples([Counterexample(4, [[0, 1]], [2])])
+    solution_set.eval_improve(candidates)
+    assert evaluated == [2]
+
+    # New test vectors invalidate all results
+    cex = Counterexample(8, [[0, 1]], [2])
+    solution_set.add_counterexamples([cex])
+    assert counterexamples == [cex]
+    solution_set.eval_improve(candidates)
+    assert evaluated == [2, 2]
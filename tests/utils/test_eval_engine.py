@@ -0,0 +1,62 @@
+import json
+import sys
+from pathlib import Path
+
+from xdsl_smt.eval_engine.eval import AbstractDomain, EvalEngine
+
+FAKE_ENGINE = """\
+import json, sys
+
+log = open(sys.argv[1], "a")
+while header := sys.stdin.buffer.readline():
+    cmd, length = header.split()
+    payload = sys.stdin.buffer.read(int(length)).decode()
+    if cmd == b"quit":
+        break
+    log.write(json.dumps([cmd.decode(), payload]) + "\\n")
+    log.flush()
+    sys.stdout.buffer.write(b"ok 0\\n")
+    sys.stdout.buffer.flush()
+"""
+
+
+def fake_engine(tmp_path: Path) -> tuple[Path, Path]:
+    "An engine answering every request with an empty response, and its log"
+    script, log = tmp_path / "fake_engine.py", tmp_path / "requests.jsonl"
+    script.write_text(FAKE_ENGINE)
+    engine_path = tmp_path / "eval_engine"
+    engine_path.write_text(f'#!/bin/sh\nexec {sys.executable} {script} {log} "$@"\n')
+    engine_path.chmod(0o755)
+    return engine_path, log
+
+
+def test_eval_engine_helpers(tmp_path: Path):
+    engine_path, log = fake_engine(tmp_path)
+    engine = EvalEngine(engine_path)
+    xfer = [("xfer", "int xfer();")]
+    base = [("base", "int base();")]
+    try:
+        engine.eval_units("data", AbstractDomain.KnownBits, xfer, base, "helpers 0")
+        engine.eval_units("data", AbstractDomain.KnownBits, xfer, base, "helpers 0")
+        # Same data dir and units, but new helpers
+        engine.eval_units("data", AbstractDomain.KnownBits, xfer, base, "helpers 1")
+    finally:
+        engine.close()
+
+    requests = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [cmd for cmd, _ in requests] == [
+        "helpers",
+        "compile",
+        "eval-units",
+        "eval-units",
+        "helpers",
+        "compile",
+        "eval-units",
+    ]
+    evals = [payload.splitlines() for cmd, payload in requests if cmd == "eval-units"]
+    # The engine keeps the state of the base units by their keys, so the units
+    # compiled against the new helpers must not reuse the old keys
+    assert evals[0] == evals[1]
+    assert evals[0][0] == evals[2][0] == "data"
+    assert evals[0][2] != evals[2][2]
+    assert evals[0][3] != evals[2][3]
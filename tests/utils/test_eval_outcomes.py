@@ -0,0 +1,115 @@
+from typing import Callable
+
+import numpy as np
+
+from xdsl_smt.utils.synthesizer_utils.compare_result import PerBitRes
+from xdsl_smt.utils.synthesizer_utils.eval_outcomes import EvalOutcomes
+
+T, F = True, False
+
+
+def bits(*rows: list[bool]):
+    return np.packbits(np.array(rows, np.bool_), axis=-1, bitorder="little")
+
+
+def outcomes() -> EvalOutcomes:
+    # Three inputs of bitwidth 4, then two of bitwidth 8
+    return EvalOutcomes(
+        [4, 8],
+        [0, 3, 5],
+        [False, False],
+        bits([T, F, F, T, F])[0],
+        np.array([0, 2, 1, 0, 3], np.float64),
+        bits([T, T, F, T, F], [T, T, T, T, T], [F, F, F, F, F]),
+        bits([T, F, F, T, F], [T, T, F, T, F], [F, F, F, F, F]),
+        np.array([[0, 1, 2, 0, 3], [0, 0, 1, 0, 1], [4, 4, 4, 4, 4]], np.float64),
+    )
+
+
+def test_eval_outcomes_unpack():
+    outs = outcomes()
+    assert outs.num_candidates == 3
+    assert outs.num_inputs == 5
+    assert outs.solved.tolist() == [0b01001]
+    assert outs.unpack(outs.solved).tolist() == [T, F, F, T, F]
+    assert outs.unpack(outs.sound).tolist() == [
+        [T, T, F, T, F],
+        [T, T, T, T, T],
+        [F, F, F, F, F],
+    ]
+    assert outs.count(outs.exact).tolist() == [2, 3, 0]
+    assert outs.unpack(outs.mask({8})).tolist() == [F, F, F, T, T]
+    assert outs.sound_dist[0].tolist() == [0, 1, 1, 0, 3]
+
+
+def test_eval_outcomes_get_result(
+    eval_bitwidths: Callable[[set[int], set[int], set[int]], None]
+):
+    eval_bitwidths({4}, set(), {8})
+    outs = outcomes()
+    assert outs.get_unsolved_cases() == 2
+
+    res = outs.get_result(0)
+    assert [vars(r) for r in res.per_bit_res] == [
+        vars(PerBitRes(3, 4, 2, 1, 3, 3, 2, 0, 2)),
+        vars(PerBitRes(2, 8, 1, 1, 3, 3, 1, 0, 3)),
+    ]
+    assert res.get_exacts() == 1
+    assert res.get_unsolved_cases() == 2
+    assert res.get_potential_improve() == 1 / 6
+
+    res = outs.get_result(1)
+    assert [vars(r) for r in res.per_bit_res] == [
+        vars(PerBitRes(3, 4, 3, 2, 1, 3, 2, 1, 1)),
+        vars(PerBitRes(2, 8, 2, 1, 1, 3, 1, 0, 1)),
+    ]
+    assert res.get_new_exact_prop() == 1 / 3
+    assert outs.get_improve().tolist() == [1, 4, 0]
+
+
+def test_eval_outcomes_merge():
+    outs = outcomes()
+    indices = [[2, 0], [1]]
+    shards = [
+        EvalOutcomes(
+            outs.bitwidths,
+            outs.offsets,
+            outs.cex,
+            outs.solved,
+            outs.base_dist,
+            outs.sound[index],
+            outs.exact[index],
+            outs.dist[index],
+        )
+        for index in indices
+    ]
+    merged = EvalOutcomes.merge(shards, indices, 3)
+    assert merged.bitwidths == outs.bitwidths
+    assert merged.offsets == outs.offsets
+    assert merged.cex == outs.cex
+    assert merged.solved.tolist() == outs.solved.tolist()
+    assert merged.base_dist.tolist() == outs.base_dist.tolist()
+    assert merged.sound.tolist() == outs.sound.tolist()
+    assert merged.exact.tolist() == outs.exact.tolist()
+    assert merged.dist.tolist() == outs.dist.tolist()
+
+
+def test_eval_outcomes_cex(
+    eval_bitwidths: Callable[[set[int], set[int], set[int]], None]
+):
+    eval_bitwidths({4, 8}, set(), set())
+    # The same inputs, but the bitwidth 8 ones are counterexamples
+    outs = outcomes()
+    outs.cex = [False, True]
+    assert outs.unpack(outs.low_med_mask()).tolist() == [T, T, T, F, F]
+    assert outs.unpack(outs.mask({8})).tolist() == [F, F, F, F, F]
+    assert outs.get_unsolved_cases() == 2
+
+    res = outs.get_result(1)
+    assert [r.cex for r in res.per_bit_res] == [False, True]
+    assert res.get_exacts() == 2
+    assert res.get_unsolved_cases() == 2
+    assert res.get_new_exact_prop() == 1 / 3
+    # Counterexamples still count towards soundness
+    assert res.get_sound_prop() == 1
+    assert outs.get_result(0).get_sound_prop() == 3 / 5
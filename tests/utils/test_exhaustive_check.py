@@ -0,0 +1,58 @@
+from xdsl.builder import Builder
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import SSAValue
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects import smt_dialect as smt
+from xdsl_smt.dialects.smt_utils_dialect import PairOp
+from xdsl_smt.utils.dialect_to_z3 import Z3Solver
+from xdsl_smt.utils.exhaustive_check import check_unsat_under_exhaustive
+
+
+def script(width: int) -> tuple[ModuleOp, list[SSAValue]]:
+    """
+    x + y == 5 with an unused poison flag on y, and under each assumption
+    x == 7, x != x, and x <= y
+    """
+    module = ModuleOp([])
+    builder = Builder(InsertPoint.at_end(module.body.block))
+    ty = bv.BitVectorType(width)
+    x = builder.insert(smt.DeclareConstOp(ty)).res
+    y = builder.insert(smt.DeclareConstOp(ty)).res
+    poison = builder.insert(smt.DeclareConstOp(smt.BoolType())).res
+    sum_ = builder.insert(bv.AddOp(x, y)).res
+    five = builder.insert(bv.ConstantOp(5, width)).res
+    builder.insert(smt.AssertOp(builder.insert(smt.EqOp(sum_, five)).res))
+    builder.insert(smt.EvalOp(x))
+    builder.insert(smt.EvalOp(builder.insert(PairOp(y, poison)).res))
+
+    seven = builder.insert(bv.ConstantOp(7, width)).res
+    violations = [
+        smt.EqOp(x, seven),
+        smt.DistinctOp(x, x),
+        bv.UleOp(x, y),
+    ]
+    assumptions: list[SSAValue] = []
+    for violation in violations:
+        assumption = builder.insert(smt.DeclareConstOp(smt.BoolType())).res
+        implies = smt.ImpliesOp(assumption, builder.insert(violation).res)
+        builder.insert(smt.AssertOp(builder.insert(implies).result))
+        assumptions.append(assumption)
+    return module, assumptions
+
+
+def test_exhaustive_check():
+    module, assumptions = script(3)
+    results = check_unsat_under_exhaustive(module, assumptions)
+    assert results is not None
+    assert [sound for sound, _ in results] == [
+        sound for sound, _ in Z3Solver().check_unsat_under(module, assumptions)
+    ]
+    # The first input in order, with the poison flag left out of the enumeration
+    assert results == [(False, [7, (6, False)]), (True, []), (False, [0, (5, False)])]
+
+
+def test_exhaustive_check_too_large():
+    module, assumptions = script(32)
+    assert check_unsat_under_exhaustive(module, assumptions) is None
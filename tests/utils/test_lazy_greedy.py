@@ -0,0 +1,159 @@
+import numpy as np
+import numpy.typing as npt
+
+from xdsl.builder import Builder
+from xdsl.dialects.arith import AddiOp
+from xdsl.dialects.builtin import i32
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.utils.synthesizer_utils.eval_outcomes import EvalOutcomes
+from xdsl_smt.utils.synthesizer_utils.function_with_condition import (
+    FunctionWithCondition,
+)
+from xdsl_smt.utils.synthesizer_utils.lazy_greedy import LazyGreedySelection
+
+WIDTH = 4
+
+
+class Coverage:
+    """
+    A KnownBits-like domain, in which every candidate knows a set of bits of
+    the result on each test vector, and the meet knows the union of them.
+    """
+
+    known: dict[int, npt.NDArray[np.int64]]
+    "The bits known by each candidate (by id) on each test vector"
+
+    evaluated: int
+    "The number of candidates evaluated so far"
+
+    def __init__(self, known: list[list[int]]):
+        self.candidates = [candidate(f"candidate_{i}") for i in range(len(known))]
+        self.known = {
+            id(cand): np.array(row) for cand, row in zip(self.candidates, known)
+        }
+        self.evaluated = 0
+
+    def outcomes(
+        self,
+        transfers: list[FunctionWithCondition],
+        solutions: list[FunctionWithCondition],
+    ) -> EvalOutcomes:
+        self.evaluated += len(transfers)
+        num_inputs = len(next(iter(self.known.values())))
+        base = np.zeros(num_inputs, np.int64)
+        for sol in solutions:
+            base |= self.known[id(sol)]
+        known = np.array(
+            [self.known[id(f)] | base for f in transfers], np.int64
+        ).reshape(len(transfers), num_inputs)
+        dist = (WIDTH - np.bitwise_count(known)).astype(np.float64)
+        base_dist = (WIDTH - np.bitwise_count(base)).astype(np.float64)
+        return EvalOutcomes(
+            [WIDTH],
+            [0, num_inputs],
+            [False],
+            np.packbits(base_dist == 0, bitorder="little"),
+            base_dist,
+            np.packbits(np.ones_like(known, np.bool_), axis=-1, bitorder="little"),
+            np.packbits(dist == 0, axis=-1, bitorder="little"),
+            dist,
+        )
+
+
+def candidate(name: str) -> FunctionWithCondition:
+    func = FuncOp(name, ([i32, i32], [i32]))
+    builder = Builder(InsertPoint.at_end(func.body.block))
+    lhs, rhs = func.body.block.args
+    builder.insert(ReturnOp(builder.insert(AddiOp(lhs, rhs)).result))
+    fc = FunctionWithCondition(func)
+    fc.set_func_name(name)
+    return fc
+
+
+def plain_greedy(domain: Coverage) -> list[int]:
+    "The picks of construct_new_solution_set without an outcomes_func"
+    candidates = list(domain.candidates)
+    solutions: list[FunctionWithCondition] = []
+    while candidates:
+        outcomes = domain.outcomes(candidates, solutions)
+        if outcomes.base_dist.sum() == 0:
+            break
+        results = [outcomes.get_result(i) for i in range(len(candidates))]
+        cand, res = max(
+            zip(candidates, results), key=lambda x: x[1].get_potential_improve()
+        )
+        if res.get_potential_improve() == 0:
+            break
+        candidates.remove(cand)
+        solutions.append(cand)
+    return [domain.candidates.index(sol) for sol in solutions]
+
+
+def lazy_greedy(domain: Coverage) -> list[int]:
+    candidates = list(domain.candidates)
+    greedy = LazyGreedySelection(domain.outcomes, candidates, batch_size=2)
+    while candidates:
+        picked = greedy.pick(candidates)
+        if picked is None:
+            break
+        cand, res = picked
+        if res.get_potential_improve() == 0:
+            break
+        candidates.remove(cand)
+        greedy.add(cand)
+    return [domain.candidates.index(sol) for sol in greedy.solutions]
+
+
+def test_lazy_greedy_matches_plain_greedy():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        known = rng.integers(0, 1 << WIDTH, (12, 8)) & rng.integers(
+            0, 1 << WIDTH, (12, 8)
+        )
+        domain = Coverage(known.tolist())
+        expected = plain_greedy(domain)
+        plain_evaluated, domain.evaluated = domain.evaluated, 0
+        assert lazy_greedy(domain) == expected
+        assert domain.evaluated <= plain_evaluated
+
+
+def test_lazy_greedy_pick():
+    domain = Coverage([[0b0011, 0b0000], [0b0011, 0b0001], [0b1100, 0b1111]])
+    first, second, third = domain.candidates
+    greedy = LazyGreedySelection(domain.outcomes, domain.candidates)
+    assert domain.evaluated == 3
+    assert all(greedy.may_improve(cand) for cand in domain.candidates)
+
+    picked = greedy.pick(domain.candidates)
+    assert picked is not None
+    assert picked[0] is third
+    assert picked[1].get_base_dist() == 8
+    assert picked[1].get_sound_dist() == 2
+    greedy.add(third)
+    assert greedy.solutions == [third]
+    assert greedy.dist.tolist() == [2, 0]
+
+    # Only the bits third leaves unknown can still be improved on
+    picked = greedy.pick([first, second])
+    assert picked is not None
+    assert picked[0] is first
+    assert picked[1].get_sound_dist() == 0
+    greedy.add(first)
+    assert not greedy.may_improve(second)
+    assert greedy.pick([second]) is None
+    assert greedy.pick([]) is None
+
+
+def test_lazy_greedy_skips_bounded_candidates():
+    # The bound of the useless candidates is their improvement over top, which
+    # the first pick's improvement beats, so they are never evaluated again
+    domain = Coverage([[0b1111, 0b1111]] + [[0b0001, 0b0000]] * 8)
+    greedy = LazyGreedySelection(domain.outcomes, domain.candidates, batch_size=1)
+    domain.evaluated = 0
+    picked = greedy.pick(domain.candidates)
+    assert picked is not None and picked[0] is domain.candidates[0]
+    assert domain.evaluated == 1
+    greedy.add(picked[0])
+    assert not any(greedy.may_improve(cand) for cand in domain.candidates[1:])
@@ -0,0 +1,254 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Condition
+
+import pytest
+
+from xdsl.context import Context
+from xdsl.dialects.arith import Arith
+from xdsl.dialects.builtin import Builtin, StringAttr
+from xdsl.dialects.comb import Comb
+from xdsl.dialects.func import Func, FuncOp
+from xdsl.dialects.hw import HW
+from xdsl.parser import Parser
+
+from xdsl_smt.cli.synth_transfer import get_concrete_function
+from xdsl_smt.dialects.index_dialect import Index
+from xdsl_smt.dialects.smt_bitvector_dialect import SMTBitVectorDialect
+from xdsl_smt.dialects.smt_dialect import SMTDialect
+from xdsl_smt.dialects.smt_utils_dialect import SMTUtilsDialect
+from xdsl_smt.dialects.transfer import Transfer
+from xdsl_smt.utils.dialect_to_z3 import (
+    SolverSettings,
+    configure_solver,
+    get_solver_settings,
+)
+from xdsl_smt.utils.synthesizer_utils import parallel_verifier
+from xdsl_smt.utils.synthesizer_utils.parallel_verifier import (
+    configure_verifier_workers,
+    find_counterexample_parallel,
+    find_counterexamples_parallel,
+    verify_transfer_function_parallel,
+)
+from xdsl_smt.utils.synthesizer_utils.verifier_utils import (
+    LOWERED_FUNCS,
+    Counterexample,
+    clear_lowered_funcs,
+    find_counterexamples,
+    lower_function,
+)
+
+TEST_DIR = Path(__file__).parent / "verifier_utils_test"
+MAX_BITS = 4
+
+
+def get_context() -> Context:
+    ctx = Context()
+    for dialect in (
+        Arith,
+        Builtin,
+        Func,
+        SMTDialect,
+        SMTBitVectorDialect,
+        SMTUtilsDialect,
+        Transfer,
+        Index,
+        Comb,
+        HW,
+    ):
+        ctx.load_dialect(dialect)
+    return ctx
+
+
+def load_functions(ctx: Context, name: str) -> tuple[FuncOp, list[FuncOp]]:
+    "The transfer function of a test file, and its helper functions"
+    module = Parser(ctx, (TEST_DIR / f"{name}.mlir").read_text()).parse_module()
+    funcs = [func for func in module.ops if isinstance(func, FuncOp)]
+    (transfer_function,) = [func for func in funcs if "applied_to" in func.attributes]
+    helper_funcs = [func for func in funcs if "applied_to" not in func.attributes]
+    return transfer_function, helper_funcs
+
+
+def test_verify_transfer_function_parallel(monkeypatch: pytest.MonkeyPatch):
+    """
+    The smallest unsound bitwidth is returned even when larger bitwidths are
+    found unsound first.
+    """
+    ctx = get_context()
+    wrong, _ = load_functions(ctx, "knownBitsAnd-wrong")
+    right, helper_funcs = load_functions(ctx, "knownBitsAnd")
+    concrete_func = get_concrete_function("comb.and", None)
+
+    # Workers are threads sharing the context, which also parse the functions
+    # as printed for a worker process. The solver is not thread safe, so the
+    # checks run one at a time, each waiting for all larger bitwidths.
+    finished: list[int] = []
+    larger_finished = Condition()
+    verify_width = parallel_verifier._verify_width
+
+    def delayed_verify_width(funcs_src: str, width: int) -> Counterexample | None:
+        with larger_finished:
+            larger_finished.wait_for(lambda: len(finished) == MAX_BITS - width)
+            counterexample = verify_width(funcs_src, width)
+            finished.append(width)
+            larger_finished.notify_all()
+            return counterexample
+
+    pool = ThreadPoolExecutor(MAX_BITS)
+    monkeypatch.setattr(parallel_verifier, "_num_workers", MAX_BITS)
+    monkeypatch.setattr(parallel_verifier, "_pool", pool)
+    monkeypatch.setattr(parallel_verifier, "_pool_pid", os.getpid())
+    monkeypatch.setattr(parallel_verifier, "_worker_ctx", ctx)
+    monkeypatch.setattr(parallel_verifier, "_worker_funcs", None)
+    monkeypatch.setattr(parallel_verifier, "_verify_width", delayed_verify_width)
+
+    assert (
+        verify_transfer_function_parallel(
+            wrong, concrete_func, helper_funcs, ctx, 1, MAX_BITS
+        )
+        == 1
+    )
+    assert finished == [4, 3, 2, 1]
+
+    finished.clear()
+    assert (
+        verify_transfer_function_parallel(
+            right, concrete_func, helper_funcs, ctx, 1, MAX_BITS
+        )
+        == 0
+    )
+    assert finished == [4, 3, 2, 1]
+    pool.shutdown()
+
+
+def slow_verify_width(funcs_src: str, width: int) -> Counterexample | None:
+    "Unsound at bitwidth 1, and the larger bitwidths take too long to check"
+    if width > 1:
+        time.sleep(600)
+    return Counterexample(width, [], [])
+
+
+def test_find_counterexample_parallel_kills_running(monkeypatch: pytest.MonkeyPatch):
+    """
+    The checks of larger bitwidths still running when a counterexample is
+    found do not outlive the call.
+    """
+    ctx = get_context()
+    wrong, helper_funcs = load_functions(ctx, "knownBitsAnd-wrong")
+    concrete_func = get_concrete_function("comb.and", None)
+
+    # Submitted jobs are pickled by name, so the workers run this module's
+    # function rather than a patched one
+    monkeypatch.setattr(parallel_verifier, "_verify_width", slow_verify_width)
+    configure_verifier_workers(2)
+    try:
+        pool = parallel_verifier._get_pool(ctx)
+        assert pool is not None
+        counterexample = find_counterexample_parallel(
+            wrong, concrete_func, helper_funcs, ctx, 1, MAX_BITS
+        )
+        assert counterexample == Counterexample(1, [], [])
+        assert parallel_verifier._pool is None
+        assert not any(
+            process.is_alive() for process in (pool._processes or {}).values()
+        )
+    finally:
+        configure_verifier_workers(1)
+
+
+def is_and_counterexample(counterexample: Counterexample | None) -> bool:
+    """
+    Whether the concrete arguments of a counterexample to knownBitsAnd-wrong
+    are in its KnownBits arguments, and their And is not in its result.
+    """
+    if counterexample is None or counterexample.unknown:
+        return False
+    (zeros0, ones0), (zeros1, ones1) = counterexample.abs_args
+    lhs, rhs = counterexample.crt_args
+    mask = (1 << counterexample.width) - 1
+
+    def contains(zeros: int, ones: int, value: int) -> bool:
+        return zeros & ones == 0 and value & zeros == 0 and value & ones == ones
+
+    return (
+        contains(zeros0, ones0, lhs)
+        and contains(zeros1, ones1, rhs)
+        and not contains((zeros0 | zeros1) & mask, (ones0 | ones1) & mask, lhs & rhs)
+    )
+
+
+def test_find_counterexamples():
+    ctx = get_context()
+    wrong, _ = load_functions(ctx, "knownBitsAnd-wrong")
+    right, helper_funcs = load_functions(ctx, "knownBitsAnd")
+    right.sym_name = StringAttr("ANDImplRight")
+    concrete_func = get_concrete_function("comb.and", None)
+
+    # The model found depends on the solver state, so only its validity is checked
+    counterexamples = find_counterexamples(
+        [wrong, right], concrete_func, helper_funcs, ctx, 1, MAX_BITS
+    )
+    assert len(counterexamples) == 2
+    assert counterexamples[0] is not None and counterexamples[0].width == 1
+    assert is_and_counterexample(counterexamples[0])
+    assert counterexamples[1] is None
+
+    configure_verifier_workers(2)
+    try:
+        counterexamples = find_counterexamples_parallel(
+            [wrong, right], concrete_func, helper_funcs, ctx, 1, MAX_BITS
+        )
+    finally:
+        configure_verifier_workers(1)
+    assert len(counterexamples) == 2
+    assert counterexamples[0] is not None and counterexamples[0].width == 1
+    assert is_and_counterexample(counterexamples[0])
+    assert counterexamples[1] is None
+
+
+def test_find_counterexamples_exhaustive():
+    ctx = get_context()
+    wrong, _ = load_functions(ctx, "knownBitsAnd-wrong")
+    right, helper_funcs = load_functions(ctx, "knownBitsAnd")
+    right.sym_name = StringAttr("ANDImplRight")
+    concrete_func = get_concrete_function("comb.and", None)
+
+    settings = get_solver_settings()
+    for exhaustive_max_width in [0, 3]:
+        configure_solver(SolverSettings(exhaustive_max_width=exhaustive_max_width))
+        try:
+            for width in range(1, 4):
+                counterexamples = find_counterexamples(
+                    [wrong, right], concrete_func, helper_funcs, ctx, width, width
+                )
+                assert counterexamples[0] is not None
+                assert counterexamples[0].width == width
+                assert is_and_counterexample(counterexamples[0])
+                assert counterexamples[1] is None
+        finally:
+            configure_solver(settings)
+
+
+def test_lowered_funcs_not_shared():
+    """
+    The cached lowerings are cloned into every query, so no query holds on to,
+    nor uses, the functions of the cache.
+    """
+    ctx = get_context()
+    right, helper_funcs = load_functions(ctx, "knownBitsAnd")
+    concrete_func = get_concrete_function("comb.and", None)
+
+    clear_lowered_funcs()
+    assert find_counterexamples(
+        [right], concrete_func, helper_funcs, ctx, 1, MAX_BITS
+    ) == [None]
+    assert len(LOWERED_FUNCS) > 0
+    for func in LOWERED_FUNCS.values():
+        assert func.parent is not None and func.parent.parent is not None
+        assert not any(func.ret.uses)
+
+    lowered = lower_function(helper_funcs[0], 2, ctx)
+    assert lowered is not lower_function(helper_funcs[0], 2, ctx)
+    assert str(lowered) == str(lower_function(helper_funcs[0], 2, ctx))
@@ -0,0 +1,62 @@
+from xdsl.builder import Builder
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.ir import SSAValue
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.cli.generate_equivalent_boolean_smts import PatternIndex
+from xdsl_smt.dialects import smt_dialect as smt
+
+
+def program(num_args: int, body: str) -> ModuleOp:
+    """
+    A program of boolean arguments x, y, z, returning a formula in prefix
+    notation, e.g. "and x not y". T is true.
+    """
+    func = FuncOp("main", ([smt.BoolType()] * num_args, [smt.BoolType()]))
+    builder = Builder(InsertPoint.at_end(func.body.block))
+    tokens = iter(body.split())
+
+    def parse() -> SSAValue:
+        match next(tokens):
+            case "T":
+                return builder.insert(smt.ConstantBoolOp(True)).res
+            case "not":
+                return builder.insert(smt.NotOp(parse())).res
+            case "and":
+                return builder.insert(smt.AndOp(parse(), parse())).result
+            case "or":
+                return builder.insert(smt.OrOp(parse(), parse())).result
+            case arg:
+                return func.body.block.args["xyz".index(arg)]
+
+    builder.insert(ReturnOp(parse()))
+    return ModuleOp([func])
+
+
+def test_pattern_index():
+    patterns = [
+        program(1, "not not x"),
+        program(2, "and x x"),
+        program(2, "and x y"),
+        program(2, "or T x"),
+        program(3, "or x and y z"),
+    ]
+    index = PatternIndex()
+    for i, pattern in enumerate(patterns):
+        index.add(i, pattern)
+
+    def matches(num_args: int, body: str) -> list[int]:
+        return sorted(index.matches(program(num_args, body)))
+
+    assert matches(2, "not not and x y") == [0]
+    assert matches(1, "not x") == []
+    # Pattern arguments used twice only match equal values
+    assert matches(2, "and not y not y") == [1, 2]
+    assert matches(2, "and not x not y") == [2]
+    assert matches(1, "or T T") == [3]
+    assert matches(1, "or x T") == []
+    assert matches(2, "or y and x x") == [4]
+
+    index.remove(2)
+    assert matches(2, "and not y not y") == [1]
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from xdsl_smt.utils.program_store import ProgramStore
+
+
+def test_program_store(tmp_path: Path):
+    store = ProgramStore(tmp_path)
+    assert store.size == -1
+    store.add_canonical("canonical 0")
+    store.add_illegal("illegal 0", "pattern 0")
+    store.checkpoint(0)
+    # Programs of an incomplete step are dropped on resume
+    store.add_canonical("canonical 1")
+    store.add_illegal("illegal 1", "pattern 1")
+    assert list(store.canonicals()) == ["canonical 0", "canonical 1"]
+    store.close()
+
+    store = ProgramStore(tmp_path, resume=True)
+    assert store.size == 0
+    assert list(store.canonicals()) == ["canonical 0"]
+    assert list(store.illegals()) == ["illegal 0"]
+    assert store.exclude_subpatterns.read_text() == "pattern 0\n// -----\n"
+    store.add_illegal("illegal\n2", "pattern 2")
+    store.checkpoint(1)
+    store.close()
+
+    store = ProgramStore(tmp_path, resume=True)
+    assert store.size == 1
+    assert list(store.illegals()) == ["illegal 0", "illegal\n2"]
+    store.close()
+
+    # Without resuming, the store starts over
+    store = ProgramStore(tmp_path)
+    assert store.size == -1
+    assert list(store.canonicals()) == []
+    assert store.exclude_subpatterns.read_text() == ""
+    store.close()
+
+
+def test_program_store_stale_checkpoint(tmp_path: Path):
+    store = ProgramStore(tmp_path)
+    store.add_canonical("canonical 0")
+    store.add_illegal("illegal 0", "pattern 0")
+    store.checkpoint(0)
+    store.close()
+
+    # A fresh run stopped before its first checkpoint leaves nothing to resume
+    store = ProgramStore(tmp_path)
+    store.close()
+    store = ProgramStore(tmp_path, resume=True)
+    assert store.size == -1
+    assert list(store.canonicals()) == []
+    store.add_canonical("canonical 0")
+    store.checkpoint(0)
+    store.close()
+
+    # Files shorter than the checkpoint are rejected, not padded
+    (tmp_path / "canonicals.jsonl").write_text("")
+    with pytest.raises(ValueError, match="shorter than its checkpoint"):
+        ProgramStore(tmp_path, resume=True)
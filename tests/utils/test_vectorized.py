@@ -0,0 +1,73 @@
+import itertools
+
+import z3
+from xdsl.builder import Builder
+from xdsl.dialects.builtin import FunctionType, ModuleOp
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.rewriter import InsertPoint
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects import smt_dialect as smt
+from xdsl_smt.interpreters.vectorized import (
+    all_inputs,
+    build_vectorized,
+    interpret_vectorized,
+)
+
+
+def binary_program(op_type: type[bv.BinaryBVOp], width: int) -> ModuleOp:
+    ty = bv.BitVectorType(width)
+    func = FuncOp("main", ([ty, ty], [ty]))
+    builder = Builder(InsertPoint.at_end(func.body.block))
+    lhs, rhs = func.body.block.args
+    builder.insert(ReturnOp(builder.insert(op_type(lhs, rhs)).res))
+    return ModuleOp([func])
+
+
+def test_vectorized_semantics():
+    # Division by zero, shifts past the width and signed operations follow Z3
+    ops = {
+        bv.SDivOp: lambda l, r: l / r,
+        bv.SRemOp: z3.SRem,
+        bv.SModOp: lambda l, r: l % r,
+        bv.UDivOp: z3.UDiv,
+        bv.URemOp: z3.URem,
+        bv.ShlOp: lambda l, r: l << r,
+        bv.LShrOp: z3.LShR,
+        bv.AShrOp: lambda l, r: l >> r,
+        bv.MulOp: lambda l, r: l * r,
+    }
+    for op_type, z3_op in ops.items():
+        function = build_vectorized(binary_program(op_type, 3))
+        inputs = all_inputs([bv.BitVectorType(3)] * 2)
+        (results,) = interpret_vectorized(function, inputs)
+        for lhs, rhs, result in zip(*inputs, results):
+            expected = z3.simplify(
+                z3_op(z3.BitVecVal(int(lhs), 3), z3.BitVecVal(int(rhs), 3))
+            )
+            assert result == expected.as_long(), (op_type.name, lhs, rhs)
+
+
+def test_vectorized_interpreter():
+    # (x + y) & ~y == x ? y : 1, on 4 bits, on every input at once
+    ty = bv.BitVectorType(4)
+    func = FuncOp("main", ([ty, ty], []))
+    builder = Builder(InsertPoint.at_end(func.body.block))
+    x, y = func.body.block.args
+    add = builder.insert(bv.AddOp(x, y)).res
+    masked = builder.insert(bv.AndOp(add, builder.insert(bv.NotOp(y)).res)).res
+    cond = builder.insert(smt.EqOp(masked, x)).res
+    one = builder.insert(bv.ConstantOp(1, 4)).res
+    ite = builder.insert(smt.IteOp(cond, y, one)).res
+    builder.insert(ReturnOp(ite, cond))
+    func.function_type = FunctionType.from_lists([ty, ty], [ty, smt.BoolType()])
+    module = ModuleOp([func])
+
+    function = build_vectorized(module)
+    inputs = all_inputs([ty, ty])
+    values, conds = interpret_vectorized(function, inputs)
+    assert len(values) == len(conds) == 256
+
+    for i, (lhs, rhs) in enumerate(itertools.product(range(16), range(16))):
+        cond = (lhs + rhs) & ~rhs & 15 == lhs
+        assert (values[i], conds[i]) == (rhs if cond else 1, cond)
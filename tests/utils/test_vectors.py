@@ -0,0 +1,97 @@
+from multiprocessing import Pool
+from pathlib import Path
+
+import pytest
+
+from xdsl_smt.eval_engine.vectors import VecFile, VectorStore, write_vectors
+
+
+def test_vectors_roundtrip(tmp_path: Path):
+    path = tmp_path / "low_bw_4_samples_2.xvec"
+    values = list(range(12))
+    write_vectors(path, "KnownBits", 4, 2, values)
+
+    with VecFile(path) as vecs:
+        assert vecs.header.domain == "KnownBits"
+        assert vecs.header.bw == 4
+        assert vecs.header.n == 2
+        assert vecs.header.count == 2
+        assert vecs.values.tolist() == values
+
+
+def test_vectors_truncated(tmp_path: Path):
+    path = tmp_path / "low_bw_4_samples_2.xvec"
+    write_vectors(path, "KnownBits", 4, 2, list(range(12)))
+    path.write_bytes(path.read_bytes()[:-8])
+
+    with pytest.raises(ValueError, match="Truncated"):
+        VecFile(path)
+
+
+def _enumerate_vectors(
+    dirpath: Path,
+    low_bws: list[int],
+    med_bws: list[tuple[int, int]],
+    high_bws: list[tuple[int, int, int]],
+):
+    for bw in low_bws:
+        write_vectors(dirpath / f"low_bw_{bw}.xvec", "KnownBits", bw, 2, [bw] * 6)
+    for bw, samples in med_bws:
+        write_vectors(
+            dirpath / f"med_bw_{bw}.xvec", "KnownBits", bw, 2, [bw] * 6 * samples
+        )
+    assert not high_bws
+
+
+def _data_dir(root: Path, seed: int) -> Path:
+    store = VectorStore(root)
+    return store.data_dir(
+        "KnownBits", [2, 4], [(8, 3)], [], seed, "src", _enumerate_vectors
+    )
+
+
+def test_vector_store(tmp_path: Path):
+    with Pool(4) as pool:
+        dirs = pool.starmap(_data_dir, [(tmp_path, 0)] * 4 + [(tmp_path, 1)] * 4)
+
+    assert len(set(dirs)) == 2
+    for data_dir in dirs:
+        names = sorted(p.name for p in data_dir.iterdir())
+        assert names == ["low_bw_2.xvec", "low_bw_4.xvec", "med_bw_8.xvec"]
+
+    # the low bitwidth vectors don't depend on the seed and are stored once
+    low_vectors = list((tmp_path / "low").iterdir())
+    assert len(low_vectors) == 2
+    assert all(p.stat().st_nlink == 3 for p in low_vectors)
+    assert not list(tmp_path.glob("tmp-*"))
+
+
+def test_vector_store_extended(tmp_path: Path):
+    store = VectorStore(tmp_path)
+    data_dir = _data_dir(tmp_path, 0)
+
+    def write_cex(dirpath: Path):
+        write_vectors(dirpath / "high_cex_bw_12.xvec", "KnownBits", 12, 2, [1] * 6)
+
+    extended = store.extended_dir(data_dir, [(12, 1)], write_cex)
+    assert extended != data_dir
+    assert store.extended_dir(data_dir, [(12, 1)], write_cex) == extended
+    names = sorted(p.name for p in extended.iterdir())
+    assert names == [
+        "high_cex_bw_12.xvec",
+        "low_bw_2.xvec",
+        "low_bw_4.xvec",
+        "med_bw_8.xvec",
+    ]
+    # the vectors of the data dir are linked, not copied
+    assert (extended / "med_bw_8.xvec").stat().st_nlink == 2
+    assert sorted(p.name for p in data_dir.iterdir()) == names[1:]
+
+    # removing the extended dir keeps the vectors of the data dir
+    store.remove_extended_dir(extended)
+    assert not extended.exists()
+    assert sorted(p.name for p in data_dir.iterdir()) == names[1:]
+    assert (data_dir / "med_bw_8.xvec").stat().st_nlink == 1
+    with pytest.raises(ValueError, match="Not an extended dir"):
+        store.remove_extended_dir(data_dir)
+    assert data_dir.is_dir()
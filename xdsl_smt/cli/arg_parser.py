@@ -6,6 +6,7 @@ from argparse import (
     ArgumentTypeError,
 )
 from xdsl_smt.eval_engine.eval import AbstractDomain
+from xdsl_smt.utils.dialect_to_z3 import DEFAULT_PORTFOLIO, SolverSettings
 from pathlib import Path
 
 
@@ -33,6 +34,17 @@ def int_triple(s: str) -> tuple[int, int, int]:
         )
 
 
+def verifier_settings(args: Namespace) -> SolverSettings:
+    "The solver settings of the -verify_* arguments"
+    return SolverSettings(
+        args.verify_timeout,
+        args.verify_memory,
+        DEFAULT_PORTFOLIO if args.verify_portfolio else (),
+        bitblast_max_width=args.verify_bitblast_width,
+        exhaustive_max_width=args.verify_exhaustive_width,
+    )
+
+
 def register_arguments(prog: str) -> Namespace:
     ap = ArgumentParser(prog=prog, formatter_class=ArgumentDefaultsHelpFormatter)
 
@@ -134,6 +146,53 @@ def register_arguments(prog: str) -> Namespace:
         help="number of unsound candidates considered for abduction",
         default=15,
     )
+    ap.add_argument(
+        "-eval_engines",
+        type=int,
+        help="number of eval engine processes candidates are sharded over",
+        default=1,
+    )
+    ap.add_argument(
+        "-eval_threads",
+        type=int,
+        help="number of threads each eval engine splits the test vectors over",
+        default=1,
+    )
+    ap.add_argument(
+        "-verify_workers",
+        type=int,
+        help="number of processes the bitwidths of a candidate are verified on",
+        default=1,
+    )
+    ap.add_argument(
+        "-verify_timeout",
+        type=int,
+        help="time limit of each verifier query in milliseconds, candidates the verifier gives up on are skipped",
+        default=None,
+    )
+    ap.add_argument(
+        "-verify_memory",
+        type=int,
+        help="memory limit of the verifier in megabytes",
+        default=None,
+    )
+    ap.add_argument(
+        "-verify_bitblast_width",
+        type=int,
+        help="largest bitwidth the verifier bit-blasts to SAT instead of using the SMT solver",
+        default=0,
+    )
+    ap.add_argument(
+        "-verify_exhaustive_width",
+        type=int,
+        help="largest bitwidth the verifier checks on every input instead of using a solver",
+        default=2,
+    )
+    ap.add_argument(
+        "-verify_portfolio",
+        action="store_true",
+        help="Race differently configured solvers on each verifier query",
+    )
     ap.add_argument("-quiet", action="store_true")
 
     return ap.parse_args()
@@ -4,7 +4,7 @@ from argparse import Namespace
 from pathlib import Path
 
 from xdsl_smt.cli.synth_transfer import run
-from xdsl_smt.cli.arg_parser import register_arguments
+from xdsl_smt.cli.arg_parser import register_arguments, verifier_settings
 from xdsl_smt.eval_engine.eval import AbstractDomain
 from xdsl_smt.utils.synthesizer_utils.log_utils import setup_loggers
 from typing import Any
@@ -148,6 +148,10 @@ def synth_run(
             weighted_dsl=args.weighted_dsl,
             num_unsound_candidates=args.num_unsound_candidates,
             outputs_folder=output_folder,
+            eval_engines=args.eval_engines,
+            eval_threads=args.eval_threads,
+            verify_workers=args.verify_workers,
+            solver_settings=verifier_settings(args),
         )
 
         return {
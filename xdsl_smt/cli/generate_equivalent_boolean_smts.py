@@ -2,16 +2,16 @@
 
 import argparse
 from io import StringIO
-import itertools
+from pathlib import Path
 import subprocess as sp
 import sys
 import time
-from typing import Generator
+from typing import Generator, Hashable, Iterator, Sequence
 
 from xdsl.context import Context
-from xdsl.ir import Attribute
 from xdsl.ir.core import BlockArgument, Operation, OpResult, SSAValue
 from xdsl.parser import Parser
+from xdsl.printer import Printer
 
 import xdsl_smt.dialects.synth_dialect as synth
 from xdsl_smt.dialects import smt_dialect as smt
@@ -19,10 +19,15 @@ from xdsl_smt.dialects import smt_bitvector_dialect as bv
 from xdsl_smt.dialects.smt_bitvector_dialect import SMTBitVectorDialect
 from xdsl_smt.dialects.smt_dialect import SMTDialect
 from xdsl_smt.dialects.smt_utils_dialect import SMTUtilsDialect
-from xdsl.dialects.builtin import Builtin, ModuleOp, IntegerAttr
+from xdsl.dialects.builtin import Builtin, FunctionType, ModuleOp
 from xdsl.dialects.func import Func, FuncOp
 
-from xdsl_smt.cli.xdsl_smt_run import arity, build_interpreter, interpret
+from xdsl_smt.interpreters.vectorized import (
+    all_inputs,
+    build_vectorized,
+    interpret_vectorized,
+)
+from xdsl_smt.utils.program_store import ProgramStore
 
 
 def register_all_arguments(arg_parser: argparse.ArgumentParser):
@@ -53,13 +58,23 @@ def register_all_arguments(arg_parser: argparse.ArgumentParser):
         action="store_true",
         help="if present, prints a human-readable summary of the buckets",
     )
+    arg_parser.add_argument(
+        "--store",
+        type=str,
+        help="the directory in which to store the programs after each size step, "
+        "a temporary directory by default",
+    )
+    arg_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="if present, resumes the enumeration from the last size step "
+        "completed in the store",
+    )
 
 
 MLIR_ENUMERATE = "./mlir-fuzz/build/bin/mlir-enumerate"
-REMOVE_REDUNDANT_PATTERNS = "./mlir-fuzz/build/bin/remove-redundant-patterns"
 SMT_MLIR = "./mlir-fuzz/dialects/smt.mlir"
-EXCLUDE_SUBPATTERNS_FILE = f"/tmp/exclude-subpatterns-{time.time()}"
-USE_CPP = True
+DEFAULT_STORE = f"/tmp/equivalent-programs-{time.time()}"
 
 
 def read_program_from_enumerator(enumerator: sp.Popen[str]) -> str | None:
@@ -86,6 +101,17 @@ def get_inner_func(module: ModuleOp) -> FuncOp:
     return module.ops.first
 
 
+def serialize_program(program: ModuleOp) -> str:
+    """The generic MLIR text of a program, as stored in a ProgramStore."""
+    stream = StringIO()
+    Printer(stream, print_generic_format=True).print_op(program)
+    return stream.getvalue()
+
+
+def parse_program(ctx: Context, program: str) -> ModuleOp:
+    return Parser(ctx, program).parse_module()
+
+
 def formula_size(formula: SSAValue) -> int:
     match formula:
         case BlockArgument():
@@ -111,13 +137,8 @@ def enumerate_programs(
     max_num_args: int,
     num_ops: int,
     bv_widths: str,
-    illegals: list[ModuleOp],
+    exclude_subpatterns: Path,
 ) -> Generator[ModuleOp, None, None]:
-    with open(EXCLUDE_SUBPATTERNS_FILE, "w") as f:
-        for program in illegals:
-            f.write(create_pattern_from_program(program))
-            f.write("\n// -----\n")
-
     enumerator = sp.Popen(
         [
             MLIR_ENUMERATE,
@@ -132,7 +153,7 @@ def enumerate_programs(
             f"--max-num-ops={num_ops}",
             "--pause-between-programs",
             "--mlir-print-op-generic",
-            f"--exclude-subpatterns={EXCLUDE_SUBPATTERNS_FILE}",
+            f"--exclude-subpatterns={exclude_subpatterns}",
         ],
         text=True,
         stdin=sp.PIPE,
@@ -164,17 +185,20 @@ def enumerate_programs(
         yield module
 
 
-def values_of_type(ty: Attribute) -> list[Attribute]:
-    match ty:
-        case smt.BoolType():
-            return [IntegerAttr.from_bool(False), IntegerAttr.from_bool(True)]
-        case bv.BitVectorType(width=width):
-            return [
-                IntegerAttr.from_int_and_width(value, width.data)
-                for value in range(1 << width.data)
-            ]
-        case _:
-            raise ValueError(f"Unsupported type: {ty}")
+Behavior = tuple[FunctionType, tuple[bytes, ...]]
+"The signature of a program and its results on every input of that signature"
+
+
+def behavior(program: ModuleOp) -> Behavior:
+    """
+    Evaluate a program on all possible inputs at once. Two programs are
+    semantically equivalent iff they have the same behavior, so behaviors are
+    used as keys to find the equivalent programs of a program.
+    """
+    function_type = get_inner_func(program).function_type
+    function = build_vectorized(program)
+    results = interpret_vectorized(function, all_inputs(function_type.inputs.data))
+    return function_type, tuple(result.tobytes() for result in results)
 
 
 def is_same_behavior(left: ModuleOp, right: ModuleOp) -> bool:
@@ -184,17 +208,7 @@ def is_same_behavior(left: ModuleOp, right: ModuleOp) -> bool:
     right_type = get_inner_func(right).function_type
     if left_type != right_type:
         return False
-    # Evaluate programs with all possible inputs.
-    left_interpreter = build_interpreter(left, 64)
-    right_interpreter = build_interpreter(right, 64)
-    for arguments in itertools.product(
-        *(values_of_type(ty) for ty in left_type.inputs)
-    ):
-        left_res = interpret(left_interpreter, arguments[: arity(left_interpreter)])
-        right_res = interpret(right_interpreter, arguments[: arity(right_interpreter)])
-        if left_res != right_res:
-            return False
-    return True
+    return behavior(left) == behavior(right)
 
 
 def compare_values_lexicographically(left: SSAValue, right: SSAValue) -> int:
@@ -304,6 +318,104 @@ def is_pattern(lhs: ModuleOp, program: ModuleOp) -> bool:
     )
 
 
+_Symbol = Hashable | None
+"The symbol of a value in a pattern, None for the pattern variables"
+
+
+def _symbol(value: SSAValue) -> _Symbol:
+    """
+    The symbol of a value, such that unify_value only unifies a pattern value
+    and a program value with the same symbol, or pattern variables.
+    """
+    match value:
+        case BlockArgument():
+            return None
+        case OpResult(op=smt.ConstantBoolOp(value=v), index=i):
+            return smt.ConstantBoolOp, i, bool(v)
+        case OpResult(op=op, index=i):
+            return type(op), i, len(op.operands)
+        case x:
+            raise ValueError(f"Unknown value: {x}")
+
+
+def _operands(value: SSAValue) -> Sequence[SSAValue]:
+    return value.op.operands if isinstance(value, OpResult) else ()
+
+
+def _returned_values(program: ModuleOp) -> list[SSAValue]:
+    ret = get_inner_func(program).get_return_op()
+    assert ret is not None
+    return list(ret.arguments)
+
+
+class _Node:
+    children: dict[_Symbol, "_Node"]
+    patterns: dict[int, ModuleOp]
+    "The patterns whose symbols lead to this node, by key"
+
+    def __init__(self):
+        self.children = {}
+        self.patterns = {}
+
+
+class PatternIndex:
+    """
+    A discrimination tree over patterns, to find the patterns a program is an
+    instance of without unifying the program with each of them.
+
+    Patterns are indexed by the symbols of their returned values in preorder,
+    with a single wildcard symbol for their arguments. Looking up a program
+    walks the tree along its own symbols, and additionally skips a whole
+    program subterm at each wildcard, so that only the patterns sharing a
+    prefix with the program are unified with it.
+    """
+
+    root: _Node
+    leaves: dict[int, _Node]
+    "The node holding each pattern, by key"
+
+    def __init__(self):
+        self.root = _Node()
+        self.leaves = {}
+
+    def add(self, key: int, pattern: ModuleOp) -> None:
+        values = _returned_values(pattern)
+        node = self.root.children.setdefault(len(values), _Node())
+        # The values left to visit, in reverse order
+        stack = values[::-1]
+        while stack:
+            value = stack.pop()
+            symbol = _symbol(value)
+            node = node.children.setdefault(symbol, _Node())
+            if symbol is not None:
+                stack.extend(reversed(_operands(value)))
+        node.patterns[key] = pattern
+        self.leaves[key] = node
+
+    def remove(self, key: int) -> None:
+        del self.leaves.pop(key).patterns[key]
+
+    def _candidates(self, node: _Node, stack: list[SSAValue]) -> Iterator[int]:
+        if not stack:
+            yield from node.patterns
+            return
+        value, rest = stack[-1], stack[:-1]
+        if (child := node.children.get(None)) is not None:
+            yield from self._candidates(child, rest)
+        symbol = _symbol(value)
+        if symbol is not None and (child := node.children.get(symbol)) is not None:
+            yield from self._candidates(child, rest + list(reversed(_operands(value))))
+
+    def matches(self, program: ModuleOp) -> Iterator[int]:
+        """The keys of the patterns the program is an instance of."""
+        values = _returned_values(program)
+        if (node := self.root.children.get(len(values))) is None:
+            return
+        for key in self._candidates(node, values[::-1]):
+            if is_pattern(self.leaves[key].patterns[key], program):
+                yield key
+
+
 def create_pattern_from_program(program: ModuleOp) -> str:
     lines = [
         "builtin.module {",
@@ -466,11 +578,27 @@ def main() -> None:
     ctx.load_dialect(SMTUtilsDialect)
     ctx.load_dialect(synth.SynthDialect)
 
-    canonicals: list[ModuleOp] = []
-    illegals: list[ModuleOp] = []
+    # Programs are only kept in memory during their size step, and stored
+    # once classified
+    try:
+        store = ProgramStore(Path(args.store or DEFAULT_STORE), args.resume)
+    except ValueError as e:
+        print(f"Cannot open the program store: {e}", file=sys.stderr)
+        sys.exit(1)
+    canonical_behaviors: set[Behavior] = set()
+    canonical_count = 0
+    for program in store.canonicals():
+        canonical_behaviors.add(behavior(parse_program(ctx, program)))
+        canonical_count += 1
+    illegal_count = sum(1 for _ in store.illegals())
+    if store.size >= 0:
+        print(
+            f"Resuming after size {store.size}, with {canonical_count} behaviors "
+            f"and {illegal_count} illegal subpatterns."
+        )
 
     try:
-        for m in range(args.max_num_ops + 1):
+        for m in range(store.size + 1, args.max_num_ops + 1):
             print(f"\033[1m== Size {m} ==\033[0m")
             step_start = time.time()
 
@@ -478,27 +606,32 @@ def main() -> None:
             new_program_count = 0
             new_illegals: list[ModuleOp] = []
             new_behaviors: list[tuple[ModuleOp, list[ModuleOp]]] = []
+            # The index in new_behaviors of each behavior, each program is only
+            # evaluated once and looked up by its behavior
+            new_behavior_indices: dict[Behavior, int] = {}
             for program in enumerate_programs(
-                ctx, args.max_num_args, m, args.bitvector_widths, illegals
+                ctx,
+                args.max_num_args,
+                m,
+                args.bitvector_widths,
+                store.exclude_subpatterns,
             ):
                 new_program_count += 1
                 print(f" {new_program_count}", end="\r")
-                for canonical in canonicals:
-                    if is_same_behavior(program, canonical):
-                        new_illegals.append(program)
-                        break
-                else:
-                    for i, (canonical, programs) in enumerate(new_behaviors):
-                        if is_same_behavior(program, canonical):
-                            if are_lexicographically_ordered(program, canonical):
-                                # This new program becomes canonical.
-                                programs.append(canonical)
-                                new_behaviors[i] = program, programs
-                            else:
-                                programs.append(program)
-                            break
+                program_behavior = behavior(program)
+                if program_behavior in canonical_behaviors:
+                    new_illegals.append(program)
+                elif (i := new_behavior_indices.get(program_behavior)) is not None:
+                    canonical, programs = new_behaviors[i]
+                    if are_lexicographically_ordered(program, canonical):
+                        # This new program becomes canonical.
+                        programs.append(canonical)
+                        new_behaviors[i] = program, programs
                     else:
-                        new_behaviors.append((program, []))
+                        programs.append(program)
+                else:
+                    new_behavior_indices[program_behavior] = len(new_behaviors)
+                    new_behaviors.append((program, []))
             print(
                 f"Generated {new_program_count} programs of this size; "
                 f"{sum(len(b) + 1 for _, b in new_behaviors)} of them exhibited "
@@ -506,71 +639,62 @@ def main() -> None:
             )
 
             print("Removing redundant illegal subpatterns...")
+            canonical_behaviors.update(new_behavior_indices)
             for canonical, programs in new_behaviors:
-                canonicals.append(canonical)
+                store.add_canonical(serialize_program(canonical))
                 new_illegals.extend(
                     program
                     for program in programs
                     if not is_pattern(program, canonical)
                 )
 
-            if USE_CPP:
-                input = StringIO()
-                print("module {", file=input)
-                for illegal in new_illegals:
-                    print(illegal, file=input)
-                print("}", file=input)
-                cpp_res = sp.run(
-                    [REMOVE_REDUNDANT_PATTERNS],
-                    input=input.getvalue(),
-                    stdout=sp.PIPE,
-                    text=True,
+            # An illegal program is redundant if it is an instance of another
+            # illegal program that is kept
+            index = PatternIndex()
+            for i, illegal in enumerate(new_illegals):
+                index.add(i, illegal)
+            size = len(new_illegals)
+            redundant: set[int] = set()
+            for progress, i in enumerate(reversed(range(size)), 1):
+                print(f" {progress}/{size}", end="\r")
+                if any(j != i for j in index.matches(new_illegals[i])):
+                    index.remove(i)
+                    redundant.add(i)
+            redundant_count = len(redundant)
+            new_illegals = [
+                program for i, program in enumerate(new_illegals) if i not in redundant
+            ]
+
+            for illegal in new_illegals:
+                store.add_illegal(
+                    serialize_program(illegal), create_pattern_from_program(illegal)
                 )
-                removed_indices: list[int] = []
-                for idx, line in enumerate(cpp_res.stdout.splitlines()):
-                    if line == "true":
-                        removed_indices.append(idx)
-                redundant_count = len(removed_indices)
-                for idx in reversed(removed_indices):
-                    del new_illegals[idx]
-            else:
-                size = len(new_illegals)
-                redundant_count = 0
-                progress = 0
-                for i, program in reversed(list(enumerate(new_illegals))):
-                    progress += 1
-                    print(f" {progress}/{size}", end="\r")
-                    if any(
-                        j != i and is_pattern(lhs, program)
-                        for j, lhs in enumerate(new_illegals)
-                    ):
-                        redundant_count += 1
-                        del new_illegals[i]
-
-            illegals.extend(new_illegals)
+            store.checkpoint(m)
+            canonical_count += len(new_behaviors)
+            illegal_count += len(new_illegals)
             print(f"Removed {redundant_count} redundant illegal subpatterns.")
 
             step_end = time.time()
             print(f"Finished step in {round(step_end - step_start, 2)} s.")
             print(
-                f"We now have a total of {len(canonicals)} behaviors and {len(illegals)} illegal subpatterns."
+                f"We now have a total of {canonical_count} behaviors and {illegal_count} illegal subpatterns."
             )
 
         # Write results to disk.
         old_stdout = sys.stdout
         with open(args.out_file, "w", encoding="UTF-8") as f:
             sys.stdout = f
-            for program in canonicals:
-                pretty_print_program(program)
+            for program in store.canonicals():
+                pretty_print_program(parse_program(ctx, program))
             print()
-            for program in illegals:
-                pretty_print_program(program)
+            for program in store.illegals():
+                pretty_print_program(parse_program(ctx, program))
         sys.stdout = old_stdout
 
         if args.summary:
             print(f"\033[1m== Summary (canonical programs) ==\033[0m")
-            for program in canonicals:
-                pretty_print_program(program)
+            for program in store.canonicals():
+                pretty_print_program(parse_program(ctx, program))
 
     except BrokenPipeError as e:
         # The enumerator has terminated
@@ -579,6 +703,8 @@ def main() -> None:
         print(f"Error while enumerating programs: {e}", file=sys.stderr)
     except KeyboardInterrupt:
         print("Interrupted by user", file=sys.stderr)
+    finally:
+        store.close()
 
 
 if __name__ == "__main__":
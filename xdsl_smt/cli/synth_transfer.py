@@ -1,7 +1,7 @@
 import logging
 from typing import cast, Callable
 from io import StringIO
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from xdsl.context import Context
@@ -11,6 +11,8 @@ from xdsl.utils.hints import isa
 from xdsl_smt.cli.synth_one_iteration import synthesize_one_iteration
 from xdsl_smt.passes.transfer_inline import FunctionCallInline
 from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult
+from xdsl_smt.utils.synthesizer_utils.eval_cache import EvalCache
+from xdsl_smt.utils.synthesizer_utils.eval_outcomes import EvalOutcomes
 from ..dialects.smt_dialect import SMTDialect
 from ..dialects.smt_bitvector_dialect import SMTBitVectorDialect
 from xdsl_smt.dialects.transfer import TransIntegerType, AbstractValueType
@@ -18,8 +20,13 @@ from ..dialects.index_dialect import Index
 from ..dialects.smt_utils_dialect import SMTUtilsDialect
 from xdsl_smt.eval_engine.eval import (
     AbstractDomain,
+    remove_cex_eval,
+    setup_cex_eval,
     setup_eval,
+    configure_eval_engines,
     eval_transfer_func,
+    eval_transfer_outcomes,
+    eval_transfer_units,
     reject_sampler,
 )
 from xdsl.dialects.builtin import (
@@ -49,6 +56,9 @@ from xdsl_smt.semantics.comb_semantics import comb_semantics
 from xdsl_smt.utils.synthesizer_utils.function_with_condition import (
     FunctionWithCondition,
 )
+from xdsl_smt.utils.synthesizer_utils.parallel_verifier import (
+    configure_verifier_workers,
+)
 from xdsl_smt.utils.synthesizer_utils.log_utils import (
     setup_loggers,
     print_set_of_funcs_to_file,
@@ -59,7 +69,12 @@ from xdsl_smt.utils.synthesizer_utils.solution_set import (
 )
 from xdsl_smt.utils.synthesizer_utils.synthesizer_context import SynthesizerContext
 from xdsl_smt.utils.synthesizer_utils.random import Random
-from xdsl_smt.cli.arg_parser import register_arguments
+from xdsl_smt.utils.synthesizer_utils.verifier_utils import (
+    Counterexample,
+    clear_lowered_funcs,
+)
+from xdsl_smt.cli.arg_parser import register_arguments, verifier_settings
+from xdsl_smt.utils.dialect_to_z3 import SolverSettings, configure_solver
 
 # TODO this should be made local
 ctx = Context()
@@ -191,6 +206,12 @@ def construct_top_func(transfer: FuncOp) -> FuncOp:
     return func
 
 
+def to_eval_unit(fc: FunctionWithCondition) -> tuple[str, str]:
+    "The (name, source) unit of fc, its source holds the functions it calls"
+    caller_str, callee_strs = fc.get_function_str(print_to_cpp)
+    return fc.func_name, "\n".join(callee_strs + [caller_str])
+
+
 def eval_transfer_func_helper(
     data_dir: str,
     transfer: list[FunctionWithCondition],
@@ -206,36 +227,77 @@ def eval_transfer_func_helper(
 
     if not transfer:
         transfer = [ret_top_func]
-    transfer_func_names: list[str] = []
-    transfer_func_srcs: list[str] = []
-    helper_func_srcs: list[str] = []
-    for fc in transfer:
-        caller_str, helper_strs = fc.get_function_str(print_to_cpp)
-        transfer_func_names.append(fc.func_name)
-        transfer_func_srcs.append(caller_str)
-        helper_func_srcs += helper_strs
 
-    base_func_names: list[str] = []
-    base_func_srcs: list[str] = []
-    for fc in base:
-        caller_str, helper_strs = fc.get_function_str(print_to_cpp)
-        base_func_names.append(fc.func_name)
-        base_func_srcs.append(caller_str)
-        helper_func_srcs += helper_strs
-
-    return eval_transfer_func(
+    return eval_transfer_units(
         data_dir,
-        transfer_func_names,
-        transfer_func_srcs,
-        base_func_names,
-        base_func_srcs,
-        helper_funcs + helper_func_srcs,
+        [to_eval_unit(fc) for fc in transfer],
+        [to_eval_unit(fc) for fc in base],
+        helper_funcs,
         domain,
     )
 
 
+CEX_CONC_SAMPLES = 1000
+"Concrete values the best abstraction of a counterexample is sampled from, if no hbw sets it"
+
+
+@dataclass
+class TestVectors:
+    """
+    The test vectors candidates are evaluated on: the enumerated vectors in
+    base_dir, extended with a vector per counterexample the verifier found above
+    the low bitwidths. data_dir is the dir of the current vectors.
+    """
+
+    domain: AbstractDomain
+    base_dir: str
+    seed: int
+    conc_op_src: str
+    conc_samples: int
+    data_dir: str = field(init=False)
+    counterexamples: list[tuple[int, list[int], list[int], list[int]]] = field(
+        default_factory=list[tuple[int, list[int], list[int], list[int]]]
+    )
+
+    def __post_init__(self):
+        self.data_dir = self.base_dir
+
+    def add_counterexamples(self, counterexamples: list[Counterexample]):
+        "Only binary counterexamples the eval engine can hold are added"
+        num_added = len(self.counterexamples)
+        for cex in counterexamples:
+            if (
+                cex.width <= 64
+                and len(cex.abs_args) == 2
+                and all(len(arg) == self.domain.vec_size for arg in cex.abs_args)
+                and len(cex.crt_args) == 2
+            ):
+                lhs, rhs = cex.abs_args
+                self.counterexamples.append((cex.width, lhs, rhs, cex.crt_args))
+        if len(self.counterexamples) == num_added:
+            return
+
+        old_dir = self.data_dir
+        self.data_dir = setup_cex_eval(
+            self.domain,
+            self.base_dir,
+            self.counterexamples,
+            self.seed,
+            self.conc_op_src,
+            self.conc_samples,
+        )
+        if old_dir not in (self.base_dir, self.data_dir):
+            remove_cex_eval(old_dir)
+
+    def remove_counterexamples(self):
+        "Go back to the vectors of base_dir, removing the extended dir of the run"
+        if self.data_dir != self.base_dir:
+            remove_cex_eval(self.data_dir)
+            self.data_dir = self.base_dir
+
+
 def solution_set_eval_func(
-    data_dir: str,
+    vectors: TestVectors,
     domain: AbstractDomain,
     helper_funcs: list[str],
     ret_top_func: FunctionWithCondition,
@@ -251,11 +313,38 @@ def solution_set_eval_func(
         FunctionWithCondition
     ]: (
         eval_transfer_func_helper(
-            data_dir, transfer, base, ret_top_func, domain, helper_funcs
+            vectors.data_dir, transfer, base, ret_top_func, domain, helper_funcs
         )
     )
 
 
+def solution_set_outcomes_func(
+    vectors: TestVectors,
+    domain: AbstractDomain,
+    helper_funcs: list[str],
+) -> Callable[
+    [
+        list[FunctionWithCondition],
+        list[FunctionWithCondition],
+    ],
+    EvalOutcomes,
+]:
+    "This function returns a function evaluating the outcomes of transfer functions against base functions"
+
+    def outcomes_func(
+        transfer: list[FunctionWithCondition], base: list[FunctionWithCondition]
+    ) -> EvalOutcomes:
+        return eval_transfer_outcomes(
+            vectors.data_dir,
+            [to_eval_unit(fc) for fc in transfer],
+            [to_eval_unit(fc) for fc in base],
+            helper_funcs,
+            domain,
+        )
+
+    return outcomes_func
+
+
 def tests_sampler_helper(
     domain: AbstractDomain,
     data_dir: str,
@@ -286,13 +375,13 @@ def tests_sampler_helper(
 
 def solution_set_tests_sampler(
     domain: AbstractDomain,
-    data_dir: str,
+    vectors: TestVectors,
     helper_srcs: list[str],
 ) -> Callable[[list[FunctionWithCondition], int, int], None]:
     return lambda base=list[
         FunctionWithCondition
     ], samples=int, seed=int: tests_sampler_helper(
-        domain, data_dir, samples, seed, helper_srcs, base
+        domain, vectors.data_dir, samples, seed, helper_srcs, base
     )
 
 
@@ -463,11 +552,16 @@ def run(
     weighted_dsl: bool,
     num_unsound_candidates: int,
     outputs_folder: Path,
+    eval_engines: int = 1,
+    eval_threads: int = 1,
+    verify_workers: int = 1,
+    solver_settings: SolverSettings = SolverSettings(),
 ) -> EvalResult:
     assert min(lbws, default=4) >= 4 or domain != AbstractDomain.IntegerModulo
     EvalResult.init_bw_settings(
         set(lbws), set([t[0] for t in mbws]), set([t[0] for t in hbws])
     )
+    clear_lowered_funcs()
 
     logger.debug("Round_ID\tSound%\tUExact%\tDisReduce\tCost")
 
@@ -490,132 +584,153 @@ def run(
     data_dir = setup_eval(
         domain, lbws, mbws, hbws, random_seed, "\n".join(helper_funcs_cpp)
     )
-
-    solution_eval_func = solution_set_eval_func(
-        data_dir, domain, helper_funcs_cpp, ret_top_func
-    )
-    solution_tests_sampler = solution_set_tests_sampler(
+    vectors = TestVectors(
         domain,
         data_dir,
-        helper_funcs_cpp,
-    )
-    solution_set: SolutionSet = UnsizedSolutionSet(
-        base_transfers,
-        print_to_cpp,
-        solution_eval_func,
-        solution_tests_sampler,
-        logger,
-        eliminate_dead_code,
-    )
-
-    # eval the initial solutions in the solution set
-    init_cmp_res = solution_set.eval_improve([])
-    logger.info(
-        f"Initial Solution. Sound:{init_cmp_res[0].get_sound_prop() * 100:.4f}% Exact: {init_cmp_res[0].get_exact_prop() * 100:.4f}%"
-    )
-    print(
-        f"init_solution\t{init_cmp_res[0].get_sound_prop() * 100:.4f}%\t{init_cmp_res[0].get_exact_prop() * 100:.4f}%"
+        random_seed,
+        "\n".join(helper_funcs_cpp),
+        max((t[2] for t in hbws), default=CEX_CONC_SAMPLES),
     )
-
-    current_prog_len = program_length
-    # current_prog_len = min(4, current_prog_len) # enable this for increasing program length
-    current_total_rounds = total_rounds
-    # current_total_rounds = min(500, total_rounds) # enable this for increasing total rounds
-    current_num_abd_procs = num_abd_procs
-    # current_num_abd_procs = min(0, num_abd_procs) # enable this for increasing number of abd procs
-    for ith_iter in range(num_iters):
-        # gradually increase the program length
-        current_prog_len += (program_length - current_prog_len) // (
-            num_iters - ith_iter
-        )
-        current_total_rounds += (total_rounds - current_total_rounds) // (
-            num_iters - ith_iter
+    # The extended dirs are only used by this run and are not kept in the store
+    try:
+        configure_eval_engines(eval_engines, eval_threads)
+        configure_solver(solver_settings)
+        configure_verifier_workers(verify_workers)
+
+        solution_eval_func = solution_set_eval_func(
+            vectors, domain, helper_funcs_cpp, ret_top_func
         )
-        current_num_abd_procs += (num_abd_procs - current_num_abd_procs) // (
-            num_iters - ith_iter
+        solution_tests_sampler = solution_set_tests_sampler(
+            domain,
+            vectors,
+            helper_funcs_cpp,
         )
-        print(f"Iteration {ith_iter} starts...")
-        if weighted_dsl:
-            assert isinstance(solution_set, UnsizedSolutionSet)
-            # if solution_set.solutions_size > 0:
-            context_weighted.weighted = True
-            solution_set.learn_weights(context_weighted)
-        solution_set = synthesize_one_iteration(
-            ith_iter,
-            helper_funcs.transfer_func,
-            context,
-            context_weighted,
-            context_cond,
-            random,
-            solution_set,
+        solution_set: SolutionSet = UnsizedSolutionSet(
+            base_transfers,
+            print_to_cpp,
+            solution_eval_func,
+            solution_tests_sampler,
             logger,
-            helper_funcs.crt_func,
-            helper_funcs.items_to_print(),
-            ctx,
-            num_programs,
-            current_prog_len,
-            condition_length,
-            current_num_abd_procs,
-            current_total_rounds,
-            solution_size,
-            inv_temp,
-            num_unsound_candidates,
-        )
-
-        print_set_of_funcs_to_file(
-            [f.to_str(eliminate_dead_code) for f in solution_set.solutions],
-            ith_iter,
-            outputs_folder,
+            eliminate_dead_code,
+            eval_cache=EvalCache(data_dir, eliminate_dead_code),
+            outcomes_func=solution_set_outcomes_func(vectors, domain, helper_funcs_cpp),
+            counterexample_func=vectors.add_counterexamples,
+            # the lazy bounds only hold when the meet intersects sets of facts
+            lazy_greedy=domain == AbstractDomain.KnownBits,
         )
 
-        final_cmp_res = solution_set.eval_improve([])
-        lbw_mbw_log = "\n".join(
-            f"bw: {res.bitwidth}, dist: {res.dist:.2f}, exact%: {res.get_exact_prop() * 100:.4f}"
-            for res in final_cmp_res[0].get_low_med_res()
-        )
-        hbw_log = "\n".join(
-            f"bw: {res.bitwidth}, dist: {res.dist:.2f}"
-            for res in final_cmp_res[0].get_high_res()
-        )
+        # eval the initial solutions in the solution set
+        init_cmp_res = solution_set.eval_improve([])
         logger.info(
-            f"""Iter {ith_iter} Finished. Result of Current Solution: \n{lbw_mbw_log}\n{hbw_log}\n"""
+            f"Initial Solution. Sound:{init_cmp_res[0].get_sound_prop() * 100:.4f}% Exact: {init_cmp_res[0].get_exact_prop() * 100:.4f}%"
         )
-
         print(
-            f"Iteration {ith_iter} finished. Exact: {final_cmp_res[0].get_exact_prop() * 100:.4f}%, Size of the solution set: {solution_set.solutions_size}"
+            f"init_solution\t{init_cmp_res[0].get_sound_prop() * 100:.4f}%\t{init_cmp_res[0].get_exact_prop() * 100:.4f}%"
         )
 
-        if solution_set.is_perfect:
-            print("Found a perfect solution")
-            break
-
-        desired_unsolved_test_cases = 0
-        new_test = solution_set.sample_unsolved_tests_up_to(
-            desired_unsolved_test_cases, random.randint(0, 1_000_000)
+        current_prog_len = program_length
+        # current_prog_len = min(4, current_prog_len) # enable this for increasing program length
+        current_total_rounds = total_rounds
+        # current_total_rounds = min(500, total_rounds) # enable this for increasing total rounds
+        current_num_abd_procs = num_abd_procs
+        # current_num_abd_procs = min(0, num_abd_procs) # enable this for increasing number of abd procs
+        for ith_iter in range(num_iters):
+            # gradually increase the program length
+            current_prog_len += (program_length - current_prog_len) // (
+                num_iters - ith_iter
+            )
+            current_total_rounds += (total_rounds - current_total_rounds) // (
+                num_iters - ith_iter
+            )
+            current_num_abd_procs += (num_abd_procs - current_num_abd_procs) // (
+                num_iters - ith_iter
+            )
+            print(f"Iteration {ith_iter} starts...")
+            if weighted_dsl:
+                assert isinstance(solution_set, UnsizedSolutionSet)
+                # if solution_set.solutions_size > 0:
+                context_weighted.weighted = True
+                solution_set.learn_weights(context_weighted)
+            solution_set = synthesize_one_iteration(
+                ith_iter,
+                helper_funcs.transfer_func,
+                context,
+                context_weighted,
+                context_cond,
+                random,
+                solution_set,
+                logger,
+                helper_funcs.crt_func,
+                helper_funcs.items_to_print(),
+                ctx,
+                num_programs,
+                current_prog_len,
+                condition_length,
+                current_num_abd_procs,
+                current_total_rounds,
+                solution_size,
+                inv_temp,
+                num_unsound_candidates,
+            )
+
+            print_set_of_funcs_to_file(
+                [f.to_str(eliminate_dead_code) for f in solution_set.solutions],
+                ith_iter,
+                outputs_folder,
+            )
+
+            final_cmp_res = solution_set.eval_improve([])
+            lbw_mbw_log = "\n".join(
+                f"bw: {res.bitwidth}, dist: {res.dist:.2f}, exact%: {res.get_exact_prop() * 100:.4f}"
+                for res in final_cmp_res[0].get_low_med_res()
+            )
+            hbw_log = "\n".join(
+                f"bw: {res.bitwidth}, dist: {res.dist:.2f}"
+                for res in final_cmp_res[0].get_high_res()
+            )
+            logger.info(
+                f"""Iter {ith_iter} Finished. Result of Current Solution: \n{lbw_mbw_log}\n{hbw_log}\n"""
+            )
+            logger.info(f"Eval cache: {solution_set.eval_cache}")
+
+            print(
+                f"Iteration {ith_iter} finished. Exact: {final_cmp_res[0].get_exact_prop() * 100:.4f}%, Size of the solution set: {solution_set.solutions_size}"
+            )
+
+            if solution_set.is_perfect:
+                print("Found a perfect solution")
+                break
+
+            desired_unsolved_test_cases = 0
+            new_test = solution_set.sample_unsolved_tests_up_to(
+                desired_unsolved_test_cases, random.randint(0, 1_000_000)
+            )
+            logger.info(f"New test cases sampled: {new_test}")
+
+        # Eval last solution:
+        if not solution_set.has_solution():
+            raise Exception("Found no solutions")
+        solution_module, solution_str = solution_set.generate_solution_and_cpp()
+        save_solution(solution_module, solution_str, outputs_folder)
+        # Scored on the enumerated vectors only, to compare with other runs
+        cmp_results = eval_transfer_func(
+            data_dir,
+            ["solution"],
+            [solution_str],
+            [],
+            [],
+            helper_funcs_cpp,
+            domain,
         )
-        logger.info(f"New test cases sampled: {new_test}")
-
-    # Eval last solution:
-    if not solution_set.has_solution():
-        raise Exception("Found no solutions")
-    solution_module, solution_str = solution_set.generate_solution_and_cpp()
-    save_solution(solution_module, solution_str, outputs_folder)
-    cmp_results = eval_transfer_func(
-        data_dir,
-        ["solution"],
-        [solution_str],
-        [],
-        [],
-        helper_funcs_cpp,
-        domain,
-    )
 
-    solution_result = cmp_results[0]
-    print(
-        f"last_solution\t{solution_result.get_sound_prop() * 100:.2f}%\t{solution_result.get_exact_prop() * 100:.2f}%"
-    )
+        solution_result = cmp_results[0]
+        print(
+            f"last_solution\t{solution_result.get_sound_prop() * 100:.2f}%\t{solution_result.get_exact_prop() * 100:.2f}%"
+        )
 
-    return solution_result
+        return solution_result
+    finally:
+        vectors.remove_counterexamples()
 
 
 def main() -> None:
@@ -647,6 +762,10 @@ def main() -> None:
         weighted_dsl=args.weighted_dsl,
         num_unsound_candidates=args.num_unsound_candidates,
         outputs_folder=args.outputs_folder,
+        eval_engines=args.eval_engines,
+        eval_threads=args.eval_threads,
+        verify_workers=args.verify_workers,
+        solver_settings=verifier_settings(args),
     )
 
 
@@ -1,10 +1,8 @@
 import argparse
-import subprocess
 
 from xdsl.context import Context
 from xdsl.parser import Parser
 
-from io import StringIO
 
 from xdsl.utils.hints import isa
 from ..dialects.smt_dialect import (
@@ -66,7 +64,7 @@ from ..utils.transfer_function_check_util import (
 )
 from ..passes.transfer_unroll_loop import UnrollTransferLoop
 from xdsl_smt.semantics import transfer_semantics
-from ..traits.smt_printer import print_to_smtlib
+from ..utils.dialect_to_z3 import configure_solver_cache, get_solver
 from xdsl_smt.passes.lower_pairs import LowerPairs
 from xdsl.transforms.canonicalize import CanonicalizePass
 from xdsl_smt.semantics.arith_semantics import arith_semantics
@@ -92,6 +90,12 @@ def register_all_arguments(arg_parser: argparse.ArgumentParser):
         help="path to the transfer functions",
         default=8,
     )
+    arg_parser.add_argument(
+        "-solver-cache",
+        default=False,
+        action="store_true",
+        help="Cache the solver results on disk, see xdsl_smt/utils/solver_cache.py",
+    )
 
 
 def parse_file(ctx: Context, file: str | None) -> Operation:
@@ -136,21 +140,11 @@ def fix_bit_width_in_verify_pattern(module: ModuleOp):
 
 def verify_pattern(ctx: Context, op: ModuleOp) -> bool:
     cloned_op = op.clone()
-    stream = StringIO()
     LowerPairs().apply(ctx, cloned_op)
     CanonicalizePass().apply(ctx, cloned_op)
     DeadCodeElimination().apply(ctx, cloned_op)
     fix_bit_width_in_verify_pattern(cloned_op)
-    print_to_smtlib(cloned_op, stream)
-    res = subprocess.run(
-        ["z3", "-in"],
-        capture_output=True,
-        input=stream.getvalue(),
-        text=True,
-    )
-    if res.returncode != 0:
-        raise Exception(res.stderr)
-    return "unsat" in res.stdout
+    return get_solver().is_unsat(cloned_op)
 
 
 def get_dynamic_concrete_function_name(concrete_op_name: str) -> str:
@@ -740,6 +734,8 @@ def main() -> None:
     arg_parser = argparse.ArgumentParser()
     register_all_arguments(arg_parser)
     args = arg_parser.parse_args()
+    if args.solver_cache:
+        configure_solver_cache(True)
 
     # Register all dialects
     ctx.load_dialect(Arith)
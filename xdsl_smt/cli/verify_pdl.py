@@ -4,22 +4,39 @@ Verify a PDL rewrite for different integer types.
 Check for both correctness and precision.
 """
 
-import subprocess
 import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 
 from io import StringIO
-from typing import Iterable
+from typing import Generator, Iterable, TypeVar
 from xdsl.ir import Dialect
 from xdsl.context import Context
 
 from xdsl.dialects.builtin import Builtin, ModuleOp, IntegerType
 from xdsl.dialects.func import Func
-from xdsl.dialects.pdl import PDL, PatternOp, TypeOp
+from xdsl.dialects.pdl import (
+    PDL,
+    ApplyNativeConstraintOp,
+    ApplyNativeRewriteOp,
+    AttributeOp,
+    OperandOp,
+    OperandsOp,
+    OperationOp,
+    PatternOp,
+    ReplaceOp,
+    ResultOp,
+    RewriteOp,
+    TypeOp,
+)
 from xdsl.dialects.arith import Arith
 from xdsl.dialects.comb import Comb
 from xdsl.transforms.common_subexpression_elimination import (
     CommonSubexpressionElimination,
 )
+from xdsl.parser import Parser
+from xdsl.printer import Printer
 from xdsl.xdsl_opt_main import xDSLOptMain
 
 from xdsl_smt.passes.lower_effects import LowerEffectPass
@@ -39,6 +56,14 @@ from xdsl_smt.passes.lower_pairs import LowerPairs
 from xdsl.transforms.canonicalize import CanonicalizePass
 from xdsl_smt.passes.pdl_to_smt import PDLToSMT
 from ..traits.smt_printer import print_to_smtlib
+from ..utils.dialect_to_z3 import (
+    DEFAULT_PORTFOLIO,
+    SolverSettings,
+    configure_solver,
+    configure_solver_cache,
+    get_solver,
+    get_solver_settings,
+)
 from xdsl_smt.pdl_constraints.integer_arith_constraints import (
     integer_arith_native_rewrites,
     integer_arith_native_constraints,
@@ -48,7 +73,8 @@ from xdsl_smt.passes.lower_to_smt.smt_lowerer_loaders import load_vanilla_semant
 from xdsl_smt.passes.smt_expand import SMTExpand
 
 
-def verify_pattern(ctx: Context, op: ModuleOp, opt: bool) -> bool:
+def verify_pattern(ctx: Context, op: ModuleOp, opt: bool) -> bool | None:
+    """Whether the pattern is sound, or None if the solver gave up on it."""
     cloned_op = op.clone()
     PDLToSMT().apply(ctx, cloned_op)
     LowerEffectPass().apply(ctx, cloned_op)
@@ -59,21 +85,170 @@ def verify_pattern(ctx: Context, op: ModuleOp, opt: bool) -> bool:
         CommonSubexpressionElimination().apply(ctx, cloned_op)
         CanonicalizePass().apply(ctx, cloned_op)
     cloned_op.verify()
-    stream = StringIO()
-    print_to_smtlib(cloned_op, stream)
-    res = subprocess.run(
-        ["z3", "-in"],
-        capture_output=True,
-        input=stream.getvalue(),
-        text=True,
-    )
-    if res.returncode != 0:
+    try:
+        return get_solver().check_unsat(cloned_op)
+    except Exception as e:
+        stream = StringIO()
+        print_to_smtlib(cloned_op, stream)
         raise Exception(
             "An exception was raised in the following program: "
-            f"{stream.getvalue()} \n\n Error message: {res.stderr}"
-        )
+            f"{stream.getvalue()} \n\n Error message: {e}"
+        ) from e
+
+
+def register_dialects(ctx: Context):
+    NEW_PDL = Dialect(
+        "pdl",
+        [*PDL.operations, *PDLDataflowDialect.operations],
+        [*PDL.attributes, *PDLDataflowDialect.attributes],
+    )
+    SMT_COLLECTION = Dialect(
+        "smt",
+        [
+            *SMTDialect.operations,
+            *SMTBitVectorDialect.operations,
+            *SMTUtilsDialect.operations,
+        ],
+        [
+            *SMTDialect.attributes,
+            *SMTBitVectorDialect.attributes,
+            *SMTUtilsDialect.attributes,
+        ],
+    )
+    ctx.register_dialect(Arith.name, lambda: Arith)
+    ctx.register_dialect(Builtin.name, lambda: Builtin)
+    ctx.register_dialect(Func.name, lambda: Func)
+    ctx.register_dialect(Index.name, lambda: Index)
+    ctx.register_dialect(SMT_COLLECTION.name, lambda: SMT_COLLECTION)
+    ctx.register_dialect(Transfer.name, lambda: Transfer)
+    ctx.register_dialect(Hoare.name, lambda: Hoare)
+    ctx.register_dialect(PDL.name, lambda: NEW_PDL)
+    ctx.register_dialect(Comb.name, lambda: Comb)
+    ctx.register_dialect(HW.name, lambda: HW)
+    ctx.register_dialect(LLVM.name, lambda: LLVM)
+
+
+def load_semantics():
+    load_vanilla_semantics()
+    PDLToSMT.pdl_lowerer.native_rewrites = integer_arith_native_rewrites
+    PDLToSMT.pdl_lowerer.native_constraints = integer_arith_native_constraints
+    PDLToSMT.pdl_lowerer.native_static_constraints = (
+        integer_arith_native_static_constraints
+    )
+
+
+_worker_ctx: Context | None = None
+"The context of a worker process, with the dialects of verify-pdl"
+
+
+def _init_worker(settings: SolverSettings, solver_cache: bool) -> None:
+    global _worker_ctx
+    _worker_ctx = Context()
+    register_dialects(_worker_ctx)
+    load_semantics()
+    configure_solver_cache(solver_cache)
+    configure_solver(settings)
 
-    return "unsat" in res.stdout
+
+def _verify_job(pattern_src: str, opt: bool) -> bool | None:
+    assert _worker_ctx is not None
+    module = Parser(_worker_ctx, pattern_src).parse_module()
+    return verify_pattern(_worker_ctx, module, opt)
+
+
+def _print_module(module: ModuleOp) -> str:
+    stream = StringIO()
+    Printer(stream, print_generic_format=True).print_op(module)
+    return stream.getvalue()
+
+
+_Key = TypeVar("_Key")
+
+
+def verify_patterns(
+    ctx: Context,
+    jobs: Iterable[tuple[_Key, PatternOp]],
+    opt: bool,
+    num_workers: int,
+    solver_cache: bool = False,
+) -> Generator[tuple[_Key, bool | None], None, None]:
+    """
+    Verify the specialized patterns of jobs, and yield the key and the result
+    of each, in the order of jobs.
+
+    With several workers, the jobs are streamed to a pool of processes, with a
+    bounded number of them in flight, and each result is yielded as soon as
+    the results of all the jobs before it are. The pending jobs are cancelled
+    when the generator is closed early.
+    """
+    if num_workers <= 1:
+        for key, pattern in jobs:
+            yield key, verify_pattern(ctx, ModuleOp([pattern]), opt)
+        return
+
+    pool = ProcessPoolExecutor(
+        num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(get_solver_settings(), solver_cache),
+    )
+    in_flight: deque[tuple[_Key, Future[bool | None]]] = deque()
+    try:
+        for key, pattern in jobs:
+            src = _print_module(ModuleOp([pattern]))
+            in_flight.append((key, pool.submit(_verify_job, src, opt)))
+            # Keep every worker busy while the head of the queue is waited for
+            if len(in_flight) >= 4 * num_workers:
+                key, future = in_flight.popleft()
+                yield key, future.result()
+        while in_flight:
+            key, future = in_flight.popleft()
+            yield key, future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+BIT_PARALLEL_OPS = {"comb.and", "comb.or", "comb.xor", "hw.constant"}
+"Operations computing each bit of their result from the same bit of their operands"
+
+BIT_PARALLEL_REWRITES = {"get_zero_attr", "get_minus_one_attr", "andi", "ori", "xori"}
+"Native rewrites computing attributes bit by bit, or with all bits equal"
+
+BIT_PARALLEL_CONSTRAINTS = {"is_zero", "is_minus_one"}
+"Native constraints holding iff they hold on every bit"
+
+
+def is_bit_parallel(pattern: PatternOp) -> bool:
+    """
+    Whether the pattern is sound at every bitwidth iff it is sound when its
+    integer types are a single bit.
+
+    This holds when both sides only compute each bit of a value from the same
+    bit of the other values, and the constraints of the pattern hold iff they
+    hold on every bit. A counterexample at any bitwidth is then unsound on one
+    of its bits, and that bit alone is a counterexample of one bit.
+    """
+    for op in pattern.walk():
+        if op is pattern or isinstance(
+            op, TypeOp | OperandOp | OperandsOp | ResultOp | RewriteOp | ReplaceOp
+        ):
+            continue
+        if isinstance(op, OperationOp):
+            if op.opName is None or op.opName.data not in BIT_PARALLEL_OPS:
+                return False
+        elif isinstance(op, AttributeOp):
+            # A constant, e.g. 1, is not the same on every bit
+            if op.value is not None:
+                return False
+        elif isinstance(op, ApplyNativeRewriteOp):
+            if op.constraint_name.data not in BIT_PARALLEL_REWRITES:
+                return False
+        elif isinstance(op, ApplyNativeConstraintOp):
+            if op.constraint_name.data not in BIT_PARALLEL_CONSTRAINTS:
+                return False
+        else:
+            return False
+    return True
 
 
 def iterate_on_all_integers(
@@ -133,43 +308,68 @@ class OptMain(xDSLOptMain):
             action="store_true",
             help="Optimize the SMT query before sending it to Z3",
         )
+        arg_parser.add_argument(
+            "-solver-cache",
+            default=False,
+            action="store_true",
+            help="Cache the solver results on disk, see xdsl_smt/utils/solver_cache.py",
+        )
+        arg_parser.add_argument(
+            "-timeout",
+            type=int,
+            default=None,
+            help="time limit of each query in milliseconds, after which it is unknown",
+        )
+        arg_parser.add_argument(
+            "-memory",
+            type=int,
+            default=None,
+            help="memory limit of the solver in megabytes",
+        )
+        arg_parser.add_argument(
+            "-portfolio",
+            default=False,
+            action="store_true",
+            help="Race differently configured solvers on each query",
+        )
+        arg_parser.add_argument(
+            "-bit-parallel",
+            default=False,
+            action="store_true",
+            help="Only verify patterns of bitwise operations on one bit, which "
+            "covers all bitwidths, see is_bit_parallel",
+        )
+        arg_parser.add_argument(
+            "-workers",
+            type=int,
+            default=1,
+            help="number of processes the specialized patterns are verified on",
+        )
+        arg_parser.add_argument(
+            "-fail-fast",
+            default=False,
+            action="store_true",
+            help="Stop at the first unsound pattern",
+        )
 
         super().register_all_arguments(arg_parser)
 
     def register_all_dialects(self):
-        NEW_PDL = Dialect(
-            "pdl",
-            [*PDL.operations, *PDLDataflowDialect.operations],
-            [*PDL.attributes, *PDLDataflowDialect.attributes],
-        )
-        SMT_COLLECTION = Dialect(
-            "smt",
-            [
-                *SMTDialect.operations,
-                *SMTBitVectorDialect.operations,
-                *SMTUtilsDialect.operations,
-            ],
-            [
-                *SMTDialect.attributes,
-                *SMTBitVectorDialect.attributes,
-                *SMTUtilsDialect.attributes,
-            ],
-        )
-        self.ctx.register_dialect(Arith.name, lambda: Arith)
-        self.ctx.register_dialect(Builtin.name, lambda: Builtin)
-        self.ctx.register_dialect(Func.name, lambda: Func)
-        self.ctx.register_dialect(Index.name, lambda: Index)
-        self.ctx.register_dialect(SMT_COLLECTION.name, lambda: SMT_COLLECTION)
-        self.ctx.register_dialect(Transfer.name, lambda: Transfer)
-        self.ctx.register_dialect(Hoare.name, lambda: Hoare)
-        self.ctx.register_dialect(PDL.name, lambda: NEW_PDL)
-        self.ctx.register_dialect(Comb.name, lambda: Comb)
-        self.ctx.register_dialect(HW.name, lambda: HW)
-        self.ctx.register_dialect(LLVM.name, lambda: LLVM)
+        register_dialects(self.ctx)
 
     def run(self):
         """Executes the different steps."""
 
+        if self.args.solver_cache:
+            configure_solver_cache(True)
+        configure_solver(
+            SolverSettings(
+                self.args.timeout,
+                self.args.memory,
+                DEFAULT_PORTFOLIO if self.args.portfolio else (),
+            )
+        )
+
         chunks, file_extension = self.prepare_input()
         assert len(chunks) == 1
         chunk = chunks[0][0]
@@ -181,37 +381,63 @@ class OptMain(xDSLOptMain):
             chunk.close()
 
         is_one_unsound = False
+        is_one_unknown = False
 
-        for pattern in module.walk():
-            if isinstance(pattern, PatternOp):
-                if pattern.sym_name:
-                    print(f"Verifying pattern {pattern.sym_name.data}:")
+        patterns = [op for op in module.walk() if isinstance(op, PatternOp)]
+        # Bit-parallel patterns are verified for all bitwidths on a single bit,
+        # the others fall back to every bitwidth up to the maximum one
+        max_bitwidths = [
+            (
+                1
+                if self.args.bit_parallel and is_bit_parallel(pattern)
+                else self.args.max_bitwidth
+            )
+            for pattern in patterns
+        ]
+        jobs = (
+            ((i, types), specialized_pattern)
+            for i, pattern in enumerate(patterns)
+            for specialized_pattern, types in iterate_on_all_integers(
+                pattern, max_bitwidths[i]
+            )
+        )
+        results = verify_patterns(
+            self.ctx, jobs, self.args.opt, self.args.workers, self.args.solver_cache
+        )
+
+        last_pattern = None
+        for (i, types), sound in results:
+            if i != last_pattern:
+                last_pattern = i
+                if sym_name := patterns[i].sym_name:
+                    print(f"Verifying pattern {sym_name.data}:")
                 else:
                     print(f"Verifying pattern:")
-                for specialized_pattern, types in iterate_on_all_integers(
-                    pattern, self.args.max_bitwidth
-                ):
-                    if verify_pattern(
-                        self.ctx, ModuleOp([specialized_pattern]), self.args.opt
-                    ):
-                        print(f"with types {types}: SOUND")
-                    else:
-                        print(f"with types {types}: UNSOUND")
-                        is_one_unsound = True
+            label = str(types)
+            if max_bitwidths[i] == 1 < self.args.max_bitwidth and types:
+                label += " and all larger bitwidths"
+            if sound is None:
+                print(f"with types {label}: UNKNOWN")
+                is_one_unknown = True
+            elif sound:
+                print(f"with types {label}: SOUND")
+            else:
+                print(f"with types {label}: UNSOUND")
+                is_one_unsound = True
+                if self.args.fail_fast:
+                    results.close()
+                    break
 
         if is_one_unsound:
             print("At least one pattern is unsound")
+        elif is_one_unknown:
+            print("At least one pattern could not be verified")
         else:
             print("All patterns are sound")
 
 
 def main() -> None:
-    load_vanilla_semantics()
-    PDLToSMT.pdl_lowerer.native_rewrites = integer_arith_native_rewrites
-    PDLToSMT.pdl_lowerer.native_constraints = integer_arith_native_constraints
-    PDLToSMT.pdl_lowerer.native_static_constraints = (
-        integer_arith_native_static_constraints
-    )
+    load_semantics()
     OptMain().run()
 
 
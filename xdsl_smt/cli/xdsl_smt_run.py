@@ -12,6 +12,7 @@ from xdsl.parser import Parser
 from xdsl_smt.dialects import smt_dialect as smt
 from xdsl.tools.command_line_tool import CommandLineTool
 from xdsl.traits import CallableOpInterface
+from xdsl_smt.interpreters.compiled import build_compiled, interpret_compiled
 from xdsl_smt.interpreters.smt import SMTFunctions
 from xdsl_smt.interpreters.smt_bitvector import SMTBitVectorFunctions
 
@@ -93,6 +94,12 @@ class xDSLRunMain(CommandLineTool):
             help="Arguments to pass to entry function. Comma-separated list of xDSL "
             "Attributes, that will be parsed and converted by the interpreter.",
         )
+        arg_parser.add_argument(
+            "--compile",
+            action="store_true",
+            help="Compile the program to a Python function over plain integers once, "
+            "rather than interpreting it operation by operation.",
+        )
         return super().register_all_arguments(arg_parser)
 
     def run(self):
@@ -107,8 +114,11 @@ class xDSLRunMain(CommandLineTool):
             )
             if runner_args is None:
                 runner_args = ()
-            interpreter = build_interpreter(module, self.args.index_bitwidth)
-            result = interpret(interpreter, runner_args)
+            if self.args.compile:
+                result = interpret_compiled(build_compiled(module), runner_args)
+            else:
+                interpreter = build_interpreter(module, self.args.index_bitwidth)
+                result = interpret(interpreter, runner_args)
             if result:
                 if len(result) == 1:
                     print(f"{result[0]}")
@@ -1,10 +1,23 @@
-from subprocess import run, PIPE
+import atexit
+from array import array
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from subprocess import run, Popen, PIPE
 from enum import Enum
-from tempfile import mkdtemp
+from tempfile import TemporaryFile
 from pathlib import Path
-from typing import Callable, TypeVar
+from typing import Callable, Literal, NoReturn, TypeVar, cast, overload
 
+import numpy as np
+import numpy.typing as npt
+
+from xdsl_smt.eval_engine.vectors import VectorStore
 from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult, PerBitRes
+from xdsl_smt.utils.synthesizer_utils.eval_outcomes import Bitset, EvalOutcomes
 
 
 class AbstractDomain(Enum):
@@ -29,6 +42,200 @@ class AbstractDomain(Enum):
         return self.name
 
 
+class EvalEngine:
+    """
+    A persistent eval_engine process running in server mode.
+
+    A request is a `<cmd> <len>` header line followed by `len` bytes of payload,
+    a response is an `ok <len>` or `err <len>` header line followed by `len`
+    bytes of payload. Keeping the process alive saves the process start up and
+    lets the engine load the test vectors of a data_dir only once.
+
+    The engine also keeps compiled units (a function together with its callees)
+    resident, this client tracks which units the engine holds so only new ones
+    are sent and compiled. It also keeps the meet of the base units on every
+    test vector, so evaluations against the same solution set only run the
+    synthesized units, and adding a solution to the set only runs that one.
+    """
+
+    max_units: int = 4096
+
+    def __init__(
+        self, engine_path: Path, num_threads: int = 1, text_output: bool = False
+    ):
+        self.pid = os.getpid()
+        self.text_output = text_output
+        self.helper_src: str | None = None
+        self.units: OrderedDict[str, None] = OrderedDict()
+        self.stderr = TemporaryFile()
+        self.proc = Popen(
+            [engine_path, "--server", "--threads", str(num_threads)]
+            + ([] if text_output else ["--binary"]),
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=self.stderr,
+        )
+
+    def _fail(self) -> NoReturn:
+        returncode = self.proc.wait()
+        self.stderr.seek(0)
+        print("EvalEngine failed with this error:")
+        print(self.stderr.read().decode(), end="")
+        exit(returncode)
+
+    def request(self, cmd: str, payload: str) -> bytes:
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+
+        data = payload.encode()
+        try:
+            self.proc.stdin.write(f"{cmd} {len(data)}\n".encode() + data)
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            self._fail()
+
+        header = self.proc.stdout.readline().split()
+        if len(header) != 2:
+            self._fail()
+
+        body = self.proc.stdout.read(int(header[1]))
+        if header[0] != b"ok":
+            print("EvalEngine failed with this error:")
+            print(body.decode())
+            exit(1)
+
+        return body
+
+    def parse_results(self, output: bytes) -> list["EvalResult"]:
+        if self.text_output:
+            return _parse_engine_output(output.decode())
+        return _parse_binary_engine_output(output)
+
+    def eval_units(
+        self,
+        data_dir: str,
+        domain: AbstractDomain,
+        xfer_units: list[tuple[str, str]],
+        base_units: list[tuple[str, str]],
+        helper_src: str,
+        cmd: str = "eval-units",
+    ) -> bytes:
+        if helper_src != self.helper_src:
+            self.request("helpers", helper_src)
+            self.helper_src = helper_src
+            self.units.clear()
+
+        xfer_keys = [_unit_key(name, src, helper_src) for name, src in xfer_units]
+        base_keys = [_unit_key(name, src, helper_src) for name, src in base_units]
+
+        new_units: dict[str, tuple[str, str]] = {}
+        for key, unit in zip(xfer_keys + base_keys, xfer_units + base_units):
+            if key in self.units:
+                self.units.move_to_end(key)
+            else:
+                new_units[key] = unit
+
+        # a batch is compiled as one translation unit, so the function names in
+        # it have to be unique
+        batches: list[dict[str, tuple[str, str]]] = []
+        for key, (name, src) in new_units.items():
+            for batch in batches:
+                if name not in batch:
+                    batch[name] = (key, src)
+                    break
+            else:
+                batches.append({name: (key, src)})
+
+        for batch in batches:
+            keys = [key for key, _ in batch.values()]
+            names = list(batch.keys())
+            srcs = [src for _, src in batch.values()]
+            self.request("compile", f"{keys}\n{names}\n" + "\n".join(srcs))
+            for key in keys:
+                self.units[key] = None
+
+        num_stale = max(len(self.units) - self.max_units, 0)
+        in_use = set(xfer_keys + base_keys)
+        stale = list(islice((k for k in self.units if k not in in_use), num_stale))
+        if stale:
+            self.request("drop", f"{stale}\n")
+            for key in stale:
+                del self.units[key]
+
+        engine_params = ""
+        engine_params += f"{data_dir}\n"
+        engine_params += f"{domain}\n"
+        engine_params += f"{xfer_keys}\n"
+        engine_params += f"{base_keys}\n"
+
+        return self.request(cmd, engine_params)
+
+    def close(self) -> None:
+        if self.proc.poll() is None:
+            assert self.proc.stdin is not None
+            try:
+                self.proc.stdin.write(b"quit 0\n")
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            self.proc.wait()
+        self.stderr.close()
+
+
+def _unit_key(name: str, src: str, helper_src: str) -> str:
+    # units are compiled against the helpers, and the engine keeps the state of
+    # the base units by key, so the same key must always mean the same code
+    return hashlib.sha1(f"{name}\0{src}\0{helper_src}".encode()).hexdigest()
+
+
+_engines: list[EvalEngine] = []
+_num_engines: int = 1
+_num_engine_threads: int = 1
+_engine_text_output: bool = False
+
+
+def configure_eval_engines(
+    num_engines: int, num_threads: int, text_output: bool = False
+) -> None:
+    """
+    Set the number of engine processes candidates are sharded over and the
+    number of threads each engine splits the test vectors over. With
+    text_output the engines report results in the human readable text format
+    instead of the binary one, which is useful for debugging.
+    """
+    global _num_engines, _num_engine_threads, _engine_text_output
+
+    config = (max(num_engines, 1), max(num_threads, 1), text_output)
+    if config != (_num_engines, _num_engine_threads, _engine_text_output):
+        for engine in _engines:
+            if engine.pid == os.getpid():
+                engine.close()
+        _engines.clear()
+
+    _num_engines, _num_engine_threads, _engine_text_output = config
+
+
+def _get_engines() -> list[EvalEngine]:
+    # a forked child must not share the pipes of its parent's engines
+    if _engines and _engines[0].pid != os.getpid():
+        _engines.clear()
+
+    if not _engines:
+        engine_path = Path("xdsl_smt").joinpath("eval_engine", "build", "eval_engine")
+        if not engine_path.exists():
+            raise FileNotFoundError(f"Eval Engine not found at: {engine_path}")
+
+        for _ in range(_num_engines):
+            engine = EvalEngine(engine_path, _num_engine_threads, _engine_text_output)
+            atexit.register(engine.close)
+            _engines.append(engine)
+
+    return _engines
+
+
+def _get_engine() -> EvalEngine:
+    return _get_engines()[0]
+
+
 def _get_per_bit(x: list[str]) -> list[PerBitRes]:
     T = TypeVar("T")
 
@@ -46,14 +253,15 @@ def _get_per_bit(x: list[str]) -> list[PerBitRes]:
         return eval(s)
 
     bw = get(x[0], "bw", int)
-    num_cases = get(x[1], "num cases", int)
-    num_unsolved_cases = get(x[2], "num unsolved", int)
-    base_distance = get(x[3], "base distance", float)
-    sound = get(x[4], "num sound", get_ints)
-    distance = get(x[5], "distance", get_floats)
-    exact = get(x[6], "num exact", get_ints)
-    num_unsolved_exact_cases = get(x[7], "num unsolved exact", get_ints)
-    sound_distance = get(x[8], "sound distance", get_floats)
+    cex = get(x[1], "cex", int)
+    num_cases = get(x[2], "num cases", int)
+    num_unsolved_cases = get(x[3], "num unsolved", int)
+    base_distance = get(x[4], "base distance", float)
+    sound = get(x[5], "num sound", get_ints)
+    distance = get(x[6], "distance", get_floats)
+    exact = get(x[7], "num exact", get_ints)
+    num_unsolved_exact_cases = get(x[8], "num unsolved exact", get_ints)
+    sound_distance = get(x[9], "sound distance", get_floats)
 
     assert len(sound) > 0, "No output from EvalEngine"
     assert (
@@ -75,16 +283,14 @@ def _get_per_bit(x: list[str]) -> list[PerBitRes]:
             base_dist=base_distance,
             sound_dist=sound_distance[i],
             bitwidth=bw,
+            cex=bool(cex),
         )
         for i in range(len(sound))
     ]
 
 
-def _parse_engine_output(output: str) -> list[EvalResult]:
-    bw_evals = output.split("---\n")
-    bw_evals.reverse()
-    per_bits = [_get_per_bit(x.split("\n")) for x in bw_evals if x != ""]
-
+def _collect_per_bit(per_bits: list[list[PerBitRes]]) -> list[EvalResult]:
+    "Turn the per bitwidth results of all functions into the results per function"
     ds: list[list[PerBitRes]] = [[] for _ in range(len(per_bits[0]))]
     for es in per_bits:
         for i, e in enumerate(es):
@@ -93,6 +299,148 @@ def _parse_engine_output(output: str) -> list[EvalResult]:
     return [EvalResult(x) for x in ds]
 
 
+def _parse_engine_output(output: str) -> list[EvalResult]:
+    bw_evals = output.split("---\n")
+    bw_evals.reverse()
+    per_bits = [_get_per_bit(x.split("\n")) for x in bw_evals if x != ""]
+
+    return _collect_per_bit(per_bits)
+
+
+_RESULTS_HEADER = struct.Struct("=IIQQQd")
+
+
+def _parse_binary_engine_output(output: bytes) -> list[EvalResult]:
+    "Decode the output of Results::printBinary, see Results.h for the layout"
+    view = memoryview(output)
+    offset = 0
+
+    def take_ints(n: int) -> list[int]:
+        nonlocal offset
+        column = array("Q")
+        column.frombytes(view[offset : offset + 8 * n])
+        offset += 8 * n
+        return column.tolist()
+
+    def take_floats(n: int) -> list[float]:
+        nonlocal offset
+        column = array("d")
+        column.frombytes(view[offset : offset + 8 * n])
+        offset += 8 * n
+        return column.tolist()
+
+    per_bits: list[list[PerBitRes]] = []
+    while offset < len(output):
+        (
+            bw,
+            num_fns,
+            cex,
+            num_cases,
+            num_unsolved_cases,
+            base_distance,
+        ) = _RESULTS_HEADER.unpack_from(output, offset)
+        offset += _RESULTS_HEADER.size
+
+        sound = take_ints(num_fns)
+        distance = take_floats(num_fns)
+        exact = take_ints(num_fns)
+        num_unsolved_exact_cases = take_ints(num_fns)
+        sound_distance = take_floats(num_fns)
+
+        assert num_fns > 0, "No output from EvalEngine"
+        per_bits.append(
+            [
+                PerBitRes(
+                    all_cases=num_cases,
+                    sounds=sound[i],
+                    exacts=exact[i],
+                    dist=distance[i],
+                    unsolved_cases=num_unsolved_cases,
+                    unsolved_exacts=num_unsolved_exact_cases[i],
+                    base_dist=base_distance,
+                    sound_dist=sound_distance[i],
+                    bitwidth=bw,
+                    cex=bool(cex),
+                )
+                for i in range(num_fns)
+            ]
+        )
+
+    per_bits.reverse()
+    return _collect_per_bit(per_bits)
+
+
+_OUTCOMES_HEADER = struct.Struct("=IIQQ")
+_Scalar = TypeVar("_Scalar", bound=np.generic)
+
+
+def _parse_outcomes(output: bytes) -> EvalOutcomes:
+    "Decode the output of Outcomes::printBinary, see Results.h for the layout"
+    offset = 0
+
+    def take_bits(n: int) -> npt.NDArray[np.bool_]:
+        nonlocal offset
+        num_bytes = 8 * ((n + 63) // 64)
+        packed = np.frombuffer(output, np.uint8, num_bytes, offset)
+        offset += num_bytes
+        return np.unpackbits(packed, count=n, bitorder="little").astype(np.bool_)
+
+    def take_floats(n: int) -> npt.NDArray[np.float64]:
+        nonlocal offset
+        column = np.frombuffer(output, np.float64, n, offset)
+        offset += 8 * n
+        return column
+
+    bitwidths: list[int] = []
+    offsets = [0]
+    cexs: list[bool] = []
+    solved: list[npt.NDArray[np.bool_]] = []
+    base_dist: list[npt.NDArray[np.float64]] = []
+    sound: list[list[npt.NDArray[np.bool_]]] = []
+    exact: list[list[npt.NDArray[np.bool_]]] = []
+    dist: list[list[npt.NDArray[np.float64]]] = []
+    num_fns = 0
+    while offset < len(output):
+        bw, num_fns, cex, num_vecs = _OUTCOMES_HEADER.unpack_from(output, offset)
+        offset += _OUTCOMES_HEADER.size
+
+        bitwidths.append(bw)
+        offsets.append(offsets[-1] + num_vecs)
+        cexs.append(bool(cex))
+        solved.append(take_bits(num_vecs))
+        base_dist.append(take_floats(num_vecs))
+        sound.append([])
+        exact.append([])
+        dist.append([])
+        for _ in range(num_fns):
+            sound[-1].append(take_bits(num_vecs))
+            exact[-1].append(take_bits(num_vecs))
+            dist[-1].append(take_floats(num_vecs))
+
+    def by_fn(
+        segments: list[list[npt.NDArray[_Scalar]]], dtype: type[_Scalar]
+    ) -> npt.NDArray[_Scalar]:
+        if num_fns == 0:
+            return np.zeros((0, offsets[-1]), dtype)
+        return np.concatenate([np.stack(seg) for seg in segments], axis=1)
+
+    # the bitsets of the bitwidths are not byte aligned, so they are joined
+    # unpacked and packed again
+    def pack(bits: npt.NDArray[np.bool_]) -> Bitset:
+        return np.packbits(bits, axis=-1, bitorder="little")
+
+    return EvalOutcomes(
+        bitwidths,
+        offsets,
+        cexs,
+        pack(np.concatenate(solved)),
+        np.concatenate(base_dist),
+        pack(by_fn(sound, np.bool_)),
+        pack(by_fn(exact, np.bool_)),
+        by_fn(dist, np.float64),
+    )
+
+
 def setup_eval(
     domain: AbstractDomain,
     low_bws: list[int],
@@ -105,32 +453,100 @@ def setup_eval(
     if not engine_path.exists():
         raise FileNotFoundError(f"Enumeration Engine not found at: {engine_path}")
 
-    dirpath = f"{mkdtemp()}/"
+    def enumerate_vectors(
+        dirpath: Path,
+        low_bws: list[int],
+        med_bws: list[tuple[int, int]],
+        high_bws: list[tuple[int, int, int]],
+    ):
+        engine_params = ""
+        engine_params += f"{dirpath}/\n"
+        engine_params += f"{domain}\n"
+        engine_params += f"{low_bws}\n"
+        engine_params += f"{med_bws}\n"
+        engine_params += f"{high_bws}\n"
+        engine_params += f"{seed}\n"
+        engine_params += "using A::APInt;\n"
+        engine_params += f"{conc_op_src}"
+
+        engine_output = run(
+            [engine_path],
+            input=engine_params,
+            text=True,
+            stdout=PIPE,
+            stderr=PIPE,
+        )
 
-    engine_params = ""
-    engine_params += f"{dirpath}\n"
-    engine_params += f"{domain}\n"
-    engine_params += f"{low_bws}\n"
-    engine_params += f"{med_bws}\n"
-    engine_params += f"{high_bws}\n"
-    engine_params += f"{seed}\n"
-    engine_params += "using A::APInt;\n"
-    engine_params += f"{conc_op_src}"
-
-    engine_output = run(
-        [engine_path],
-        input=engine_params,
-        text=True,
-        stdout=PIPE,
-        stderr=PIPE,
+        if engine_output.returncode != 0:
+            print("Enumeration Engine failed with this error:")
+            print(engine_output.stderr, end="")
+            exit(engine_output.returncode)
+
+    dirpath = VectorStore().data_dir(
+        str(domain), low_bws, med_bws, high_bws, seed, conc_op_src, enumerate_vectors
     )
 
-    if engine_output.returncode != 0:
-        print("Enumeration Engine failed with this error:")
-        print(engine_output.stderr, end="")
-        exit(engine_output.returncode)
+    return f"{dirpath}/"
 
-    return dirpath
+
+def setup_cex_eval(
+    domain: AbstractDomain,
+    data_dir: str,
+    counterexamples: list[tuple[int, list[int], list[int], list[int]]],
+    seed: int,
+    conc_op_src: str,
+    conc_samples: int,
+) -> str:
+    """
+    A data dir with the vectors of data_dir and a cex vector per counterexample
+    (bw, lhs, rhs, (lhs_conc, rhs_conc)) found by the verifier. The cex vectors
+    only count towards soundness, see PerBitRes.cex.
+    The best abstraction of a vector is sampled from conc_samples concrete values
+    on top of the concrete counterexample, or exact at small bitwidths.
+    """
+    engine_path = Path("xdsl_smt").joinpath("eval_engine", "build", "xfer_enum")
+    if not engine_path.exists():
+        raise FileNotFoundError(f"Enumeration Engine not found at: {engine_path}")
+
+    cex_tuples = [
+        tuple([bw] + lhs + rhs + conc) for bw, lhs, rhs, conc in counterexamples
+    ]
+
+    def write_vectors(dirpath: Path):
+        engine_params = ""
+        engine_params += f"{dirpath}/\n"
+        engine_params += f"{domain}\n"
+        engine_params += f"{conc_samples}\n"
+        engine_params += f"{cex_tuples}\n"
+        engine_params += f"{seed}\n"
+        engine_params += "using A::APInt;\n"
+        engine_params += f"{conc_op_src}"
+
+        engine_output = run(
+            [engine_path, "--cex"],
+            input=engine_params,
+            text=True,
+            stdout=PIPE,
+            stderr=PIPE,
+        )
+
+        if engine_output.returncode != 0:
+            print("Enumeration Engine failed with this error:")
+            print(engine_output.stderr, end="")
+            exit(engine_output.returncode)
+
+    dirpath = VectorStore().extended_dir(
+        Path(data_dir),
+        (domain, cex_tuples, seed, conc_op_src, conc_samples),
+        write_vectors,
+    )
+
+    return f"{dirpath}/"
+
+
+def remove_cex_eval(data_dir: str) -> None:
+    "Remove a data dir set up by setup_cex_eval, once no evaluation uses it"
+    VectorStore().remove_extended_dir(Path(data_dir))
 
 
 def reject_sampler(
@@ -147,6 +563,7 @@ def reject_sampler(
     exit(1)
 
 
+@overload
 def eval_transfer_func(
     data_dir: str,
     xfer_names: list[str],
@@ -155,11 +572,40 @@ def eval_transfer_func(
     base_srcs: list[str],
     helper_srcs: list[str],
     domain: AbstractDomain,
+    outcomes: Literal[False] = False,
 ) -> list[EvalResult]:
-    engine_path = Path("xdsl_smt").joinpath("eval_engine", "build", "eval_engine")
-    if not engine_path.exists():
-        raise FileNotFoundError(f"Eval Engine not found at: {engine_path}")
+    ...
+
+
+@overload
+def eval_transfer_func(
+    data_dir: str,
+    xfer_names: list[str],
+    xfer_srcs: list[str],
+    base_names: list[str],
+    base_srcs: list[str],
+    helper_srcs: list[str],
+    domain: AbstractDomain,
+    outcomes: Literal[True],
+) -> EvalOutcomes:
+    ...
 
+
+def eval_transfer_func(
+    data_dir: str,
+    xfer_names: list[str],
+    xfer_srcs: list[str],
+    base_names: list[str],
+    base_srcs: list[str],
+    helper_srcs: list[str],
+    domain: AbstractDomain,
+    outcomes: bool = False,
+) -> list[EvalResult] | EvalOutcomes:
+    """
+    With outcomes set, returns the outcome of every xfer function on every test
+    vector, in the fixed order of the vectors in data_dir, instead of the
+    summed up results.
+    """
     engine_params = ""
     engine_params += f"{data_dir}\n"
     engine_params += f"{domain}\n"
@@ -169,20 +615,120 @@ def eval_transfer_func(
     engine_params += "using A::APInt;\n"
     engine_params += "\n".join(helper_srcs + xfer_srcs + base_srcs)
 
-    eval_output = run(
-        [engine_path],
-        input=engine_params,
-        text=True,
-        stdout=PIPE,
-        stderr=PIPE,
+    engine = _get_engine()
+    if outcomes:
+        return _parse_outcomes(engine.request("eval-outcomes", engine_params))
+    return engine.parse_results(engine.request("eval", engine_params))
+
+
+_T = TypeVar("_T")
+
+
+def _eval_units_sharded(
+    data_dir: str,
+    xfer_units: list[tuple[str, str]],
+    base_units: list[tuple[str, str]],
+    helper_srcs: list[str],
+    domain: AbstractDomain,
+    cmd: str,
+    parse: Callable[[EvalEngine, bytes], _T],
+) -> list[tuple[list[int], _T]]:
+    """
+    Shards the xfer units over the engines and sends each shard as a `cmd`
+    request. Returns the indices of the xfer units of each shard together with
+    its parsed response.
+    """
+    helper_src = "using A::APInt;\n" + "\n".join(helper_srcs)
+    engines = _get_engines()
+
+    # a unit always goes to the same engine, so it is only compiled there
+    shards: list[list[int]] = [[] for _ in engines]
+    for i, (name, src) in enumerate(xfer_units):
+        shards[int(_unit_key(name, src, helper_src), 16) % len(engines)].append(i)
+    jobs = [(engine, shard) for engine, shard in zip(engines, shards) if shard]
+    if not jobs:
+        jobs.append((engines[0], []))
+
+    def eval_shard(job: tuple[EvalEngine, list[int]]) -> tuple[list[int], _T]:
+        engine, shard = job
+        shard_units = [xfer_units[i] for i in shard]
+        output = engine.eval_units(
+            data_dir, domain, shard_units, base_units, helper_src, cmd
+        )
+        return shard, parse(engine, output)
+
+    if len(jobs) == 1:
+        return [eval_shard(jobs[0])]
+
+    with ThreadPoolExecutor(len(jobs)) as pool:
+        return list(pool.map(eval_shard, jobs))
+
+
+def eval_transfer_units(
+    data_dir: str,
+    xfer_units: list[tuple[str, str]],
+    base_units: list[tuple[str, str]],
+    helper_srcs: list[str],
+    domain: AbstractDomain,
+) -> list[EvalResult]:
+    """
+    Same as eval_transfer_func, but every function is given as a (name, source)
+    unit whose source also contains the functions it calls (other than the
+    helpers). The engine keeps compiled units across calls, so only units it
+    has not seen yet are compiled. The units are sharded over the engines set up
+    by configure_eval_engines and evaluated concurrently.
+    """
+    shards = _eval_units_sharded(
+        data_dir,
+        xfer_units,
+        base_units,
+        helper_srcs,
+        domain,
+        "eval-units",
+        EvalEngine.parse_results,
     )
+    for shard, shard_results in shards:
+        assert len(shard_results) == len(
+            shard
+        ), f"EvalEngine returned {len(shard_results)} results for {len(shard)} units"
+    if len(shards) == 1:
+        return shards[0][1]
 
-    if eval_output.returncode != 0:
-        print("EvalEngine failed with this error:")
-        print(eval_output.stderr, end="")
-        exit(eval_output.returncode)
+    results: list[EvalResult | None] = [None] * len(xfer_units)
+    for shard, shard_results in shards:
+        for i, res in zip(shard, shard_results):
+            results[i] = res
 
-    return _parse_engine_output(eval_output.stdout)
+    assert all(res is not None for res in results)
+    return cast(list[EvalResult], results)
+
+
+def eval_transfer_outcomes(
+    data_dir: str,
+    xfer_units: list[tuple[str, str]],
+    base_units: list[tuple[str, str]],
+    helper_srcs: list[str],
+    domain: AbstractDomain,
+) -> EvalOutcomes:
+    """
+    Same as eval_transfer_units, but returns the outcome of every xfer unit on
+    every single test vector instead of the summed up results.
+    """
+    shards = _eval_units_sharded(
+        data_dir,
+        xfer_units,
+        base_units,
+        helper_srcs,
+        domain,
+        "eval-units-outcomes",
+        lambda _, output: _parse_outcomes(output),
+    )
+    if len(shards) == 1:
+        return shards[0][1]
+
+    indices = [shard for shard, _ in shards]
+    outcomes = [outcome for _, outcome in shards]
+    return EvalOutcomes.merge(outcomes, indices, len(xfer_units))
 
 
 def eval_final(
@@ -193,10 +739,6 @@ def eval_final(
     helper_srcs: list[str],
     domain: AbstractDomain,
 ) -> list[EvalResult]:
-    engine_path = Path("xdsl_smt").joinpath("eval_engine", "build", "eval_engine")
-    if not engine_path.exists():
-        raise FileNotFoundError(f"Eval Engine not found at: {engine_path}")
-
     engine_params = ""
     engine_params += f"{data_dir}\n"
     engine_params += f"{domain}\n"
@@ -206,17 +748,5 @@ def eval_final(
     engine_params += "using A::APInt;\n"
     engine_params += "\n".join(helper_srcs + [xfer_src])
 
-    eval_output = run(
-        [engine_path],
-        input=engine_params,
-        text=True,
-        stdout=PIPE,
-        stderr=PIPE,
-    )
-
-    if eval_output.returncode != 0:
-        print("EvalEngine failed with this error:")
-        print(eval_output.stderr, end="")
-        exit(eval_output.returncode)
-
-    return _parse_engine_output(eval_output.stdout)
+    engine = _get_engine()
+    return engine.parse_results(engine.request("eval", engine_params))
@@ -5,6 +5,7 @@
 #include <random>
 #include <sstream>
 #include <string>
+#include <string_view>
 #include <vector>
 
 #include "APInt.h"
@@ -15,6 +16,7 @@ concept AbstractDomain = requires(const D d, unsigned int bw, const A::APInt &a,
                                   unsigned char *p, unsigned int o) {
   std::constructible_from<D, Vec<D::N>>;
   { D::N } -> std::convertible_to<unsigned int>;
+  { D::name } -> std::convertible_to<std::string_view>;
   { d.v } -> std::same_as<const Vec<D::N> &>;
 
   // Static methods
@@ -126,6 +128,8 @@ private:
   const A::APInt getConstant() const { return one(); }
 
 public:
+  static constexpr std::string_view name = "KnownBits";
+
   KnownBits(const Vec<N> &vC) : AbstVal<KnownBits, N>(vC) {}
 
   const std::string display() const {
@@ -266,6 +270,8 @@ private:
   const A::APInt getConstant() const { return lower(); }
 
 public:
+  static constexpr std::string_view name = "UConstRange";
+
   UConstRange(const Vec<N> &vC) : AbstVal<UConstRange, N>(vC) {}
 
   const std::string display() const {
@@ -403,6 +409,8 @@ private:
   const A::APInt getConstant() const { return lower(); }
 
 public:
+  static constexpr std::string_view name = "SConstRange";
+
   SConstRange(const Vec<N> &vC) : AbstVal<SConstRange, N>(vC) {}
 
   const std::string display() const {
@@ -602,6 +610,8 @@ private:
   }
 
 public:
+  static constexpr std::string_view name = "IntegerModulo";
+
   IntegerModulo(const Vec<N> &vC) : IntegerModulo(vC, true) {}
 
   const std::string display() const {
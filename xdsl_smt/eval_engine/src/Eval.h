@@ -6,6 +6,7 @@
 #include <optional>
 #include <random>
 #include <string>
+#include <thread>
 #include <vector>
 
 #include "APInt.h"
@@ -43,6 +44,22 @@ public:
     return res;
   }
 
+  // the join of the results on numConcSamples random concrete values of lhs
+  // and rhs, an under-approximation of toBestAbst
+  const D sampleBestAbst(const D &lhs, const D &rhs, std::mt19937 &rng,
+                         int numConcSamples) const {
+    D res = D::bottom(lhs.bw());
+
+    for (int i = 0; i < numConcSamples; ++i) {
+      const A::APInt lhsConc = lhs.getRandConcrete(rng);
+      const A::APInt rhsConc = rhs.getRandConcrete(rng);
+      if (!opCon || opCon.value()(lhsConc, rhsConc))
+        res = res.join(D::fromConcrete(concOp(lhsConc, rhsConc)));
+    }
+
+    return res;
+  }
+
   const std::tuple<D, D, D> genRand(unsigned int bw, std::mt19937 &rng,
                                     int numConcSamples) const {
     while (true) {
@@ -53,40 +70,52 @@ public:
         if (!res.isBottom())
           return {lhs, rhs, res};
       } else {
-        D res = D::bottom(bw);
-
-        for (int i = 0; i < numConcSamples; ++i) {
-          const A::APInt lhsConc = lhs.getRandConcrete(rng);
-          const A::APInt rhsConc = rhs.getRandConcrete(rng);
-          if (!opCon || opCon.value()(lhsConc, rhsConc))
-            res = res.join(D::fromConcrete(concOp(lhsConc, rhsConc)));
-        }
-
-        return {lhs, rhs, res};
+        return {lhs, rhs, sampleBestAbst(lhs, rhs, rng, numConcSamples)};
       }
     }
   }
+
+  // the vector of a counterexample found by the verifier, abstract values and
+  // concrete values they include. Its best abstraction is computed like in
+  // genRand, and always includes the result on the concrete values.
+  const std::tuple<D, D, D> fromCex(const D &lhs, const D &rhs,
+                                    const A::APInt &lhsConc,
+                                    const A::APInt &rhsConc, std::mt19937 &rng,
+                                    int numConcSamples) const {
+    const D res = D::fromConcrete(concOp(lhsConc, rhsConc));
+    if (numConcSamples == -1)
+      return {lhs, rhs, res.join(toBestAbst(lhs, rhs))};
+
+    return {lhs, rhs, res.join(sampleBestAbst(lhs, rhs, rng, numConcSamples))};
+  }
+};
+
+// The state of one test vector under the base functions: the meet of their
+// results, whether that meet is already the best abstraction and its distance
+// to the best abstraction. It only changes with the base functions, so it can
+// be kept across evaluations of different synthesized functions.
+template <AbstractDomain D> struct BaseVec {
+  D ref;
+  bool solved;
+  unsigned long dist;
 };
 
+// one BaseVec per test vector, in the same shape as ToEval
+template <AbstractDomain D>
+using BaseVecs = std::vector<std::vector<BaseVec<D>>>;
+
 template <AbstractDomain D> class Eval {
-private:
+public:
   // types
   typedef D (*XferFn)(D, D);
 
+private:
   // members
-  Jit jit;
   std::vector<XferFn> xferFns;
   std::vector<XferFn> baseFns;
+  unsigned int numThreads;
 
   // methods
-  std::vector<D> synFnWrapper(const D &lhs, const D &rhs) const {
-    std::vector<D> r;
-    std::transform(
-        xferFns.begin(), xferFns.end(), std::back_inserter(r),
-        [&lhs, &rhs](const XferFn &f) { return D(f(lhs.v, rhs.v)); });
-    return r;
-  }
-
   std::vector<D> refFnWrapper(const D &lhs, const D &rhs) const {
     std::vector<D> r;
     std::transform(
@@ -95,41 +124,174 @@ private:
     return r;
   }
 
-  void evalSingle(const D &lhs, const D &rhs, const D &best, Results &r) const {
-    std::vector<D> synth_results(synFnWrapper(lhs, rhs));
-    D ref = D::meetAll(refFnWrapper(lhs, rhs), lhs.bw());
-    bool solved = ref == best;
-    unsigned long baseDis = ref.distance(best);
-    for (unsigned int i = 0; i < synth_results.size(); ++i) {
-      D synth_after_meet = ref.meet(synth_results[i]);
+  void evalSingle(const D &lhs, const D &rhs, const D &best,
+                  const BaseVec<D> &base, Results &r) const {
+    for (unsigned int i = 0; i < xferFns.size(); ++i) {
+      D synth_after_meet = base.ref.meet(D(xferFns[i](lhs.v, rhs.v)));
       bool sound = synth_after_meet.isSuperset(best);
       bool exact = synth_after_meet == best;
       unsigned long dis = synth_after_meet.distance(best);
-      unsigned long soundDis = sound ? dis : baseDis;
+      unsigned long soundDis = sound ? dis : base.dist;
+
+      r.incResult(Result(sound, dis, exact, base.solved, soundDis), i);
+    }
+
+    r.incCases(base.solved, base.dist);
+  }
+
+  Results evalRange(const std::vector<std::tuple<D, D, D>> &vecs,
+                    const std::vector<BaseVec<D>> &base, unsigned long begin,
+                    unsigned long end) const {
+    Results r(static_cast<unsigned int>(xferFns.size()), getBw(vecs));
+
+    for (unsigned long j = begin; j < end; ++j) {
+      auto [lhs, rhs, best] = vecs[j];
+      evalSingle(lhs, rhs, best, base[j], r);
+    }
 
-      r.incResult(Result(sound, dis, exact, solved, soundDis), i);
+    return r;
+  }
+
+  std::vector<BaseVec<D>>
+  evalBaseRange(const std::vector<std::tuple<D, D, D>> &vecs,
+                const std::vector<BaseVec<D>> *prev, unsigned long begin,
+                unsigned long end) const {
+    std::vector<BaseVec<D>> r;
+    r.reserve(end - begin);
+
+    for (unsigned long j = begin; j < end; ++j) {
+      auto [lhs, rhs, best] = vecs[j];
+      D ref = D::meetAll(refFnWrapper(lhs, rhs), lhs.bw());
+      if (prev)
+        ref = (*prev)[j].ref.meet(ref);
+      r.push_back({ref, ref == best, ref.distance(best)});
     }
 
-    r.incCases(solved, baseDis);
+    return r;
+  }
+
+  unsigned long numShards(unsigned long size) const {
+    return std::max(std::min<unsigned long>(numThreads, size), 1ul);
+  }
+
+  // Splits [0, size) into contiguous shards and runs f(shard, begin, end) for
+  // each on its own thread.
+  template <typename F> void forShards(unsigned long size, const F &f) const {
+    const unsigned long n = numShards(size);
+    if (n == 1) {
+      f(0ul, 0ul, size);
+      return;
+    }
+
+    std::vector<std::thread> threads;
+    for (unsigned long i = 0; i < n; ++i)
+      threads.emplace_back([&f, size, i, n]() {
+        f(i, size * i / n, size * (i + 1) / n);
+      });
+
+    for (std::thread &t : threads)
+      t.join();
+  }
+
+  // like forShards, but returns the results of f(begin, end) in shard order
+  template <typename F>
+  auto runShards(unsigned long size, const F &f) const
+      -> std::vector<decltype(f(0ul, 0ul))> {
+    std::vector<std::optional<decltype(f(0ul, 0ul))>> shards(numShards(size));
+    forShards(size, [&f, &shards](unsigned long i, unsigned long begin,
+                                  unsigned long end) {
+      shards[i] = f(begin, end);
+    });
+
+    std::vector<decltype(f(0ul, 0ul))> r;
+    for (auto &shard : shards)
+      r.push_back(std::move(shard.value()));
+    return r;
   }
 
 public:
-  Eval(Jit _jit, const std::vector<std::string> synthFnNames,
-       const std::vector<std::string> baseFnNames)
-      : jit(std::move(_jit)), xferFns(jit.getFns<XferFn>(synthFnNames)),
-        baseFns(jit.getFns<XferFn>(baseFnNames)) {}
+  // the functions must stay alive in their jit for the lifetime of the Eval
+  Eval(std::vector<XferFn> _xferFns, std::vector<XferFn> _baseFns,
+       unsigned int _numThreads = 1)
+      : xferFns(std::move(_xferFns)), baseFns(std::move(_baseFns)),
+        numThreads(std::max(_numThreads, 1u)) {}
+
+  // The state of every test vector under the base functions. If prev holds
+  // the state under other base functions, the result is the state under both.
+  BaseVecs<D> evalBase(const ToEval<D> &toEval,
+                       const BaseVecs<D> *prev = nullptr) const {
+    BaseVecs<D> r;
+
+    for (unsigned int i = 0; i < toEval.size(); ++i) {
+      const std::vector<std::tuple<D, D, D>> &vecs = toEval[i];
+      const std::vector<BaseVec<D>> *prevVecs = prev ? &(*prev)[i] : nullptr;
+
+      std::vector<BaseVec<D>> base;
+      for (std::vector<BaseVec<D>> &shard :
+           runShards(vecs.size(), [&](unsigned long begin, unsigned long end) {
+             return evalBaseRange(vecs, prevVecs, begin, end);
+           }))
+        base.insert(base.end(), std::make_move_iterator(shard.begin()),
+                    std::make_move_iterator(shard.end()));
+      r.push_back(std::move(base));
+    }
 
-  const std::vector<Results> eval(const ToEval<D> toEval) const {
+    return r;
+  }
+
+  // The vectors of each bitwidth are split into contiguous shards evaluated
+  // on separate threads. All counters are integers, so merging the shards in
+  // order gives exactly the serial result.
+  const std::vector<Results> eval(const ToEval<D> &toEval,
+                                  const BaseVecs<D> &base) const {
     std::vector<Results> r;
 
     for (unsigned int i = 0; i < toEval.size(); ++i) {
-      r.push_back(
-          {static_cast<unsigned int>(xferFns.size()), getBw(toEval[i])});
+      const std::vector<std::tuple<D, D, D>> &vecs = toEval[i];
+      std::vector<Results> shards =
+          runShards(vecs.size(), [&](unsigned long begin, unsigned long end) {
+            return evalRange(vecs, base[i], begin, end);
+          });
+
+      Results merged = shards[0];
+      for (unsigned long j = 1; j < shards.size(); ++j)
+        merged += shards[j];
+      r.push_back(merged);
+    }
 
-      for (unsigned int j = 0; j < toEval[i].size(); ++j) {
-        auto [lhs, rhs, best] = toEval[i][j];
-        evalSingle(lhs, rhs, best, r[i]);
-      }
+    return r;
+  }
+
+  const std::vector<Results> eval(const ToEval<D> &toEval) const {
+    return eval(toEval, evalBase(toEval));
+  }
+
+  // like eval, but keeps the outcome on each vector instead of counting them
+  const std::vector<Outcomes> evalOutcomes(const ToEval<D> &toEval,
+                                           const BaseVecs<D> &base) const {
+    std::vector<Outcomes> r;
+
+    for (unsigned int i = 0; i < toEval.size(); ++i) {
+      const std::vector<std::tuple<D, D, D>> &vecs = toEval[i];
+      Outcomes o(static_cast<unsigned int>(xferFns.size()), getBw(vecs),
+                 vecs.size());
+
+      forShards(vecs.size(), [&](unsigned long, unsigned long begin,
+                                 unsigned long end) {
+        for (unsigned long j = begin; j < end; ++j) {
+          auto [lhs, rhs, best] = vecs[j];
+          const BaseVec<D> &b = base[i][j];
+          for (unsigned int k = 0; k < xferFns.size(); ++k) {
+            D synth_after_meet = b.ref.meet(D(xferFns[k](lhs.v, rhs.v)));
+            o.setResult(k, j, synth_after_meet.isSuperset(best),
+                        synth_after_meet == best,
+                        synth_after_meet.distance(best));
+          }
+          o.setCase(j, b.solved, b.dist);
+        }
+      });
+
+      r.push_back(o);
     }
 
     return r;
@@ -137,7 +299,7 @@ public:
 
   template <typename LLVM_D>
   const std::vector<Results>
-  evalFinal(const ToEval<D> toEval,
+  evalFinal(const ToEval<D> &toEval,
             const std::optional<LLVMXferFn<LLVM_D>> &llvmXfer,
             const XferWrap<D, LLVM_D> &llvmXferWrapper) const {
     std::vector<Results> r;
@@ -1,6 +1,8 @@
 #ifndef Results_H
 #define Results_H
 
+#include <algorithm>
+#include <cstdint>
 #include <functional>
 #include <iomanip>
 #include <iostream>
@@ -37,6 +39,10 @@ private:
   unsigned long soundDistance;
 };
 
+template <typename T> void writeRaw(std::ostream &os, const T x) {
+  os.write(reinterpret_cast<const char *>(&x), sizeof(T));
+}
+
 class Results {
 private:
   unsigned int bw = {};
@@ -68,9 +74,13 @@ public:
     }
   }
 
+  // cex marks the results of vectors of counterexamples found by the
+  // verifier, which the client only checks soundness on
   void print(std::ostream &os,
-             const std::function<double(unsigned int)> &maxDist) const {
+             const std::function<double(unsigned int)> &maxDist,
+             bool cex) const {
     os << std::left << std::setw(20) << "bw:" << bw << "\n";
+    os << std::left << std::setw(20) << "cex:" << cex << "\n";
     os << std::left << std::setw(20) << "num cases:" << cases << "\n";
     os << std::left << std::setw(20) << "num unsolved:" << unsolvedCases
        << "\n";
@@ -95,8 +105,48 @@ public:
     os << "---\n";
   }
 
+  // Binary counterpart of print, all values in native byte order:
+  //   u32 bw, u32 number of functions n, u64 cex, u64 cases,
+  //   u64 unsolved cases, f64 base distance, then n values each of
+  //   u64 sound, f64 distance, u64 exact, u64 unsolved exact,
+  //   f64 sound distance
+  // distances are divided by maxDist(bw) like in the text format
+  void printBinary(std::ostream &os,
+                   const std::function<double(unsigned int)> &maxDist,
+                   bool cex) const {
+    const double md = maxDist(bw);
+
+    writeRaw<uint32_t>(os, bw);
+    writeRaw<uint32_t>(os, static_cast<uint32_t>(r.size()));
+    writeRaw<uint64_t>(os, cex);
+    writeRaw<uint64_t>(os, cases);
+    writeRaw<uint64_t>(os, unsolvedCases);
+    writeRaw<double>(os, baseDistance / md);
+    for (const Result &x : r)
+      writeRaw<uint64_t>(os, x.sound);
+    for (const Result &x : r)
+      writeRaw<double>(os, static_cast<double>(x.distance) / md);
+    for (const Result &x : r)
+      writeRaw<uint64_t>(os, x.exact);
+    for (const Result &x : r)
+      writeRaw<uint64_t>(os, x.unsolvedExact);
+    for (const Result &x : r)
+      writeRaw<double>(os, static_cast<double>(x.soundDistance) / md);
+  }
+
   void incResult(const Result &newR, unsigned int i) { r[i] += newR; }
 
+  Results &operator+=(const Results &rhs) {
+    for (unsigned int i = 0; i < r.size(); ++i)
+      r[i] += rhs.r[i];
+
+    cases += rhs.cases;
+    unsolvedCases += rhs.unsolvedCases;
+    baseDistance += rhs.baseDistance;
+
+    return *this;
+  }
+
   void incCases(bool solved, unsigned long dis) {
     cases += 1;
     unsolvedCases += !solved ? 1 : 0;
@@ -104,4 +154,79 @@ public:
   }
 };
 
+// The outcome of every function on every test vector of one bitwidth, as
+// opposed to the counts summed over all vectors kept by Results.
+class Outcomes {
+private:
+  unsigned int bw;
+  unsigned int numFns;
+  unsigned long numVecs;
+  std::vector<unsigned char> solved;
+  std::vector<unsigned long> baseDistance;
+  // indexed by fn * numVecs + vec
+  std::vector<unsigned char> sound;
+  std::vector<unsigned char> exact;
+  std::vector<unsigned long> distance;
+
+  static void writeBits(std::ostream &os, const unsigned char *bits,
+                        unsigned long n) {
+    for (unsigned long i = 0; i < n; i += 64) {
+      uint64_t word = 0;
+      for (unsigned long j = i; j < std::min(i + 64, n); ++j)
+        word |= static_cast<uint64_t>(bits[j] != 0) << (j - i);
+      writeRaw<uint64_t>(os, word);
+    }
+  }
+
+  void writeDistances(std::ostream &os, const unsigned long *dists,
+                      double md) const {
+    for (unsigned long i = 0; i < numVecs; ++i)
+      writeRaw<double>(os, static_cast<double>(dists[i]) / md);
+  }
+
+public:
+  Outcomes(unsigned int numFns_, unsigned int bw_, unsigned long numVecs_)
+      : bw(bw_), numFns(numFns_), numVecs(numVecs_), solved(numVecs_),
+        baseDistance(numVecs_), sound(numFns_ * numVecs_),
+        exact(numFns_ * numVecs_), distance(numFns_ * numVecs_) {}
+
+  // Different vectors may be set concurrently
+  void setCase(unsigned long vec, bool isSolved, unsigned long dis) {
+    solved[vec] = isSolved;
+    baseDistance[vec] = dis;
+  }
+
+  void setResult(unsigned int fn, unsigned long vec, bool isSound,
+                 bool isExact, unsigned long dis) {
+    sound[fn * numVecs + vec] = isSound;
+    exact[fn * numVecs + vec] = isExact;
+    distance[fn * numVecs + vec] = dis;
+  }
+
+  // All values in native byte order, a bitset of the vectors is stored in
+  // ceil(numVecs / 64) u64 words with vector j at bit j % 64 of word j / 64:
+  //   u32 bw, u32 number of functions n, u64 cex (see Results::print),
+  //   u64 number of vectors, bitset solved, f64 base distance of each vector,
+  //   then for each function bitset sound, bitset exact, f64 distance of each
+  //   vector
+  // distances are divided by maxDist(bw) like in Results
+  void printBinary(std::ostream &os,
+                   const std::function<double(unsigned int)> &maxDist,
+                   bool cex) const {
+    const double md = maxDist(bw);
+
+    writeRaw<uint32_t>(os, bw);
+    writeRaw<uint32_t>(os, numFns);
+    writeRaw<uint64_t>(os, cex);
+    writeRaw<uint64_t>(os, numVecs);
+    writeBits(os, solved.data(), numVecs);
+    writeDistances(os, baseDistance.data(), md);
+    for (unsigned int fn = 0; fn < numFns; ++fn) {
+      writeBits(os, sound.data() + fn * numVecs, numVecs);
+      writeBits(os, exact.data() + fn * numVecs, numVecs);
+      writeDistances(os, distance.data() + fn * numVecs, md);
+    }
+  }
+};
+
 #endif
@@ -2,7 +2,11 @@
 #define jit_H
 
 #include <memory>
+#include <stdexcept>
 #include <string>
+#include <unordered_map>
+#include <unordered_set>
+#include <vector>
 
 #include "APInt_bin_string.h"
 #include "warning_suppresor.h"
@@ -31,12 +35,12 @@ private:
   clang::FileSystemOptions fileOpts;
   std::unique_ptr<clang::FileManager> fileManager;
 
+public:
   struct CompileResult {
     std::unique_ptr<llvm::LLVMContext> c;
     std::unique_ptr<llvm::Module> m;
   };
 
-public:
   Compiler() {
     llvm::IntrusiveRefCntPtr<clang::DiagnosticOptions> opts =
         new clang::DiagnosticOptions();
@@ -79,6 +83,11 @@ public:
   }
 };
 
+inline const std::string apIntSrc() {
+  return std::string(reinterpret_cast<const char *>(___src_APInt_h),
+                     ___src_APInt_h_len);
+}
+
 class Jit {
 private:
   std::unique_ptr<llvm::orc::LLJIT> jit;
@@ -87,10 +96,8 @@ public:
   Jit(const std::string &xferSrc) {
     llvm::InitializeNativeTarget();
     llvm::InitializeNativeTargetAsmPrinter();
-    std::string apintsrc = std::string(
-        reinterpret_cast<const char *>(___src_APInt_h), ___src_APInt_h_len);
 
-    std::string sourceCode = apintsrc + xferSrc;
+    std::string sourceCode = apIntSrc() + xferSrc;
     auto [context, module] = llvm::cantFail(Compiler().compile(sourceCode));
 
     jit = llvm::cantFail(llvm::orc::LLJITBuilder().create());
@@ -126,4 +133,157 @@ public:
   }
 };
 
+// Keeps compiled functions resident across requests of the server. Functions
+// are added in units identified by a key chosen by the client, and every
+// batch of new units is compiled as one translation unit (APInt.h, the
+// helpers and the units) into its own JITDylib. A unit that is evaluated
+// again is looked up instead of recompiled, and a JITDylib is removed once all
+// of its units are dropped.
+//
+// APInt.h and the helpers are compiled to machine code once per setHelpers
+// into a shared JITDylib every batch links against. A batch still parses
+// them, as its units call them, but the functions the shared JITDylib defines
+// are stripped to declarations before the batch is added, so only the units
+// themselves are code generated again.
+class UnitJit {
+private:
+  struct Unit {
+    llvm::orc::JITDylib *jd;
+    llvm::orc::ExecutorAddr addr;
+  };
+
+  std::unique_ptr<llvm::orc::LLJIT> jit;
+  std::string helperSrc;
+  llvm::orc::JITDylib *helpersJd = nullptr;
+  // the functions helpersJd defines, by their mangled names
+  std::unordered_set<std::string> helperFns;
+  std::unordered_map<std::string, Unit> units;
+  std::unordered_map<llvm::orc::JITDylib *, unsigned int> liveUnits;
+  unsigned long numBatches = 0;
+  unsigned long numHelpers = 0;
+
+  void removeUnit(const std::string &key) {
+    auto it = units.find(key);
+    if (it == units.end())
+      return;
+
+    llvm::orc::JITDylib *jd = it->second.jd;
+    units.erase(it);
+    if (--liveUnits[jd] == 0) {
+      liveUnits.erase(jd);
+      llvm::cantFail(jit->getExecutionSession().removeJITDylib(*jd));
+    }
+  }
+
+public:
+  UnitJit() {
+    llvm::InitializeNativeTarget();
+    llvm::InitializeNativeTargetAsmPrinter();
+    jit = llvm::cantFail(llvm::orc::LLJITBuilder().create());
+  }
+
+  // units are compiled against the helpers, so changing them invalidates
+  // every unit compiled so far
+  void setHelpers(const std::string &src) {
+    std::vector<std::string> keys;
+    for (const auto &[key, _] : units)
+      keys.push_back(key);
+    drop(keys);
+
+    if (helpersJd) {
+      llvm::cantFail(jit->getExecutionSession().removeJITDylib(*helpersJd));
+      helpersJd = nullptr;
+      helperFns.clear();
+    }
+    helperSrc = src;
+    ++numHelpers;
+
+    llvm::Expected<Compiler::CompileResult> compiled =
+        Compiler().compile(apIntSrc() + helperSrc);
+    if (!compiled)
+      throw std::runtime_error(llvm::toString(compiled.takeError()));
+    auto [context, module] = std::move(compiled.get());
+
+    for (const llvm::Function &f : *module)
+      if (!f.isDeclaration() && !f.hasLocalLinkage())
+        helperFns.insert(f.getName().str());
+
+    helpersJd = &llvm::cantFail(
+        jit->createJITDylib("helpers" + std::to_string(numHelpers)));
+    llvm::cantFail(jit->addIRModule(
+        *helpersJd,
+        llvm::orc::ThreadSafeModule(std::move(module), std::move(context))));
+  }
+
+  // changes whenever setHelpers is called, so that state kept for units can
+  // tell whether they were compiled against the current helpers
+  unsigned long helpersVersion() const { return numHelpers; }
+
+  void compile(const std::vector<std::string> &keys,
+               const std::vector<std::string> &fnNames,
+               const std::string &src) {
+    if (keys.size() != fnNames.size())
+      throw std::invalid_argument("Number of unit keys and names differ");
+
+    if (keys.empty())
+      return;
+
+    llvm::Expected<Compiler::CompileResult> compiled =
+        Compiler().compile(apIntSrc() + helperSrc + src);
+    if (!compiled)
+      throw std::runtime_error(llvm::toString(compiled.takeError()));
+    auto [context, module] = std::move(compiled.get());
+
+    // the units are looked up in this module, so they are kept even if a
+    // helper has the same name
+    const std::unordered_set<std::string> unitFns(fnNames.begin(),
+                                                  fnNames.end());
+    for (llvm::Function &f : *module)
+      if (!f.isDeclaration() && !f.hasLocalLinkage() &&
+          helperFns.contains(f.getName().str()) &&
+          !unitFns.contains(f.getName().str())) {
+        // inline functions are in comdats, which declarations may not be
+        f.deleteBody();
+        f.setComdat(nullptr);
+      }
+
+    drop(keys);
+    llvm::orc::JITDylib &jd = llvm::cantFail(
+        jit->createJITDylib("units" + std::to_string(numBatches++)));
+    if (helpersJd)
+      jd.addToLinkOrder(*helpersJd);
+    llvm::cantFail(jit->addIRModule(
+        jd, llvm::orc::ThreadSafeModule(std::move(module), std::move(context))));
+
+    for (unsigned int i = 0; i < keys.size(); ++i) {
+      auto [_, inserted] = units.try_emplace(
+          keys[i], Unit{&jd, llvm::cantFail(jit->lookup(jd, fnNames[i]))});
+      if (inserted)
+        liveUnits[&jd] += 1;
+    }
+  }
+
+  void drop(const std::vector<std::string> &keys) {
+    for (const std::string &key : keys)
+      removeUnit(key);
+  }
+
+  template <typename T> T getFn(const std::string &key) const {
+    auto it = units.find(key);
+    if (it == units.end())
+      throw std::invalid_argument("Unknown unit: " + key);
+
+    return it->second.addr.toPtr<T>();
+  }
+
+  template <typename T>
+  std::vector<T> getFns(const std::vector<std::string> &keys) const {
+    std::vector<T> fns;
+    std::transform(keys.begin(), keys.end(), std::back_inserter(fns),
+                   [this](const std::string &x) { return getFn<T>(x); });
+
+    return fns;
+  }
+};
+
 #endif
@@ -1,7 +1,12 @@
+#include <algorithm>
+#include <array>
 #include <iostream>
 #include <iterator>
 #include <optional>
+#include <sstream>
+#include <stdexcept>
 #include <string>
+#include <string_view>
 #include <vector>
 
 #include "AbstVal.h"
@@ -11,79 +16,327 @@
 #include "llvm_tests.h"
 #include "utils.cpp"
 
+// number of threads each evaluation splits the test vectors over
+static unsigned int evalThreads = 1;
+
+// write results with Results::printBinary instead of the text format
+static bool binaryOutput = false;
+
+// keeps the vectors of the last data dir resident, so that a server handling
+// many requests against the same dir only reads them from disk once
+template <AbstractDomain D>
+const AllToEval<D> &cachedToEval(const std::string &dataDir) {
+  static std::string cachedDir;
+  static AllToEval<D> cached;
+
+  if (cachedDir != dataDir) {
+    cached = getToEval<D>(dataDir);
+    cachedDir = dataDir;
+  }
+
+  return cached;
+}
+
+template <AbstractDomain D>
+void printResults(std::ostream &out, const std::vector<Results> &rs,
+                  bool cex = false) {
+  for (const Results &x : rs)
+    if (binaryOutput)
+      x.printBinary(out, D::maxDist, cex);
+    else
+      x.print(out, D::maxDist, cex);
+}
+
+// writes the binary Outcomes instead of the Results if outcomes is set, cex
+// marks the vectors of counterexamples
+template <AbstractDomain D>
+void printVecs(std::ostream &out, const Eval<D> &e, const ToEval<D> &vecs,
+               const BaseVecs<D> &base, bool cex, bool outcomes) {
+  if (outcomes)
+    for (const Outcomes &o : e.evalOutcomes(vecs, base))
+      o.printBinary(out, D::maxDist, cex);
+  else
+    printResults<D>(out, e.eval(vecs, base), cex);
+}
+
+template <AbstractDomain D>
+void printEval(std::ostream &out, const Eval<D> &e,
+               const AllToEval<D> &toEval, bool outcomes) {
+  const auto &[low, med, high, cex] = toEval;
+
+  for (const ToEval<D> *vecs : {&high, &med, &low})
+    printVecs(out, e, *vecs, e.evalBase(*vecs), false, outcomes);
+  printVecs(out, e, cex, e.evalBase(cex), true, outcomes);
+}
+
 template <typename D, typename LLVM_D>
 void handleDomain(
-    const std::string &dataDir, const std::vector<std::string> &synNames,
+    std::ostream &out, const std::string &dataDir,
+    const std::vector<std::string> &synNames,
     const std::vector<std::string> &bFnNames, const std::string &srcCode,
     const std::string &opName,
     const std::vector<std::tuple<std::string, std::optional<XferFn<LLVM_D>>>>
         &llvmTests,
-    const XferWrap<D, LLVM_D> &llvmXferWrapper) {
+    const XferWrap<D, LLVM_D> &llvmXferWrapper, bool outcomes) {
+  typedef typename Eval<D>::XferFn EvalFn;
+
   Jit jit(srcCode);
-  auto [low, med, high] = getToEval<D>(dataDir);
+  Eval<D> e(jit.getFns<EvalFn>(synNames), jit.getFns<EvalFn>(bFnNames),
+            evalThreads);
 
-  Eval<D> e(std::move(jit), synNames, bFnNames);
   if (opName == "") {
-    for (const Results &x : e.eval(high))
-      x.print(std::cout, D::maxDist);
-    for (const Results &x : e.eval(med))
-      x.print(std::cout, D::maxDist);
-    for (const Results &x : e.eval(low))
-      x.print(std::cout, D::maxDist);
+    printEval(out, e, cachedToEval<D>(dataDir), outcomes);
   } else {
+    // counterexamples are left out, the final solution is only scored on
+    // the enumerated vectors
+    const auto &toEval = cachedToEval<D>(dataDir);
+    const ToEval<D> &low = std::get<0>(toEval);
+    const ToEval<D> &med = std::get<1>(toEval);
+    const ToEval<D> &high = std::get<2>(toEval);
     std::optional<XferFn<LLVM_D>> llvmXfer = makeTest(llvmTests, opName);
 
-    for (const Results &x : e.evalFinal(high, llvmXfer, llvmXferWrapper))
-      x.print(std::cout, D::maxDist);
-    for (const Results &x : e.evalFinal(med, llvmXfer, llvmXferWrapper))
-      x.print(std::cout, D::maxDist);
-    for (const Results &x : e.evalFinal(low, llvmXfer, llvmXferWrapper))
-      x.print(std::cout, D::maxDist);
+    printResults<D>(out, e.evalFinal(high, llvmXfer, llvmXferWrapper));
+    printResults<D>(out, e.evalFinal(med, llvmXfer, llvmXferWrapper));
+    printResults<D>(out, e.evalFinal(low, llvmXfer, llvmXferWrapper));
   }
 }
 
-int main() {
+template <AbstractDomain D> using BaseState = std::array<BaseVecs<D>, 4>;
+
+// Keeps the state of the test vectors under the last list of base units, the
+// current solution set. Unit keys are hashes of the unit and helper source, so
+// the same keys always mean the same functions, but the state is also dropped
+// when the helpers change in case a client reuses keys. A list that extends the
+// cached one, as when a solution is added to the set, only evaluates the new
+// units.
+template <AbstractDomain D>
+const BaseState<D> &
+cachedBase(const UnitJit &unitJit, const std::string &dataDir,
+           const std::vector<std::string> &baseKeys,
+           const AllToEval<D> &toEval) {
+  typedef typename Eval<D>::XferFn EvalFn;
+
+  static std::string cachedDir;
+  static unsigned long cachedHelpers = 0;
+  static std::vector<std::string> cachedKeys;
+  static std::optional<BaseState<D>> cached;
+
+  const bool extends = cached && cachedDir == dataDir &&
+                       cachedHelpers == unitJit.helpersVersion() &&
+                       cachedKeys.size() <= baseKeys.size() &&
+                       std::equal(cachedKeys.begin(), cachedKeys.end(),
+                                  baseKeys.begin());
+  if (extends && cachedKeys.size() == baseKeys.size())
+    return cached.value();
+
+  const long numCached = extends ? static_cast<long>(cachedKeys.size()) : 0;
+  const std::vector<std::string> newKeys(baseKeys.begin() + numCached,
+                                         baseKeys.end());
+  Eval<D> e({}, unitJit.getFns<EvalFn>(newKeys), evalThreads);
+
+  const auto &[low, med, high, cex] = toEval;
+  BaseState<D> base = {
+      e.evalBase(low, extends ? &cached.value()[0] : nullptr),
+      e.evalBase(med, extends ? &cached.value()[1] : nullptr),
+      e.evalBase(high, extends ? &cached.value()[2] : nullptr),
+      e.evalBase(cex, extends ? &cached.value()[3] : nullptr)};
+
+  cached = std::move(base);
+  cachedDir = dataDir;
+  cachedHelpers = unitJit.helpersVersion();
+  cachedKeys = baseKeys;
+
+  return cached.value();
+}
+
+template <AbstractDomain D>
+void handleUnits(std::ostream &out, const UnitJit &unitJit,
+                 const std::string &dataDir,
+                 const std::vector<std::string> &synKeys,
+                 const std::vector<std::string> &baseKeys, bool outcomes) {
+  typedef typename Eval<D>::XferFn EvalFn;
+
+  const auto &toEval = cachedToEval<D>(dataDir);
+  const auto &[lowBase, medBase, highBase, cexBase] =
+      cachedBase<D>(unitJit, dataDir, baseKeys, toEval);
+  const auto &[low, med, high, cex] = toEval;
+
+  Eval<D> e(unitJit.getFns<EvalFn>(synKeys), {}, evalThreads);
+  for (const auto &[vecs, base] : {std::tie(high, highBase),
+                                   std::tie(med, medBase),
+                                   std::tie(low, lowBase)})
+    printVecs(out, e, vecs, base, false, outcomes);
+  printVecs(out, e, cex, cexBase, true, outcomes);
+}
+
+void handleRequest(std::istream &in, std::ostream &out, bool outcomes) {
   std::string fname;
-  std::getline(std::cin, fname);
+  std::getline(in, fname);
 
   std::string domain;
-  std::getline(std::cin, domain);
+  std::getline(in, domain);
 
   std::string opName;
-  std::getline(std::cin, opName);
+  std::getline(in, opName);
 
-  std::vector<std::string> synNames = parseStrList(std::cin);
-  std::vector<std::string> bFnNames = parseStrList(std::cin);
-  std::string fnSrcCode(std::istreambuf_iterator<char>(std::cin), {});
+  std::vector<std::string> synNames = parseStrList(in);
+  std::vector<std::string> bFnNames = parseStrList(in);
+  std::string fnSrcCode(std::istreambuf_iterator<char>(in), {});
 
-  if (opName != "" && synNames.size() != 0) {
-    std::cerr << "No synthed functions allowed on final eval\n";
-    exit(1);
-  }
+  if (opName != "" && synNames.size() != 0)
+    throw std::invalid_argument("No synthed functions allowed on final eval");
 
-  if (opName != "" && bFnNames.size() != 1) {
-    std::cerr << "Only one reference function allowed on final eval\n";
-    exit(1);
-  }
+  if (opName != "" && bFnNames.size() != 1)
+    throw std::invalid_argument(
+        "Only one reference function allowed on final eval");
+
+  if (opName != "" && outcomes)
+    throw std::invalid_argument("No outcomes on final eval");
 
   if (domain == "KnownBits") {
-    handleDomain<KnownBits, llvm::KnownBits>(fname, synNames, bFnNames,
+    handleDomain<KnownBits, llvm::KnownBits>(out, fname, synNames, bFnNames,
                                              fnSrcCode, opName, KB_TESTS,
-                                             kb_xfer_wrapper);
+                                             kb_xfer_wrapper, outcomes);
   } else if (domain == "UConstRange") {
-    handleDomain<UConstRange, llvm::ConstantRange>(fname, synNames, bFnNames,
-                                                   fnSrcCode, opName, UCR_TESTS,
-                                                   ucr_xfer_wrapper);
+    handleDomain<UConstRange, llvm::ConstantRange>(
+        out, fname, synNames, bFnNames, fnSrcCode, opName, UCR_TESTS,
+        ucr_xfer_wrapper, outcomes);
   } else if (domain == "SConstRange") {
-    handleDomain<SConstRange, std::nullopt_t>(fname, synNames, bFnNames,
+    handleDomain<SConstRange, std::nullopt_t>(out, fname, synNames, bFnNames,
                                               fnSrcCode, opName, EMPTY_TESTS,
-                                              scr_xfer_wrapper);
+                                              scr_xfer_wrapper, outcomes);
   } else if (domain == "IntegerModulo") {
     handleDomain<IntegerModulo<6>, std::nullopt_t>(
-        fname, synNames, bFnNames, fnSrcCode, opName, EMPTY_TESTS,
-        im_xfer_wrapper);
+        out, fname, synNames, bFnNames, fnSrcCode, opName, EMPTY_TESTS,
+        im_xfer_wrapper, outcomes);
+  } else {
+    throw std::invalid_argument("Unknown domain: " + domain);
+  }
+}
+
+// like handleRequest, but the functions to evaluate are units already
+// compiled into unitJit, referred to by their keys
+void handleUnitsRequest(std::istream &in, std::ostream &out,
+                        const UnitJit &unitJit, bool outcomes) {
+  std::string fname;
+  std::getline(in, fname);
+
+  std::string domain;
+  std::getline(in, domain);
+
+  std::vector<std::string> synKeys = parseStrList(in);
+  std::vector<std::string> baseKeys = parseStrList(in);
+
+  if (domain == "KnownBits") {
+    handleUnits<KnownBits>(out, unitJit, fname, synKeys, baseKeys, outcomes);
+  } else if (domain == "UConstRange") {
+    handleUnits<UConstRange>(out, unitJit, fname, synKeys, baseKeys, outcomes);
+  } else if (domain == "SConstRange") {
+    handleUnits<SConstRange>(out, unitJit, fname, synKeys, baseKeys, outcomes);
+  } else if (domain == "IntegerModulo") {
+    handleUnits<IntegerModulo<6>>(out, unitJit, fname, synKeys, baseKeys,
+                                  outcomes);
   } else {
-    std::cerr << "Unknown domain: " << domain << "\n";
+    throw std::invalid_argument("Unknown domain: " + domain);
+  }
+}
+
+// Request loop used by the python client (see eval.py). A request is a header
+// line "<cmd> <len>" followed by <len> bytes of payload, a response is a
+// header line "ok <len>" or "err <len>" followed by <len> bytes of payload.
+//
+// Commands:
+//   eval        the same text the one-shot mode reads from stdin
+//   eval-outcomes
+//               like eval, but responds with the binary Outcomes of every
+//               bitwidth instead of the Results
+//   helpers     source code compiled into every following batch of units
+//   compile     a list of unit keys, a list of the function name of each unit
+//               and the source code of all units, compiled as one batch
+//   drop        a list of unit keys to free
+//   eval-units  data dir, domain, a list of synth unit keys and a list of
+//               base unit keys
+//   eval-units-outcomes
+//               like eval-outcomes, for eval-units
+//   quit        shuts the server down
+void serve(std::istream &in, std::ostream &out) {
+  UnitJit unitJit;
+
+  std::string header;
+  while (std::getline(in, header)) {
+    std::istringstream headerStream(header);
+    std::string cmd;
+    size_t len = 0;
+    headerStream >> cmd >> len;
+
+    std::string payload(len, '\0');
+    in.read(payload.data(), static_cast<std::streamsize>(len));
+
+    if (cmd == "quit")
+      break;
+
+    std::string status = "ok";
+    std::ostringstream response;
+    try {
+      std::istringstream request(payload);
+      if (cmd == "eval") {
+        handleRequest(request, response, false);
+      } else if (cmd == "eval-outcomes") {
+        handleRequest(request, response, true);
+      } else if (cmd == "helpers") {
+        unitJit.setHelpers(payload);
+      } else if (cmd == "compile") {
+        std::vector<std::string> keys = parseStrList(request);
+        std::vector<std::string> fnNames = parseStrList(request);
+        std::string src(std::istreambuf_iterator<char>(request), {});
+        unitJit.compile(keys, fnNames, src);
+      } else if (cmd == "drop") {
+        unitJit.drop(parseStrList(request));
+      } else if (cmd == "eval-units") {
+        handleUnitsRequest(request, response, unitJit, false);
+      } else if (cmd == "eval-units-outcomes") {
+        handleUnitsRequest(request, response, unitJit, true);
+      } else {
+        throw std::invalid_argument("Unknown command: " + cmd);
+      }
+    } catch (const std::exception &e) {
+      status = "err";
+      response.str(e.what());
+    }
+
+    const std::string body = response.str();
+    out << status << " " << body.size() << "\n" << body << std::flush;
+  }
+}
+
+// usage: eval_engine [--server] [--threads N] [--binary]
+int main(int argc, char **argv) {
+  std::ios::sync_with_stdio(false);
+
+  bool server = false;
+  for (int i = 1; i < argc; ++i) {
+    std::string_view arg(argv[i]);
+    if (arg == "--server") {
+      server = true;
+    } else if (arg == "--binary") {
+      binaryOutput = true;
+    } else if (arg == "--threads" && i + 1 < argc) {
+      evalThreads = static_cast<unsigned int>(std::stoul(argv[++i]));
+    } else {
+      std::cerr << "Unknown argument: " << arg << "\n";
+      exit(1);
+    }
+  }
+
+  if (server) {
+    serve(std::cin, std::cout);
+    return 0;
+  }
+
+  try {
+    handleRequest(std::cin, std::cout, false);
+  } catch (const std::exception &e) {
+    std::cerr << e.what() << "\n";
     exit(1);
   }
 
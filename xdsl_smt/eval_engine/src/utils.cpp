@@ -2,8 +2,11 @@
 #define Utils_H
 
 #include <algorithm>
+#include <cstdint>
+#include <cstring>
 #include <fcntl.h>
 #include <filesystem>
+#include <fstream>
 #include <functional>
 #include <iostream>
 #include <istream>
@@ -11,7 +14,9 @@
 #include <regex>
 #include <stdexcept>
 #include <string>
+#include <string_view>
 #include <sys/mman.h>
+#include <sys/stat.h>
 #include <unistd.h>
 #include <vector>
 
@@ -121,162 +126,217 @@ parseTriples(std::istream &in) {
   return result;
 }
 
+// parses a line of tuples of any length, e.g. "[(1, 2, 3), (4, 5)]"
+const std::vector<std::vector<uint64_t>> parseIntTuples(std::istream &in) {
+  std::vector<std::vector<uint64_t>> result;
+  std::string line;
+  std::getline(in, line);
+
+  std::regex tuple_regex(R"(\(([^)]*)\))");
+  std::regex number_regex(R"(\d+)");
+  std::smatch match;
+
+  std::string::const_iterator searchStart(line.cbegin());
+  while (std::regex_search(searchStart, line.cend(), match, tuple_regex)) {
+    const std::string elems = match[1].str();
+    std::vector<uint64_t> tuple;
+    for (std::sregex_iterator it(elems.begin(), elems.end(), number_regex), end;
+         it != end; ++it)
+      tuple.push_back(std::stoull(it->str()));
+    result.push_back(std::move(tuple));
+    searchStart = match.suffix().first;
+  }
+
+  return result;
+}
+
+// Test vectors are stored in ".xvec" files. Format version 1, all fields in
+// native byte order:
+//   char magic[4]    "XVEC"
+//   u32  version     1
+//   char domain[16]  name of the abstract domain, NUL padded
+//   u32  bw          bitwidth of every value
+//   u32  n           number of APInts per abstract value (D::N)
+//   u64  count       number of vectors
+// followed by count * 3 * n u64 values: the APInts of lhs, rhs and best of
+// each vector in turn. The header is 40 bytes long, so the values are 8 byte
+// aligned in an mmaped file. xdsl_smt/eval_engine/vectors.py reads the same
+// format.
+struct VecHeader {
+  char magic[4];
+  uint32_t version;
+  char domain[16];
+  uint32_t bw;
+  uint32_t n;
+  uint64_t count;
+};
+static_assert(sizeof(VecHeader) == 40);
+
+constexpr uint32_t VEC_VERSION = 1;
+
 const std::string makeVecFname(const std::string &dirPath,
                                const std::string &type, unsigned int bw,
                                unsigned long samples) {
   return dirPath + type + "_bw_" + std::to_string(bw) + "_samples_" +
-         std::to_string(samples) + ".bin";
+         std::to_string(samples) + ".xvec";
 }
 
 template <AbstractDomain D>
 void write_vecs(const std::string &fname,
-                const std::vector<std::tuple<D, D, D>> &x, bool append) {
-  const size_t data_size =
-      x.size() * D::N * (sizeof(unsigned) + sizeof(unsigned long)) * 3;
-
-  int fd = open(fname.c_str(), O_RDWR | O_CREAT, 0666);
-  if (fd == -1) {
-    std::cerr << "open\n";
-    exit(1);
-  }
-
-  off_t offset_position = 0;
+                const std::vector<std::tuple<D, D, D>> &x) {
+  VecHeader header = {};
+  std::memcpy(header.magic, "XVEC", sizeof(header.magic));
+  header.version = VEC_VERSION;
+  D::name.copy(header.domain, sizeof(header.domain) - 1);
+  header.bw = x.empty() ? 0 : std::get<0>(x[0]).bw();
+  header.n = D::N;
+  header.count = x.size();
+
+  std::vector<uint64_t> values;
+  values.reserve(x.size() * 3 * D::N);
+  for (const auto &[lhs, rhs, best] : x)
+    for (const D *d : {&lhs, &rhs, &best})
+      for (unsigned int i = 0; i < D::N; ++i) {
+        if (d->v[i].getBitWidth() != header.bw)
+          throw std::invalid_argument("Vectors in " + fname +
+                                      " must have a single bitwidth");
+        values.push_back(d->v[i].getZExtValue());
+      }
+
+  // readers must never see a partially written file
+  const std::string tmpName = fname + ".tmp";
+  std::ofstream out(tmpName, std::ios::binary | std::ios::trunc);
+  out.write(reinterpret_cast<const char *>(&header), sizeof(header));
+  out.write(reinterpret_cast<const char *>(values.data()),
+            static_cast<std::streamsize>(values.size() * sizeof(uint64_t)));
+  out.close();
+  if (!out)
+    throw std::runtime_error("Failed to write " + tmpName);
+
+  std::filesystem::rename(tmpName, fname);
+}
 
-  if (append) {
-    offset_position = lseek(fd, 0, SEEK_END);
-    if (offset_position == -1) {
-      std::cerr << "lseek\n";
-      close(fd);
-      exit(1);
-    }
-  }
+template <AbstractDomain D>
+std::vector<std::tuple<D, D, D>> read_vecs(const std::string &fname) {
+  int fd = open(fname.c_str(), O_RDONLY);
+  if (fd == -1)
+    throw std::runtime_error("Failed to open " + fname);
 
-  if (ftruncate(fd, offset_position + static_cast<off_t>(data_size)) == -1) {
-    std::cerr << "ftruncate\n";
+  struct stat st;
+  if (fstat(fd, &st) == -1) {
     close(fd);
-    exit(1);
+    throw std::runtime_error("Failed to stat " + fname);
   }
 
-  // Align offset to page boundary
-  long page_size = sysconf(_SC_PAGE_SIZE);
-  off_t aligned_offset = offset_position & ~(page_size - 1);
-  off_t delta = offset_position - aligned_offset;
-  size_t map_size = data_size + static_cast<size_t>(delta);
-
-  unsigned char *map_base = static_cast<unsigned char *>(
-      mmap(nullptr, map_size, PROT_WRITE, MAP_SHARED, fd, aligned_offset));
-  if (map_base == MAP_FAILED) {
-    std::cerr << "mmap\n";
+  const size_t size = static_cast<size_t>(st.st_size);
+  if (size < sizeof(VecHeader)) {
     close(fd);
-    exit(1);
+    throw std::invalid_argument("Not a vector file: " + fname);
   }
 
-  unsigned char *ptr = map_base + delta;
-  unsigned int offset = 0;
-  for (auto &[x0, x1, x2] : x) {
-    x0.serialize(ptr, offset);
-    x1.serialize(ptr, offset);
-    x2.serialize(ptr, offset);
-  }
-
-  munmap(ptr, data_size);
+  void *map = mmap(nullptr, size, PROT_READ, MAP_SHARED, fd, 0);
   close(fd);
-}
-
-template <AbstractDomain D>
-std::vector<std::tuple<D, D, D>> read_vecs(const std::string &fname,
-                                           unsigned int num_elemnts) {
-  const size_t total_size =
-      num_elemnts * D::N * (sizeof(unsigned) + sizeof(unsigned long)) * 3;
-
-  int fd = open(fname.c_str(), O_RDONLY);
-  if (fd == -1) {
-    std::cerr << "open\n";
-    exit(1);
+  if (map == MAP_FAILED)
+    throw std::runtime_error("Failed to mmap " + fname);
+
+  const unsigned char *base = static_cast<const unsigned char *>(map);
+  VecHeader header;
+  std::memcpy(&header, base, sizeof(header));
+
+  const std::string_view domain(header.domain,
+                                strnlen(header.domain, sizeof(header.domain)));
+  std::string error;
+  if (std::string_view(header.magic, sizeof(header.magic)) != "XVEC")
+    error = "Not a vector file: ";
+  else if (header.version != VEC_VERSION)
+    error = "Unsupported vector file version " +
+            std::to_string(header.version) + ": ";
+  else if (domain != D::name || header.n != D::N)
+    error = "Vectors of domain " + std::string(domain) + " can't be read as " +
+            std::string(D::name) + ": ";
+  else if (size != sizeof(VecHeader) + header.count * 3 * D::N * 8)
+    error = "Truncated vector file: ";
+
+  if (!error.empty()) {
+    munmap(map, size);
+    throw std::invalid_argument(error + fname);
   }
 
-  unsigned char *ptr = static_cast<unsigned char *>(
-      mmap(nullptr, total_size, PROT_READ, MAP_SHARED, fd, 0));
-  if (ptr == MAP_FAILED) {
-    std::cerr << "mmap\n";
-    close(fd);
-    exit(1);
-  }
+  const uint64_t *values =
+      reinterpret_cast<const uint64_t *>(base + sizeof(VecHeader));
+  auto next = [&values, &header]() {
+    Vec<D::N> v(header.bw);
+    for (unsigned int i = 0; i < D::N; ++i)
+      v[i] = A::APInt(header.bw, *values++);
+    return D(v);
+  };
 
   std::vector<std::tuple<D, D, D>> vecs;
-  vecs.reserve(num_elemnts);
-
-  unsigned int offset = 0;
-  for (unsigned int x = 0; x < num_elemnts; ++x)
-    vecs.push_back({D::deserialize(ptr, offset), D::deserialize(ptr, offset),
-                    D::deserialize(ptr, offset)});
+  vecs.reserve(header.count);
+  for (uint64_t x = 0; x < header.count; ++x) {
+    const D lhs = next();
+    const D rhs = next();
+    const D best = next();
+    vecs.push_back({lhs, rhs, best});
+  }
 
-  munmap(ptr, total_size);
-  close(fd);
+  munmap(map, size);
 
   return vecs;
 }
 
-enum class EnumType { Low, Med, High };
-
-struct SampleTypes {
-  EnumType enumType;
-  unsigned int bw;
-  unsigned int numSamples;
-};
-
-SampleTypes parseSamples(const std::filesystem::directory_entry &entry) {
-  std::string filename = entry.path().filename().string();
-
-  std::regex pattern(R"((low|med|high)_bw_(\d+)_samples_(\d+)\.bin)");
-  std::smatch match;
-
-  if (!std::regex_match(filename, match, pattern)) {
-    throw std::invalid_argument("Filename format is invalid: " + filename);
-  }
-
-  EnumType enumType;
-  std::string enumTypeStr = match[1].str();
-  if (enumTypeStr == "low") {
-    enumType = EnumType::Low;
-  } else if (enumTypeStr == "med") {
-    enumType = EnumType::Med;
-  } else if (enumTypeStr == "high") {
-    enumType = EnumType::High;
-  } else {
-    throw std::invalid_argument("Unknown enumeration type: " + enumTypeStr);
-  }
-
-  unsigned int bw = static_cast<unsigned int>(std::stoul(match[2].str()));
-  unsigned int numSamples =
-      static_cast<unsigned int>(std::stoul(match[3].str()));
-
-  return SampleTypes{enumType, bw, numSamples};
+enum class EnumType { Low, Med, High, Cex };
+
+// the kind of the vectors in a file of a data dir, other files are ignored
+std::optional<EnumType>
+vecFileType(const std::filesystem::directory_entry &entry) {
+  const std::string filename = entry.path().filename().string();
+  if (entry.path().extension() != ".xvec")
+    return std::nullopt;
+
+  if (filename.starts_with("low_"))
+    return EnumType::Low;
+  if (filename.starts_with("med_"))
+    return EnumType::Med;
+  if (filename.starts_with("high_"))
+    return EnumType::High;
+  if (filename.starts_with("cex_"))
+    return EnumType::Cex;
+
+  throw std::invalid_argument("Unknown enumeration type: " + filename);
 }
 
 template <AbstractDomain D>
 using ToEval = std::vector<std::vector<std::tuple<D, D, D>>>;
 
+// the low, med and high vectors of a data dir, and the vectors of the
+// counterexamples found by the verifier, which are kept apart as they only
+// count towards soundness
+template <AbstractDomain D>
+using AllToEval = std::tuple<ToEval<D>, ToEval<D>, ToEval<D>, ToEval<D>>;
+
 template <AbstractDomain D>
-const std::tuple<ToEval<D>, ToEval<D>, ToEval<D>>
-getToEval(const std::string dirName) {
+const AllToEval<D> getToEval(const std::string dirName) {
   ToEval<D> lowVecs;
   ToEval<D> medVecs;
   ToEval<D> highVecs;
+  ToEval<D> cexVecs;
 
   for (const std::filesystem::directory_entry &entry :
        std::filesystem::directory_iterator(dirName)) {
-    SampleTypes sample = parseSamples(entry);
-    if (sample.enumType == EnumType::High) {
-      highVecs.push_back(read_vecs<D>(entry.path(), sample.numSamples));
-    } else if (sample.enumType == EnumType::Med) {
-      medVecs.push_back(read_vecs<D>(entry.path(), sample.numSamples));
-    } else {
-      lowVecs.push_back(read_vecs<D>(entry.path(), sample.numSamples));
+    std::optional<EnumType> type = vecFileType(entry);
+    if (type == EnumType::High) {
+      highVecs.push_back(read_vecs<D>(entry.path()));
+    } else if (type == EnumType::Med) {
+      medVecs.push_back(read_vecs<D>(entry.path()));
+    } else if (type == EnumType::Low) {
+      lowVecs.push_back(read_vecs<D>(entry.path()));
+    } else if (type == EnumType::Cex) {
+      cexVecs.push_back(read_vecs<D>(entry.path()));
     }
   }
 
-  return {lowVecs, medVecs, highVecs};
+  return {lowVecs, medVecs, highVecs, cexVecs};
 }
 
 #endif
@@ -2,7 +2,10 @@
 #define EnumDomain_H
 
 #include <algorithm>
+#include <cstdint>
+#include <map>
 #include <random>
+#include <stdexcept>
 #include <vector>
 
 #include "../AbstVal.h"
@@ -57,6 +60,43 @@ public:
     return r;
   }
 
+  // one vector per counterexample (bw, lhs..., rhs..., lhsConc, rhsConc),
+  // grouped by bitwidth. Counterexamples of at most maxExactBw get their exact
+  // best abstraction, others one sampled from numConcSamples values.
+  const ToEval<D> genCexs(const std::vector<std::vector<uint64_t>> &cexs,
+                          unsigned int maxExactBw, int numConcSamples,
+                          std::mt19937 &rng) {
+    std::map<unsigned int, std::vector<std::tuple<D, D, D>>> byBw;
+    for (const std::vector<uint64_t> &cex : cexs) {
+      if (cex.size() != 2 * D::N + 3)
+        throw std::invalid_argument("Malformed counterexample");
+
+      const unsigned int bw = static_cast<unsigned int>(cex[0]);
+      auto next = [&cex, bw, i = 1ul]() mutable {
+        return A::APInt(bw, cex[i++]);
+      };
+      Vec<D::N> lhs(bw);
+      for (unsigned int i = 0; i < D::N; ++i)
+        lhs[i] = next();
+      Vec<D::N> rhs(bw);
+      for (unsigned int i = 0; i < D::N; ++i)
+        rhs[i] = next();
+      const A::APInt lhsConc = next();
+      const A::APInt rhsConc = next();
+
+      byBw[bw].push_back(evalAbstOp.fromCex(D(lhs), D(rhs), lhsConc, rhsConc,
+                                            rng,
+                                            bw <= maxExactBw ? -1
+                                                             : numConcSamples));
+    }
+
+    ToEval<D> r;
+    for (auto &[bw, vecs] : byBw)
+      r.push_back(std::move(vecs));
+
+    return r;
+  }
+
   const std::vector<std::tuple<D, D, D>> sampleLattice(unsigned int bw,
                                                        unsigned int samples,
                                                        std::mt19937 &rng,
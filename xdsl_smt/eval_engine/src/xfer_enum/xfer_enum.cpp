@@ -1,3 +1,4 @@
+#include <cstdint>
 #include <iostream>
 #include <random>
 #include <string>
@@ -14,7 +15,7 @@ void writeLat(const std::string &dirPath, const std::string &type,
   for (const std::vector<std::tuple<D, D, D>> &vecs : lat) {
     const std::string fname =
         makeVecFname(dirPath, type, std::get<0>(vecs[0]).bw(), vecs.size());
-    write_vecs(fname, vecs, false);
+    write_vecs(fname, vecs);
   }
 }
 
@@ -38,7 +39,66 @@ void handleDomain(
   writeLat(dirPath, "high", hbwLat);
 }
 
-int main() {
+// counterexamples of at most this bitwidth get their exact best abstraction
+constexpr unsigned int MAX_EXACT_CEX_BW = 8;
+
+template <AbstractDomain D>
+void handleCexs(Jit jit, const std::vector<std::vector<uint64_t>> &cexs,
+                int numConcSamples, std::mt19937 &rng,
+                const std::string &dirPath) {
+  EnumDomain<D> e(std::move(jit));
+
+  writeLat(dirPath, "cex",
+           e.genCexs(cexs, MAX_EXACT_CEX_BW, numConcSamples, rng));
+}
+
+// usage: xfer_enum [--cex]
+//
+// With --cex, instead of the low, med and high bitwidths to enumerate, reads
+// the number of concrete values to sample the best abstraction of a vector
+// from and a list of counterexamples (bw, lhs..., rhs..., lhsConc, rhsConc)
+// found by the verifier, and writes a vector for each of them.
+int cexMain() {
+  std::string fname;
+  std::getline(std::cin, fname);
+
+  std::string domain;
+  std::getline(std::cin, domain);
+
+  std::string tmpStr;
+  std::getline(std::cin, tmpStr);
+  int numConcSamples = std::stoi(tmpStr);
+
+  std::vector<std::vector<uint64_t>> cexs = parseIntTuples(std::cin);
+
+  std::getline(std::cin, tmpStr);
+  unsigned int seed = static_cast<unsigned int>(std::stoul(tmpStr));
+  std::mt19937 rng(seed);
+
+  std::string fnSrcCode(std::istreambuf_iterator<char>(std::cin), {});
+  Jit jit(fnSrcCode);
+
+  if (domain == "KnownBits") {
+    handleCexs<KnownBits>(std::move(jit), cexs, numConcSamples, rng, fname);
+  } else if (domain == "UConstRange") {
+    handleCexs<UConstRange>(std::move(jit), cexs, numConcSamples, rng, fname);
+  } else if (domain == "SConstRange") {
+    handleCexs<SConstRange>(std::move(jit), cexs, numConcSamples, rng, fname);
+  } else if (domain == "IntegerModulo") {
+    handleCexs<IntegerModulo<6>>(std::move(jit), cexs, numConcSamples, rng,
+                                 fname);
+  } else {
+    std::cerr << "Unknown domain: " << domain << "\n";
+    return 1;
+  }
+
+  return 0;
+}
+
+int main(int argc, char **argv) {
+  if (argc == 2 && std::string(argv[1]) == "--cex")
+    return cexMain();
+
   std::string fname;
   std::getline(std::cin, fname);
 
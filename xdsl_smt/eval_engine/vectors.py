@@ -0,0 +1,261 @@
+"""
+Reading and caching the test vectors written by xfer_enum.
+
+Vectors are stored in `.xvec` files, one per enumeration type and bitwidth.
+Format version 1, all fields in native byte order:
+
+    char magic[4]    "XVEC"
+    u32  version     1
+    char domain[16]  name of the abstract domain, NUL padded
+    u32  bw          bitwidth of every value
+    u32  n           number of integers per abstract value
+    u64  count       number of vectors
+
+followed by `count * 3 * n` u64 values: the integers of the lhs, rhs and best
+abstract value of each vector in turn. The writer lives in
+eval_engine/src/utils.cpp.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from types import TracebackType
+from typing import Callable, Iterator
+
+VEC_MAGIC = b"XVEC"
+VEC_VERSION = 1
+VEC_SUFFIX = ".xvec"
+
+_HEADER = struct.Struct("=4sI16sIIQ")
+
+
+@dataclass(frozen=True)
+class VecHeader:
+    domain: str
+    bw: int
+    n: int
+    count: int
+
+
+class VecFile:
+    """
+    A memory mapped vector file.
+
+    `values` is a zero copy view of the u64 values of the file, the values of
+    vector `i` are `values[i * 3 * n : (i + 1) * 3 * n]`. The view is only valid
+    until the file is closed.
+    """
+
+    header: VecHeader
+    values: memoryview
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise ValueError(f"Not a vector file: {path}")
+
+        magic, version, domain, bw, n, count = _HEADER.unpack_from(self._map)
+        error = None
+        if magic != VEC_MAGIC:
+            error = "Not a vector file"
+        elif version != VEC_VERSION:
+            error = f"Unsupported vector file version {version}"
+        elif len(self._map) != _HEADER.size + count * 3 * n * 8:
+            error = "Truncated vector file"
+
+        if error is not None:
+            self._map.close()
+            raise ValueError(f"{error}: {path}")
+
+        self.header = VecHeader(domain.rstrip(b"\0").decode(), bw, n, count)
+        self.values = memoryview(self._map)[_HEADER.size :].cast("Q")
+
+    def close(self):
+        self.values.release()
+        self._map.close()
+
+    def __enter__(self) -> "VecFile":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ):
+        self.close()
+
+
+def write_vectors(path: Path, domain: str, bw: int, n: int, values: list[int]) -> None:
+    "Write a vector file, `values` holds the flattened (lhs, rhs, best) tuples"
+    assert len(values) % (3 * n) == 0
+    count = len(values) // (3 * n)
+    header = _HEADER.pack(VEC_MAGIC, VEC_VERSION, domain.encode(), bw, n, count)
+    path.write_bytes(header + struct.pack(f"={len(values)}Q", *values))
+
+
+def vector_cache_root() -> Path:
+    "$XDSL_SMT_CACHE_DIR/vectors, by default under ~/.cache/xdsl-smt"
+    cache_dir = os.environ.get("XDSL_SMT_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(Path.home(), ".cache", "xdsl-smt")
+    return Path(cache_dir, "vectors")
+
+
+def _hash_key(*parts: object) -> str:
+    key = "\n".join([str(VEC_VERSION)] + [str(part) for part in parts])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+Enumerator = Callable[
+    [Path, list[int], list[tuple[int, int]], list[tuple[int, int, int]]], None
+]
+"Writes the vectors of the given low, med and high bitwidths into a directory"
+
+
+class VectorStore:
+    """
+    A persistent store of test vectors, shared by all runs on a machine.
+
+    The exhaustive vectors of a low bitwidth only depend on the domain and the
+    concrete op, so they are stored once per bitwidth and shared by runs with
+    any seed or set of bitwidths. The data dir of a run links to these and
+    holds the sampled med and high bitwidth vectors, which depend on the seed.
+
+    Every entry is created under a file lock and moved into place in one step,
+    so concurrent runs (e.g. the workers of benchmark.py) neither see partial
+    files nor enumerate the same vectors twice.
+
+    Layout under the root:
+        low/<key>.xvec   vectors of one low bitwidth
+        runs/<key>/      data dir of one set of enumeration parameters
+        extended/<key>/  data dir extended with the vectors of one run
+        locks/<key>      lock files
+    """
+
+    root: Path
+
+    def __init__(self, root: Path | None = None):
+        self.root = vector_cache_root() if root is None else root
+        for sub_dir in ["low", "runs", "extended", "locks"]:
+            (self.root / sub_dir).mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        with open(self.root / "locks" / key, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scratch_dir(self) -> Path:
+        return Path(mkdtemp(dir=self.root, prefix="tmp-"))
+
+    def low_vectors(
+        self, domain: str, bw: int, conc_op_src: str, enumerate_vectors: Enumerator
+    ) -> Path:
+        "The file holding the exhaustive vectors of bitwidth bw"
+        key = _hash_key("low", domain, bw, conc_op_src)
+        path = self.root / "low" / f"{key}{VEC_SUFFIX}"
+        if path.exists():
+            return path
+
+        with self.lock(key):
+            if not path.exists():
+                scratch = self._scratch_dir()
+                try:
+                    enumerate_vectors(scratch, [bw], [], [])
+                    (vec_file,) = scratch.glob(f"low_*{VEC_SUFFIX}")
+                    os.replace(vec_file, path)
+                finally:
+                    rmtree(scratch)
+
+        return path
+
+    def data_dir(
+        self,
+        domain: str,
+        low_bws: list[int],
+        med_bws: list[tuple[int, int]],
+        high_bws: list[tuple[int, int, int]],
+        seed: int,
+        conc_op_src: str,
+        enumerate_vectors: Enumerator,
+    ) -> Path:
+        "A dir holding the vectors of all the given bitwidths, as read by eval_engine"
+        key = _hash_key(domain, low_bws, med_bws, high_bws, seed, conc_op_src)
+        path = self.root / "runs" / key
+        if path.is_dir():
+            return path
+
+        with self.lock(key):
+            if path.is_dir():
+                return path
+
+            low_paths = [
+                self.low_vectors(domain, bw, conc_op_src, enumerate_vectors)
+                for bw in low_bws
+            ]
+
+            scratch = self._scratch_dir()
+            try:
+                for bw, low_path in zip(low_bws, low_paths):
+                    os.link(low_path, scratch / f"low_bw_{bw}{VEC_SUFFIX}")
+                if med_bws or high_bws:
+                    enumerate_vectors(scratch, [], med_bws, high_bws)
+                os.rename(scratch, path)
+            except BaseException:
+                rmtree(scratch)
+                raise
+
+        return path
+
+    def extended_dir(
+        self, data_dir: Path, extension: object, write_vectors: Callable[[Path], None]
+    ) -> Path:
+        """
+        A dir holding the vectors of data_dir and the vectors write_vectors adds,
+        e.g. for counterexamples found by the verifier. extension identifies the
+        added vectors.
+
+        Unlike the enumerated vectors, extended dirs are specific to a run, which
+        removes them with remove_extended_dir once they are no longer used.
+        """
+        key = _hash_key("extended", data_dir.resolve(), extension)
+        path = self.root / "extended" / key
+        if path.is_dir():
+            return path
+
+        with self.lock(key):
+            if path.is_dir():
+                return path
+
+            scratch = self._scratch_dir()
+            try:
+                for vec_file in data_dir.glob(f"*{VEC_SUFFIX}"):
+                    os.link(vec_file, scratch / vec_file.name)
+                write_vectors(scratch)
+                os.rename(scratch, path)
+            except BaseException:
+                rmtree(scratch)
+                raise
+
+        return path
+
+    def remove_extended_dir(self, path: Path) -> None:
+        "Remove a dir returned by extended_dir, the vectors it links to are kept"
+        if path.resolve().parent != (self.root / "extended").resolve():
+            raise ValueError(f"Not an extended dir of the store: {path}")
+        with self.lock(path.name):
+            rmtree(path, ignore_errors=True)
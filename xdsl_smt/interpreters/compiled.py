@@ -0,0 +1,414 @@
+"""
+A compiler of func.func programs of the SMT and bitvector dialects to Python.
+
+Where the xDSL interpreter dispatches every operation dynamically, and boxes
+every intermediate value in an attribute, the compiler turns a function once
+into the source of a straight-line Python function over plain values, and
+executes it. Booleans are Python bools, and bitvectors Python ints holding
+their unsigned value, of any width.
+
+The semantics are those of SMT-LIB, as in the vectorized evaluator, including
+division by zero, and shifts by at least the width of the bitvector.
+"""
+
+from typing import Any, Callable, Sequence
+from weakref import WeakKeyDictionary
+
+from xdsl.dialects.builtin import IntegerAttr, ModuleOp
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.dialects.smt import AndOp, ImpliesOp, OrOp, XOrOp
+from xdsl.ir import Attribute, Operation, SSAValue
+from xdsl.traits import SymbolTable
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects import smt_dialect as smt
+
+_Impl = Callable[[Any, list[str]], str]
+"The Python expression of an operation, given the names of its operands"
+
+
+def _width(value: SSAValue) -> int:
+    assert isinstance(value.type, bv.BitVectorType)
+    return value.type.width.data
+
+
+def _mask(width: int) -> int:
+    return (1 << width) - 1
+
+
+# Helpers called by the generated code
+
+
+def _signed(x: int, width: int) -> int:
+    return x - ((x >> (width - 1)) << width)
+
+
+def _udiv(lhs: int, rhs: int, width: int) -> int:
+    # Division by zero is all ones
+    return lhs // rhs if rhs else _mask(width)
+
+
+def _urem(lhs: int, rhs: int) -> int:
+    # The remainder of a division by zero is the dividend
+    return lhs % rhs if rhs else lhs
+
+
+def _sdiv(lhs: int, rhs: int, width: int) -> int:
+    l, r = _signed(lhs, width), _signed(rhs, width)
+    quotient = _udiv(abs(l), abs(r), width)
+    return (-quotient if (l < 0) != (r < 0) else quotient) & _mask(width)
+
+
+def _srem(lhs: int, rhs: int, width: int) -> int:
+    # The remainder has the sign of the dividend
+    l, r = _signed(lhs, width), _signed(rhs, width)
+    remainder = _urem(abs(l), abs(r))
+    return (-remainder if l < 0 else remainder) & _mask(width)
+
+
+def _smod(lhs: int, rhs: int, width: int) -> int:
+    # The remainder has the sign of the divisor
+    l, r = _signed(lhs, width), _signed(rhs, width)
+    remainder = _urem(abs(l), abs(r))
+    if remainder == 0 or (l >= 0 and r >= 0):
+        return remainder
+    if l < 0 and r >= 0:
+        return (r - remainder) & _mask(width)
+    if l >= 0:
+        return (r + remainder) & _mask(width)
+    return -remainder & _mask(width)
+
+
+_HELPERS: dict[str, object] = {
+    helper.__name__: helper for helper in (_signed, _udiv, _urem, _sdiv, _srem, _smod)
+}
+
+
+# Expressions of the operations
+
+
+def _bool_constant(op: smt.ConstantBoolOp, args: list[str]) -> str:
+    return repr(op.value.value.data != 0)
+
+
+def _not(op: smt.NotOp, args: list[str]) -> str:
+    return f"not {args[0]}"
+
+
+def _and(op: AndOp, args: list[str]) -> str:
+    return " and ".join(args)
+
+
+def _or(op: OrOp, args: list[str]) -> str:
+    return " or ".join(args)
+
+
+def _xor(op: XOrOp, args: list[str]) -> str:
+    return " ^ ".join(args)
+
+
+def _implies(op: ImpliesOp, args: list[str]) -> str:
+    return f"not {args[0]} or {args[1]}"
+
+
+def _eq(op: smt.EqOp, args: list[str]) -> str:
+    return f"{args[0]} == {args[1]}"
+
+
+def _distinct(op: smt.DistinctOp, args: list[str]) -> str:
+    return f"{args[0]} != {args[1]}"
+
+
+def _ite(op: smt.IteOp, args: list[str]) -> str:
+    return f"{args[1]} if {args[0]} else {args[2]}"
+
+
+def _bv_constant(op: bv.ConstantOp, args: list[str]) -> str:
+    return str(op.value.value.data & _mask(_width(op.res)))
+
+
+def _binary(template: str, masked: bool) -> _Impl:
+    def binary(op: bv.BinaryBVOp, args: list[str]) -> str:
+        expression = template.format(*args)
+        if not masked:
+            return expression
+        return f"({expression}) & {_mask(_width(op.res))}"
+
+    return binary
+
+
+def _bv_neg(op: bv.NegOp, args: list[str]) -> str:
+    return f"-{args[0]} & {_mask(_width(op.res))}"
+
+
+def _bv_not(op: bv.NotOp, args: list[str]) -> str:
+    return f"{args[0]} ^ {_mask(_width(op.res))}"
+
+
+def _bv_shl(op: bv.ShlOp, args: list[str]) -> str:
+    # Guarding the shift avoids building huge integers
+    width = _width(op.res)
+    return f"({args[0]} << {args[1]}) & {_mask(width)} if {args[1]} < {width} else 0"
+
+
+def _bv_ashr(op: bv.AShrOp, args: list[str]) -> str:
+    width = _width(op.res)
+    return f"(_signed({args[0]}, {width}) >> {args[1]}) & {_mask(width)}"
+
+
+def _helper(name: str) -> _Impl:
+    def helper(op: bv.BinaryBVOp, args: list[str]) -> str:
+        return f"{name}({args[0]}, {args[1]}, {_width(op.res)})"
+
+    return helper
+
+
+def _bv_urem(op: bv.URemOp, args: list[str]) -> str:
+    return f"_urem({args[0]}, {args[1]})"
+
+
+def _compare(operator: str, signed: bool) -> _Impl:
+    def compare(op: bv.BinaryPredBVOp, args: list[str]) -> str:
+        if not signed:
+            return f"{args[0]} {operator} {args[1]}"
+        width = _width(op.lhs)
+        lhs, rhs = (f"_signed({arg}, {width})" for arg in args)
+        return f"{lhs} {operator} {rhs}"
+
+    return compare
+
+
+def _bv_uaddo(op: bv.UaddOverflowOp, args: list[str]) -> str:
+    return f"{args[0]} + {args[1]} > {_mask(_width(op.lhs))}"
+
+
+def _bv_saddo(op: bv.SaddOverflowOp, args: list[str]) -> str:
+    width = _width(op.lhs)
+    total = f"_signed({args[0]}, {width}) + _signed({args[1]}, {width})"
+    return f"not {-(1 << (width - 1))} <= {total} < {1 << (width - 1)}"
+
+
+def _bv_umulo(op: bv.UmulOverflowOp, args: list[str]) -> str:
+    return f"{args[0]} * {args[1]} > {_mask(_width(op.lhs))}"
+
+
+def _bv_umul_noovfl(op: bv.UmulNoOverflowOp, args: list[str]) -> str:
+    return f"{args[0]} * {args[1]} <= {_mask(_width(op.lhs))}"
+
+
+def _signed_product(op: bv.BinaryPredBVOp, args: list[str]) -> str:
+    width = _width(op.lhs)
+    return f"_signed({args[0]}, {width}) * _signed({args[1]}, {width})"
+
+
+def _bv_smulo(op: bv.SmulOverflowOp, args: list[str]) -> str:
+    width = _width(op.lhs)
+    product = _signed_product(op, args)
+    return f"not {-(1 << (width - 1))} <= {product} < {1 << (width - 1)}"
+
+
+def _bv_smul_noovfl(op: bv.SmulNoOverflowOp, args: list[str]) -> str:
+    return f"{_signed_product(op, args)} < {1 << (_width(op.lhs) - 1)}"
+
+
+def _bv_smul_noudfl(op: bv.SmulNoUnderflowOp, args: list[str]) -> str:
+    return f"{_signed_product(op, args)} >= {-(1 << (_width(op.lhs) - 1))}"
+
+
+def _bv_nego(op: bv.NegOverflowOp, args: list[str]) -> str:
+    return f"{args[0]} == {1 << (_width(op.operand) - 1)}"
+
+
+def _bv_concat(op: bv.ConcatOp, args: list[str]) -> str:
+    return f"({args[0]} << {_width(op.rhs)}) | {args[1]}"
+
+
+def _bv_extract(op: bv.ExtractOp, args: list[str]) -> str:
+    start, end = op.start.data, op.end.data
+    return f"({args[0]} >> {start}) & {_mask(end - start + 1)}"
+
+
+def _bv_repeat(op: bv.RepeatOp, args: list[str]) -> str:
+    # Multiplying by 0b0..01 0..01 ... places a copy of the operand at each 1
+    width = _width(op.operand)
+    return f"{args[0]} * {sum(1 << (width * i) for i in range(op.count.data))}"
+
+
+def _bv_zero_extend(op: bv.ZeroExtendOp, args: list[str]) -> str:
+    return args[0]
+
+
+def _bv_sign_extend(op: bv.SignExtendOp, args: list[str]) -> str:
+    width = _width(op.operand)
+    return f"_signed({args[0]}, {width}) & {_mask(_width(op.res))}"
+
+
+_IMPLS: dict[type[Operation], _Impl] = {
+    smt.ConstantBoolOp: _bool_constant,
+    smt.NotOp: _not,
+    AndOp: _and,
+    OrOp: _or,
+    XOrOp: _xor,
+    ImpliesOp: _implies,
+    smt.EqOp: _eq,
+    smt.DistinctOp: _distinct,
+    smt.IteOp: _ite,
+    bv.ConstantOp: _bv_constant,
+    bv.AddOp: _binary("{} + {}", True),
+    bv.SubOp: _binary("{} - {}", True),
+    bv.MulOp: _binary("{} * {}", True),
+    bv.NegOp: _bv_neg,
+    bv.NotOp: _bv_not,
+    bv.AndOp: _binary("{} & {}", False),
+    bv.OrOp: _binary("{} | {}", False),
+    bv.XorOp: _binary("{} ^ {}", False),
+    bv.NAndOp: _binary("~({} & {})", True),
+    bv.NorOp: _binary("~({} | {})", True),
+    bv.XNorOp: _binary("~({} ^ {})", True),
+    bv.ShlOp: _bv_shl,
+    bv.LShrOp: _binary("{} >> {}", False),
+    bv.AShrOp: _bv_ashr,
+    bv.UDivOp: _helper("_udiv"),
+    bv.URemOp: _bv_urem,
+    bv.SDivOp: _helper("_sdiv"),
+    bv.SRemOp: _helper("_srem"),
+    bv.SModOp: _helper("_smod"),
+    bv.UleOp: _compare("<=", False),
+    bv.UltOp: _compare("<", False),
+    bv.UgeOp: _compare(">=", False),
+    bv.UgtOp: _compare(">", False),
+    bv.SleOp: _compare("<=", True),
+    bv.SltOp: _compare("<", True),
+    bv.SgeOp: _compare(">=", True),
+    bv.SgtOp: _compare(">", True),
+    bv.UaddOverflowOp: _bv_uaddo,
+    bv.SaddOverflowOp: _bv_saddo,
+    bv.UmulOverflowOp: _bv_umulo,
+    bv.UmulNoOverflowOp: _bv_umul_noovfl,
+    bv.SmulOverflowOp: _bv_smulo,
+    bv.SmulNoOverflowOp: _bv_smul_noovfl,
+    bv.SmulNoUnderflowOp: _bv_smul_noudfl,
+    bv.NegOverflowOp: _bv_nego,
+    bv.ConcatOp: _bv_concat,
+    bv.ExtractOp: _bv_extract,
+    bv.RepeatOp: _bv_repeat,
+    bv.ZeroExtendOp: _bv_zero_extend,
+    bv.SignExtendOp: _bv_sign_extend,
+}
+
+
+def _check_type(ty: Attribute) -> None:
+    if not isinstance(ty, smt.BoolType | bv.BitVectorType):
+        raise ValueError(f"Unsupported type: {ty}")
+
+
+class CompiledFunction:
+    """
+    A func.func compiled to a Python function, called on one plain value per
+    argument, and returning a tuple of plain values.
+
+    Raises ValueError on functions with operations or types it does not
+    support.
+    """
+
+    argument_types: list[Attribute]
+    result_types: list[Attribute]
+    source: str
+    "The source of the generated function"
+    function: Callable[..., tuple[Any, ...]]
+
+    def __init__(self, func: FuncOp):
+        self.argument_types = list(func.function_type.inputs.data)
+        for ty in self.argument_types:
+            _check_type(ty)
+
+        names: dict[SSAValue, str] = {arg: f"v{i}" for i, arg in enumerate(func.args)}
+        lines = [f"def {func.sym_name.data}({', '.join(names.values())}):"]
+        self.result_types = []
+        for op in func.body.ops:
+            if isinstance(op, ReturnOp | smt.ReturnOp):
+                self.result_types = [operand.type for operand in op.operands]
+                # A trailing comma makes a tuple of a single result
+                results = "".join(f"{names[operand]}," for operand in op.operands)
+                lines.append(f"    return ({results})")
+                break
+            impl = _IMPLS.get(type(op))
+            if impl is None or len(op.results) != 1:
+                raise ValueError(f"Unsupported operation: {op.name}")
+            _check_type(op.results[0].type)
+            name = f"v{len(names)}"
+            expression = impl(op, [names[operand] for operand in op.operands])
+            lines.append(f"    {name} = {expression}")
+            names[op.results[0]] = name
+        self.source = "\n".join(lines) + "\n"
+
+        namespace = dict(_HELPERS)
+        exec(compile(self.source, f"<{func.sym_name.data}>", "exec"), namespace)
+        self.function = namespace[func.sym_name.data]  # pyright: ignore
+
+    @property
+    def num_args(self) -> int:
+        return len(self.argument_types)
+
+    def __call__(self, *arguments: Any) -> tuple[Any, ...]:
+        return self.function(*arguments)
+
+
+_compiled: WeakKeyDictionary[ModuleOp, CompiledFunction] = WeakKeyDictionary()
+"The compiled main function of the modules seen so far"
+
+
+def build_compiled(module: ModuleOp) -> CompiledFunction:
+    """
+    Compile the main function of a module, like build_interpreter.
+
+    Modules are compiled once, later calls with the same module return the
+    same function, so modules should not be modified after being compiled.
+    """
+    if (function := _compiled.get(module)) is not None:
+        return function
+    module.verify()
+    func = SymbolTable.lookup_symbol(module, "main")
+    if not isinstance(func, FuncOp):
+        raise ValueError("Expected a func.func named main")
+    function = CompiledFunction(func)
+    _compiled[module] = function
+    return function
+
+
+def _value_of_attribute(attr: Attribute, ty: Attribute) -> Any:
+    if not isinstance(attr, IntegerAttr):
+        raise ValueError(f"Expected an integer attribute, got {attr}")
+    value = attr.value.data
+    if isinstance(ty, smt.BoolType):
+        return value != 0
+    assert isinstance(ty, bv.BitVectorType)
+    return value & _mask(ty.width.data)
+
+
+def _attribute_of_value(value: Any, ty: Attribute) -> Any:
+    if isinstance(ty, bv.BitVectorType):
+        return bv.BitVectorAttr(value, ty)
+    return value
+
+
+def interpret_compiled(
+    function: CompiledFunction, arguments: Sequence[Attribute]
+) -> tuple[Any, ...]:
+    """
+    Like interpret, the results of the main function on attribute arguments.
+    Booleans are returned as bools, bitvectors as BitVectorAttr.
+    """
+    if len(arguments) != function.num_args:
+        raise ValueError(
+            f"Wrong number of arguments provided (expected {function.num_args}, found {len(arguments)})"
+        )
+    args = (
+        _value_of_attribute(attr, ty)
+        for attr, ty in zip(arguments, function.argument_types)
+    )
+    results = function(*args)
+    return tuple(
+        _attribute_of_value(value, ty)
+        for value, ty in zip(results, function.result_types)
+    )
@@ -0,0 +1,464 @@
+"""
+A batched evaluator of func.func programs of the SMT and bitvector dialects.
+
+Where the xDSL interpreter runs a program on a single input, building an
+attribute for every intermediate value, the evaluator runs it on whole arrays
+of inputs at once with NumPy. Booleans are arrays of np.bool_, and bitvectors
+of up to 64 bits are arrays of np.uint64 holding their unsigned value, with the
+bits above their width cleared.
+
+The semantics are those of SMT-LIB, including division by zero, and shifts by
+at least the width of the bitvector.
+"""
+
+from functools import reduce
+from typing import Any, Callable, Sequence
+
+import numpy as np
+import numpy.typing as npt
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.dialects.smt import AndOp, ImpliesOp, OrOp, XOrOp
+from xdsl.ir import Attribute, Operation, SSAValue
+from xdsl.traits import SymbolTable
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects import smt_dialect as smt
+
+Array = npt.NDArray[Any]
+"Booleans as np.bool_, bitvectors as np.uint64"
+
+_Impl = Callable[[Any, list[Array]], Array]
+
+MAX_WIDTH = 64
+
+
+def _width(value: SSAValue) -> int:
+    assert isinstance(value.type, bv.BitVectorType)
+    return value.type.width.data
+
+
+def _mask(width: int) -> np.uint64:
+    return np.uint64((1 << width) - 1)
+
+
+def _signed(x: Array, width: int) -> Array:
+    "The two's complement values of bitvectors, as np.int64"
+    return (x << np.uint64(64 - width)).view(np.int64) >> np.int64(64 - width)
+
+
+def _unsigned(x: Array, width: int) -> Array:
+    "The bitvectors of the two's complement values of np.int64"
+    return x.view(np.uint64) & _mask(width)
+
+
+def _neg(x: Array, width: int) -> Array:
+    return (np.uint64(0) - x) & _mask(width)
+
+
+def _sign(x: Array, width: int) -> Array:
+    return (x >> np.uint64(width - 1)).astype(np.bool_)
+
+
+def _udiv(lhs: Array, rhs: Array, width: int) -> Array:
+    # Division by zero is all ones
+    return np.where(rhs == 0, _mask(width), lhs // np.maximum(rhs, np.uint64(1)))
+
+
+def _urem(lhs: Array, rhs: Array) -> Array:
+    # The remainder of a division by zero is the dividend
+    return np.where(rhs == 0, lhs, lhs % np.maximum(rhs, np.uint64(1)))
+
+
+def _signed_product(lhs: Array, rhs: Array, width: int) -> Array:
+    "The exact products of the signed values, as Python integers past 31 bits"
+    if width <= 31:
+        return _signed(lhs, width) * _signed(rhs, width)
+    return _signed(lhs, width).astype(object) * _signed(rhs, width).astype(object)
+
+
+def _bool_constant(op: smt.ConstantBoolOp, args: list[Array]) -> Array:
+    return np.asarray(op.value.value.data != 0)
+
+
+def _not(op: smt.NotOp, args: list[Array]) -> Array:
+    return np.logical_not(args[0])
+
+
+def _and(op: AndOp, args: list[Array]) -> Array:
+    return reduce(np.logical_and, args)
+
+
+def _or(op: OrOp, args: list[Array]) -> Array:
+    return reduce(np.logical_or, args)
+
+
+def _xor(op: XOrOp, args: list[Array]) -> Array:
+    return reduce(np.logical_xor, args)
+
+
+def _implies(op: ImpliesOp, args: list[Array]) -> Array:
+    return np.logical_or(np.logical_not(args[0]), args[1])
+
+
+def _eq(op: smt.EqOp, args: list[Array]) -> Array:
+    return np.asarray(args[0] == args[1])
+
+
+def _distinct(op: smt.DistinctOp, args: list[Array]) -> Array:
+    return np.asarray(args[0] != args[1])
+
+
+def _ite(op: smt.IteOp, args: list[Array]) -> Array:
+    return np.where(args[0], args[1], args[2])
+
+
+def _bv_constant(op: bv.ConstantOp, args: list[Array]) -> Array:
+    return np.asarray(np.uint64(op.value.value.data) & _mask(_width(op.res)))
+
+
+def _bv_add(op: bv.AddOp, args: list[Array]) -> Array:
+    return (args[0] + args[1]) & _mask(_width(op.res))
+
+
+def _bv_sub(op: bv.SubOp, args: list[Array]) -> Array:
+    return (args[0] - args[1]) & _mask(_width(op.res))
+
+
+def _bv_mul(op: bv.MulOp, args: list[Array]) -> Array:
+    return (args[0] * args[1]) & _mask(_width(op.res))
+
+
+def _bv_neg(op: bv.NegOp, args: list[Array]) -> Array:
+    return _neg(args[0], _width(op.res))
+
+
+def _bv_not(op: bv.NotOp, args: list[Array]) -> Array:
+    return ~args[0] & _mask(_width(op.res))
+
+
+def _bv_and(op: bv.AndOp, args: list[Array]) -> Array:
+    return args[0] & args[1]
+
+
+def _bv_or(op: bv.OrOp, args: list[Array]) -> Array:
+    return args[0] | args[1]
+
+
+def _bv_xor(op: bv.XorOp, args: list[Array]) -> Array:
+    return args[0] ^ args[1]
+
+
+def _bv_nand(op: bv.NAndOp, args: list[Array]) -> Array:
+    return ~(args[0] & args[1]) & _mask(_width(op.res))
+
+
+def _bv_nor(op: bv.NorOp, args: list[Array]) -> Array:
+    return ~(args[0] | args[1]) & _mask(_width(op.res))
+
+
+def _bv_xnor(op: bv.XNorOp, args: list[Array]) -> Array:
+    return ~(args[0] ^ args[1]) & _mask(_width(op.res))
+
+
+def _bv_shl(op: bv.ShlOp, args: list[Array]) -> Array:
+    width = _width(op.res)
+    shifted = args[0] << np.minimum(args[1], np.uint64(63))
+    return np.where(args[1] < width, shifted & _mask(width), np.uint64(0))
+
+
+def _bv_lshr(op: bv.LShrOp, args: list[Array]) -> Array:
+    width = _width(op.res)
+    shifted = args[0] >> np.minimum(args[1], np.uint64(63))
+    return np.where(args[1] < width, shifted, np.uint64(0))
+
+
+def _bv_ashr(op: bv.AShrOp, args: list[Array]) -> Array:
+    # Shifting by width - 1 or more leaves only copies of the sign bit
+    width = _width(op.res)
+    amount = np.minimum(args[1], np.uint64(width - 1)).astype(np.int64)
+    return _unsigned(_signed(args[0], width) >> amount, width)
+
+
+def _bv_udiv(op: bv.UDivOp, args: list[Array]) -> Array:
+    return _udiv(args[0], args[1], _width(op.res))
+
+
+def _bv_urem(op: bv.URemOp, args: list[Array]) -> Array:
+    return _urem(args[0], args[1])
+
+
+def _signed_operands(
+    args: list[Array], width: int
+) -> tuple[Array, Array, Array, Array]:
+    "The signs and the absolute values of the operands of a signed division"
+    lhs_neg, rhs_neg = _sign(args[0], width), _sign(args[1], width)
+    lhs_abs = np.where(lhs_neg, _neg(args[0], width), args[0])
+    rhs_abs = np.where(rhs_neg, _neg(args[1], width), args[1])
+    return lhs_neg, rhs_neg, lhs_abs, rhs_abs
+
+
+def _bv_sdiv(op: bv.SDivOp, args: list[Array]) -> Array:
+    width = _width(op.res)
+    lhs_neg, rhs_neg, lhs_abs, rhs_abs = _signed_operands(args, width)
+    quotient = _udiv(lhs_abs, rhs_abs, width)
+    return np.where(lhs_neg ^ rhs_neg, _neg(quotient, width), quotient)
+
+
+def _bv_srem(op: bv.SRemOp, args: list[Array]) -> Array:
+    # The remainder has the sign of the dividend
+    width = _width(op.res)
+    lhs_neg, _, lhs_abs, rhs_abs = _signed_operands(args, width)
+    remainder = _urem(lhs_abs, rhs_abs)
+    return np.where(lhs_neg, _neg(remainder, width), remainder)
+
+
+def _bv_smod(op: bv.SModOp, args: list[Array]) -> Array:
+    # The remainder has the sign of the divisor
+    width = _width(op.res)
+    lhs_neg, rhs_neg, lhs_abs, rhs_abs = _signed_operands(args, width)
+    remainder = _urem(lhs_abs, rhs_abs)
+    mask = _mask(width)
+    return np.select(
+        [remainder == 0, ~lhs_neg & ~rhs_neg, lhs_neg & ~rhs_neg, ~lhs_neg & rhs_neg],
+        [
+            remainder,
+            remainder,
+            (_neg(remainder, width) + args[1]) & mask,
+            (remainder + args[1]) & mask,
+        ],
+        _neg(remainder, width),
+    )
+
+
+def _compare(predicate: Callable[[Array, Array], Array], signed: bool) -> _Impl:
+    def compare(op: bv.BinaryPredBVOp, args: list[Array]) -> Array:
+        if not signed:
+            return np.asarray(predicate(args[0], args[1]))
+        width = _width(op.lhs)
+        return np.asarray(predicate(_signed(args[0], width), _signed(args[1], width)))
+
+    return compare
+
+
+def _bv_uaddo(op: bv.UaddOverflowOp, args: list[Array]) -> Array:
+    return np.asarray((args[0] + args[1]) & _mask(_width(op.lhs)) < args[0])
+
+
+def _bv_saddo(op: bv.SaddOverflowOp, args: list[Array]) -> Array:
+    width = _width(op.lhs)
+    lhs_neg, rhs_neg = _sign(args[0], width), _sign(args[1], width)
+    sum_neg = _sign((args[0] + args[1]) & _mask(width), width)
+    return (lhs_neg == rhs_neg) & (sum_neg != lhs_neg)
+
+
+def _umul_overflows(args: list[Array], width: int) -> Array:
+    return (args[1] != 0) & (args[0] > _mask(width) // np.maximum(args[1], 1))
+
+
+def _bv_umulo(op: bv.UmulOverflowOp, args: list[Array]) -> Array:
+    return _umul_overflows(args, _width(op.lhs))
+
+
+def _bv_umul_noovfl(op: bv.UmulNoOverflowOp, args: list[Array]) -> Array:
+    return ~_umul_overflows(args, _width(op.lhs))
+
+
+def _bv_smulo(op: bv.SmulOverflowOp, args: list[Array]) -> Array:
+    width = _width(op.lhs)
+    product = _signed_product(args[0], args[1], width)
+    return ((product >= 1 << (width - 1)) | (product < -(1 << (width - 1)))).astype(
+        np.bool_
+    )
+
+
+def _bv_smul_noovfl(op: bv.SmulNoOverflowOp, args: list[Array]) -> Array:
+    width = _width(op.lhs)
+    product = _signed_product(args[0], args[1], width)
+    return np.asarray(product < 1 << (width - 1)).astype(np.bool_)
+
+
+def _bv_smul_noudfl(op: bv.SmulNoUnderflowOp, args: list[Array]) -> Array:
+    width = _width(op.lhs)
+    product = _signed_product(args[0], args[1], width)
+    return np.asarray(product >= -(1 << (width - 1))).astype(np.bool_)
+
+
+def _bv_nego(op: bv.NegOverflowOp, args: list[Array]) -> Array:
+    width = _width(op.operand)
+    return np.asarray(args[0] == np.uint64(1 << (width - 1)))
+
+
+def _bv_concat(op: bv.ConcatOp, args: list[Array]) -> Array:
+    return (args[0] << np.uint64(_width(op.rhs))) | args[1]
+
+
+def _bv_extract(op: bv.ExtractOp, args: list[Array]) -> Array:
+    start, end = op.start.data, op.end.data
+    return (args[0] >> np.uint64(start)) & _mask(end - start + 1)
+
+
+def _bv_repeat(op: bv.RepeatOp, args: list[Array]) -> Array:
+    width = _width(op.operand)
+    result = args[0]
+    for _ in range(op.count.data - 1):
+        result = (result << np.uint64(width)) | args[0]
+    return result
+
+
+def _bv_zero_extend(op: bv.ZeroExtendOp, args: list[Array]) -> Array:
+    return args[0]
+
+
+def _bv_sign_extend(op: bv.SignExtendOp, args: list[Array]) -> Array:
+    return _unsigned(_signed(args[0], _width(op.operand)), _width(op.res))
+
+
+_IMPLS: dict[type[Operation], _Impl] = {
+    smt.ConstantBoolOp: _bool_constant,
+    smt.NotOp: _not,
+    AndOp: _and,
+    OrOp: _or,
+    XOrOp: _xor,
+    ImpliesOp: _implies,
+    smt.EqOp: _eq,
+    smt.DistinctOp: _distinct,
+    smt.IteOp: _ite,
+    bv.ConstantOp: _bv_constant,
+    bv.AddOp: _bv_add,
+    bv.SubOp: _bv_sub,
+    bv.MulOp: _bv_mul,
+    bv.NegOp: _bv_neg,
+    bv.NotOp: _bv_not,
+    bv.AndOp: _bv_and,
+    bv.OrOp: _bv_or,
+    bv.XorOp: _bv_xor,
+    bv.NAndOp: _bv_nand,
+    bv.NorOp: _bv_nor,
+    bv.XNorOp: _bv_xnor,
+    bv.ShlOp: _bv_shl,
+    bv.LShrOp: _bv_lshr,
+    bv.AShrOp: _bv_ashr,
+    bv.UDivOp: _bv_udiv,
+    bv.URemOp: _bv_urem,
+    bv.SDivOp: _bv_sdiv,
+    bv.SRemOp: _bv_srem,
+    bv.SModOp: _bv_smod,
+    bv.UleOp: _compare(np.less_equal, False),
+    bv.UltOp: _compare(np.less, False),
+    bv.UgeOp: _compare(np.greater_equal, False),
+    bv.UgtOp: _compare(np.greater, False),
+    bv.SleOp: _compare(np.less_equal, True),
+    bv.SltOp: _compare(np.less, True),
+    bv.SgeOp: _compare(np.greater_equal, True),
+    bv.SgtOp: _compare(np.greater, True),
+    bv.UaddOverflowOp: _bv_uaddo,
+    bv.SaddOverflowOp: _bv_saddo,
+    bv.UmulOverflowOp: _bv_umulo,
+    bv.UmulNoOverflowOp: _bv_umul_noovfl,
+    bv.SmulOverflowOp: _bv_smulo,
+    bv.SmulNoOverflowOp: _bv_smul_noovfl,
+    bv.SmulNoUnderflowOp: _bv_smul_noudfl,
+    bv.NegOverflowOp: _bv_nego,
+    bv.ConcatOp: _bv_concat,
+    bv.ExtractOp: _bv_extract,
+    bv.RepeatOp: _bv_repeat,
+    bv.ZeroExtendOp: _bv_zero_extend,
+    bv.SignExtendOp: _bv_sign_extend,
+}
+
+
+def _check_type(ty: Attribute) -> None:
+    if isinstance(ty, smt.BoolType):
+        return
+    if isinstance(ty, bv.BitVectorType) and ty.width.data <= MAX_WIDTH:
+        return
+    raise ValueError(f"Unsupported type: {ty}")
+
+
+class VectorizedFunction:
+    """
+    A func.func compiled to a list of NumPy operations, evaluated on arrays of
+    inputs, one array per argument.
+
+    Raises ValueError on functions with operations or types it does not
+    support, e.g. bitvectors of more than 64 bits.
+    """
+
+    num_args: int
+    steps: list[tuple[_Impl, Operation, list[int]]]
+    "The implementation of each operation, and the slots of its operands"
+    results: list[int]
+    "The slots of the returned values"
+
+    def __init__(self, func: FuncOp):
+        for ty in func.function_type.inputs.data:
+            _check_type(ty)
+        self.num_args = len(func.args)
+
+        slots: dict[SSAValue, int] = {arg: i for i, arg in enumerate(func.args)}
+        self.steps = []
+        self.results = []
+        for op in func.body.ops:
+            if isinstance(op, ReturnOp | smt.ReturnOp):
+                self.results = [slots[operand] for operand in op.operands]
+                break
+            impl = _IMPLS.get(type(op))
+            if impl is None or len(op.results) != 1:
+                raise ValueError(f"Unsupported operation: {op.name}")
+            _check_type(op.results[0].type)
+            self.steps.append((impl, op, [slots[operand] for operand in op.operands]))
+            slots[op.results[0]] = len(slots)
+
+    def __call__(self, arguments: Sequence[npt.ArrayLike]) -> tuple[Array, ...]:
+        values = [np.asarray(argument) for argument in arguments]
+        shape = np.broadcast_shapes(*(value.shape for value in values))
+        for impl, op, operands in self.steps:
+            values.append(impl(op, [values[i] for i in operands]))
+        # Constants are evaluated once, and broadcast to the inputs at the end
+        return tuple(np.broadcast_to(values[i], shape).copy() for i in self.results)
+
+
+def build_vectorized(module: ModuleOp) -> VectorizedFunction:
+    """Compile the main function of a module, like build_interpreter."""
+    module.verify()
+    func = SymbolTable.lookup_symbol(module, "main")
+    if not isinstance(func, FuncOp):
+        raise ValueError("Expected a func.func named main")
+    return VectorizedFunction(func)
+
+
+def interpret_vectorized(
+    function: VectorizedFunction, arguments: Sequence[npt.ArrayLike]
+) -> tuple[Array, ...]:
+    """
+    Like interpret, the results of the main function, on arrays of arguments
+    rather than single attributes. Booleans are arrays of bools, bitvectors
+    arrays of unsigned integers.
+    """
+    if len(arguments) != function.num_args:
+        raise ValueError(
+            f"Wrong number of arguments provided (expected {function.num_args}, found {len(arguments)})"
+        )
+    return function(arguments)
+
+
+def values_of_type(ty: Attribute) -> Array:
+    """Every value of a boolean or bitvector type."""
+    _check_type(ty)
+    if isinstance(ty, smt.BoolType):
+        return np.array([False, True])
+    assert isinstance(ty, bv.BitVectorType)
+    return np.arange(1 << ty.width.data, dtype=np.uint64)
+
+
+def all_inputs(types: Sequence[Attribute]) -> list[Array]:
+    """
+    One array per type, holding together every combination of values of the
+    types, in the order of itertools.product.
+    """
+    values = [values_of_type(ty) for ty in types]
+    if not values:
+        return []
+    grids = np.meshgrid(*values, indexing="ij")
+    return [grid.reshape(-1) for grid in grids]
@@ -236,6 +236,12 @@ class SMTConversionCtx:
         raise Exception(f"Unknown SMT-LIB sort: {attr}")
 
 
+PAIR_DATATYPE_DECL = (
+    "(declare-datatypes ((Pair 2)) ((par (X Y) ((pair (first X) (second Y))))))"
+)
+"""The SMT-LIB declaration of the Pair sort of the smt.utils dialect."""
+
+
 def print_to_smtlib(module: ModuleOp, stream: IO[str]) -> None:
     """
     Print a program to its SMTLib representation.
@@ -243,10 +249,7 @@ def print_to_smtlib(module: ModuleOp, stream: IO[str]) -> None:
     ctx = SMTConversionCtx()
     # We use this hack for now
     # TODO: check for usage of pairs in the program to not always print this.
-    print(
-        "(declare-datatypes ((Pair 2)) ((par (X Y) ((pair (first X) (second Y))))))",
-        file=stream,
-    )
+    print(PAIR_DATATYPE_DECL, file=stream)
     for op in module.ops:
         if isinstance(op, SMTLibScriptOp):
             op.print_expr_to_smtlib(stream, ctx)
@@ -0,0 +1,696 @@
+"""
+Translation of SMT dialect programs to Z3 terms, and a solver checking them
+in-process through the Z3 Python API.
+
+Translating the ops directly avoids printing SMT-LIB and piping it to a `z3`
+subprocess on every query, and lets a single solver be reused with push/pop.
+Ops with a direct Z3 counterpart are translated natively, any other SMT-LIB
+op is translated once through its SMT-LIB printer and then instantiated by
+substitution.
+"""
+
+import operator
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from io import StringIO
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import z3  # pyright: ignore[reportMissingTypeStubs]
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.dialects.smt import BitVectorType, BoolType
+from xdsl.ir import Attribute, BlockArgument, Operation, SSAValue
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects.smt_dialect import (
+    AssertOp,
+    CallOp,
+    CheckSatOp,
+    ConstantBoolOp,
+    DeclareConstOp,
+    DeclareFunOp,
+    DefineFunOp,
+    EvalOp,
+    ExistsOp,
+    ForallOp,
+)
+from xdsl_smt.traits.smt_printer import (
+    PAIR_DATATYPE_DECL,
+    SimpleSMTLibOp,
+    SimpleSMTLibOpTrait,
+    SMTConversionCtx,
+    SMTLibOp,
+    SMTLibOpTrait,
+    SMTLibScriptOp,
+    print_to_smtlib,
+)
+from xdsl_smt.utils.solver_cache import ModelValue, SolverCache
+
+_z3: Any = z3
+"""
+The z3 module, through which its functions are called: they are only partially
+annotated, so their results are annotated where they are used instead.
+"""
+
+
+def _untyped(obj: object) -> Any:
+    "A Z3 object, to call its partially annotated methods, see _z3"
+    return obj
+
+
+_BUILDERS: dict[str, Callable[..., Any]] = {
+    # Core
+    "not": _z3.Not,
+    "=>": _z3.Implies,
+    "and": _z3.And,
+    "or": _z3.Or,
+    "xor": _z3.Xor,
+    "=": operator.eq,
+    "distinct": _z3.Distinct,
+    "ite": _z3.If,
+    # Bitvector arithmetic
+    "bvadd": operator.add,
+    "bvsub": operator.sub,
+    "bvneg": operator.neg,
+    "bvmul": operator.mul,
+    "bvudiv": _z3.UDiv,
+    "bvsdiv": operator.truediv,
+    "bvurem": _z3.URem,
+    "bvsrem": _z3.SRem,
+    "bvsmod": operator.mod,
+    "bvshl": operator.lshift,
+    "bvlshr": _z3.LShR,
+    "bvashr": operator.rshift,
+    # Bitvector bitwise
+    "bvand": operator.and_,
+    "bvor": operator.or_,
+    "bvxor": operator.xor,
+    "bvnot": operator.invert,
+    "concat": _z3.Concat,
+    # Bitvector predicates
+    "bvule": _z3.ULE,
+    "bvult": _z3.ULT,
+    "bvuge": _z3.UGE,
+    "bvugt": _z3.UGT,
+    "bvsle": operator.le,
+    "bvslt": operator.lt,
+    "bvsge": operator.ge,
+    "bvsgt": operator.gt,
+}
+"""Z3 builders of the SMT-LIB functions printed by SimpleSMTLibOp(Trait) ops."""
+
+
+def _smtlib_name(op: Operation) -> str | None:
+    """The SMT-LIB function name of an op printed as `(name <args>...)`."""
+    if isinstance(op, SimpleSMTLibOp):
+        return op.op_name()
+    if (trait := op.get_trait(SimpleSMTLibOpTrait)) is not None:
+        return trait.op_name
+    return None
+
+
+def _parse_term(decls_text: str, text: str, decls: dict[str, z3.ExprRef]) -> z3.ExprRef:
+    """Parse an SMT-LIB term, with the Pair datatype declared."""
+    (assertion,) = _z3.parse_smt2_string(
+        f"{PAIR_DATATYPE_DECL}{decls_text}(assert (= {text} {text}))", decls=decls
+    )
+    assert isinstance(assertion, z3.BoolRef)
+    return _untyped(assertion).arg(0)
+
+
+class DialectToZ3:
+    """
+    Translates the values of an SMT dialect program to Z3 terms.
+
+    Declared constants and functions are given fresh Z3 names, so that the
+    terms of several programs can live in the same solver. Defined functions
+    are inlined at their calls, as define-fun is a macro in SMT-LIB.
+    """
+
+    values: dict[SSAValue, z3.ExprRef]
+    functions: dict[SSAValue, Callable[[Sequence[z3.ExprRef]], z3.ExprRef]]
+
+    _sorts: dict[str, z3.SortRef]
+    _templates: dict[tuple[str, tuple[z3.SortRef, ...]], z3.ExprRef]
+    _num_names: int
+
+    def __init__(self):
+        self.values = {}
+        self.functions = {}
+        self._sorts = {}
+        self._templates = {}
+        self._num_names = 0
+
+    def reset(self):
+        """Forget the values of the last program, keeping the caches."""
+        self.values.clear()
+        self.functions.clear()
+
+    def fresh_name(self, hint: str | None) -> str:
+        self._num_names += 1
+        return f"{hint or 'tmp'}!{self._num_names}"
+
+    def sort(self, attr: Attribute) -> z3.SortRef:
+        if isinstance(attr, BoolType):
+            return _z3.BoolSort()
+        if isinstance(attr, BitVectorType):
+            return _z3.BitVecSort(attr.width.data)
+
+        stream = StringIO()
+        SMTConversionCtx.print_sort_to_smtlib(attr, stream)
+        text = stream.getvalue()
+        if text not in self._sorts:
+            self._sorts[text] = _parse_term(
+                f"(declare-const $s {text})", "$s", {}
+            ).sort()
+        return self._sorts[text]
+
+    def const(self, value: SSAValue) -> z3.ExprRef:
+        """A fresh constant standing for a value, e.g. a bound variable."""
+        const = _z3.Const(self.fresh_name(value.name_hint), self.sort(value.type))
+        self.values[value] = const
+        return const
+
+    def expr(self, value: SSAValue) -> z3.ExprRef:
+        """The Z3 term of a value."""
+        # Walk the operands with an explicit stack, as programs are often deep
+        # chains of ops
+        stack = [value]
+        while stack:
+            val = stack[-1]
+            if val in self.values:
+                stack.pop()
+                continue
+            if isinstance(val, BlockArgument):
+                raise ValueError(f"Value {val} is not bound in the current program")
+
+            op = val.owner
+            assert isinstance(op, Operation)
+            if isinstance(op, ForallOp | ExistsOp):
+                bound = [
+                    self.values[arg] if arg in self.values else self.const(arg)
+                    for arg in op.body.block.args
+                ]
+                if op.return_val not in self.values:
+                    stack.append(op.return_val)
+                    continue
+                body = self.values[op.return_val]
+                quantifier = _z3.ForAll if isinstance(op, ForallOp) else _z3.Exists
+                self.values[val] = quantifier(bound, body) if bound else body
+            else:
+                operands = op.args if isinstance(op, CallOp) else op.operands
+                missing = [
+                    operand for operand in operands if operand not in self.values
+                ]
+                if missing:
+                    stack.extend(reversed(missing))
+                    continue
+                self.values[val] = self._translate_op(op)
+            stack.pop()
+
+        return self.values[value]
+
+    def _translate_op(self, op: Operation) -> z3.ExprRef:
+        if len(op.results) != 1:
+            raise ValueError(f"Expected a single result for {op.name}")
+
+        if isinstance(op, CallOp):
+            if op.func not in self.functions:
+                raise ValueError(f"Call to an unknown function in {op.name}")
+            return self.functions[op.func]([self.values[arg] for arg in op.args])
+        if isinstance(op, ConstantBoolOp):
+            return _z3.BoolVal(bool(op.value.value.data))
+        if isinstance(op, bv.ConstantOp):
+            return _z3.BitVecVal(op.value.value.data, op.value.type.width.data)
+
+        operands = [self.values[operand] for operand in op.operands]
+        if isinstance(op, bv.ExtractOp):
+            return _z3.Extract(op.end.data, op.start.data, operands[0])
+        if isinstance(op, bv.ZeroExtendOp | bv.SignExtendOp):
+            res_type = op.res.type
+            operand_type = op.operand.type
+            assert isinstance(res_type, BitVectorType)
+            assert isinstance(operand_type, BitVectorType)
+            extend = _z3.ZeroExt if isinstance(op, bv.ZeroExtendOp) else _z3.SignExt
+            return extend(res_type.width.data - operand_type.width.data, operands[0])
+        if isinstance(op, bv.RepeatOp):
+            return _z3.RepeatBitVec(op.count.data, operands[0])
+
+        name = _smtlib_name(op)
+        if name in _BUILDERS:
+            return _BUILDERS[name](*operands)
+        return self._from_smtlib(op, operands)
+
+    def _from_smtlib(self, op: Operation, operands: list[z3.ExprRef]) -> z3.ExprRef:
+        """
+        Translate an op through its SMT-LIB printer. The op is printed and
+        parsed once with placeholders as operands, which later ops with the same
+        printed form substitute.
+        """
+        if not isinstance(op, SMTLibOp) and op.get_trait(SMTLibOpTrait) is None:
+            raise ValueError(f"Cannot translate {op.name} to Z3")
+
+        ctx = SMTConversionCtx()
+        for idx, operand in enumerate(op.operands):
+            ctx.value_to_name[operand] = f"$arg{idx}"
+        stream = StringIO()
+        if isinstance(op, SMTLibOp):
+            op.print_expr_to_smtlib(stream, ctx)
+        else:
+            trait = op.get_trait(SMTLibOpTrait)
+            assert trait is not None
+            trait.print_expr_to_smtlib(op, stream, ctx)
+        text = stream.getvalue()
+
+        placeholders = [
+            _z3.Const(f"$arg{idx}", operand.sort())
+            for idx, operand in enumerate(operands)
+        ]
+        key = (text, tuple(operand.sort() for operand in operands))
+        if key not in self._templates:
+            decls = {str(p): p for p in placeholders}
+            self._templates[key] = _parse_term("", text, decls)
+
+        return _z3.substitute(self._templates[key], *zip(placeholders, operands))
+
+    def declare(self, op: DeclareConstOp | DeclareFunOp | DefineFunOp):
+        """Bind the result of a declaration or definition."""
+        if isinstance(op, DeclareConstOp):
+            self.const(op.res)
+            return
+
+        name = op.fun_name.data if op.fun_name is not None else op.ret.name_hint
+        if isinstance(op, DeclareFunOp):
+            (ret_type,) = op.func_type.outputs.data
+            func = _z3.Function(
+                self.fresh_name(name),
+                *[self.sort(typ) for typ in op.func_type.inputs],
+                self.sort(ret_type),
+            )
+            self.functions[op.ret] = lambda args: func(*args)
+            return
+
+        if len(op.return_values) != 1:
+            raise ValueError(
+                "Functions with multiple return values cannot be translated to Z3"
+            )
+        params = [self.const(arg) for arg in op.body.block.args]
+        body = self.expr(op.return_values[0])
+        self.functions[op.ret] = lambda args: _z3.substitute(body, *zip(params, args))
+
+
+_RESULTS = {str(result): result for result in [z3.sat, z3.unsat, z3.unknown]}
+
+
+@dataclass(frozen=True)
+class PortfolioEntry:
+    """A configuration of Z3 raced against the others of a portfolio."""
+
+    name: str
+    tactic: str | None = None
+    "The tactic to build the solver from, e.g. qfbv to bit-blast, or the default solver"
+    seed: int = 0
+
+
+BITBLAST_TACTIC = "qfbv"
+"Simplifies a bitvector query, bit-blasts it and hands it to a SAT solver"
+
+DEFAULT_PORTFOLIO = (
+    PortfolioEntry("default"),
+    PortfolioEntry("bit-blast", tactic=BITBLAST_TACTIC),
+    PortfolioEntry("seed-1", seed=1),
+)
+
+
+@dataclass(frozen=True)
+class SolverSettings:
+    """
+    The budget of every query: a check running out of time or memory is
+    unknown, which callers handle explicitly rather than as sat or unsat.
+
+    With a portfolio, each check races the configurations of the portfolio on
+    threads of their own, each in its own Z3 context, and takes the first sat
+    or unsat answer, interrupting the others.
+
+    Queries of bitwidths up to exhaustive_max_width are small enough to be
+    checked on every input instead, see check_unsat_under_exhaustive, and
+    those up to bitblast_max_width are bit-blasted straight to SAT rather than
+    given to the incremental SMT solver, see get_solver.
+    """
+
+    timeout_ms: int | None = None
+    memory_mb: int | None = None
+    portfolio: tuple[PortfolioEntry, ...] = ()
+    tactic: str | None = None
+    "The tactic to build the solver from, or the default solver"
+    bitblast_max_width: int = 0
+    exhaustive_max_width: int = 2
+
+
+def _model_eval(
+    solver: z3.Solver, term: z3.ExprRef, ctx: z3.Context | None = None
+) -> z3.ExprRef:
+    """
+    The value of a term in the model of the last check of a solver, translated
+    to the context of the solver first if given.
+    """
+    translated = term if ctx is None else _untyped(term).translate(ctx)
+    return _untyped(solver.model()).eval(translated, model_completion=True)
+
+
+def _model_value(term: Any) -> ModelValue:
+    if isinstance(term, z3.BitVecNumRef):
+        return term.as_long()
+    if _z3.is_true(term):
+        return True
+    if _z3.is_false(term):
+        return False
+    if _z3.is_app(term) and term.num_args() > 0:
+        return tuple(_model_value(arg) for arg in term.children())
+    raise ValueError(f"Unsupported model value {term}")
+
+
+class Z3Solver:
+    """
+    An incremental Z3 solver checking SMT dialect scripts.
+
+    Scripts are translated with DialectToZ3 and asserted in the current scope.
+    check_script checks a script in its own scope, so that the solver and the
+    translation caches can be reused by every query of a process.
+
+    With a cache, the results of check_script and check_assumptions are looked
+    up by the SMT-LIB script of the query, the Z3 version, the settings and the
+    options set with set_option, and only solved on a miss.
+    """
+
+    solver: z3.Solver
+    translator: DialectToZ3
+    cache: SolverCache | None
+    settings: SolverSettings
+    options: dict[str, object]
+
+    def __init__(
+        self, cache: SolverCache | None = None, settings: SolverSettings | None = None
+    ):
+        self.settings = SolverSettings() if settings is None else settings
+        solver: Any = (
+            _z3.Solver()
+            if self.settings.tactic is None
+            else _z3.Tactic(self.settings.tactic).solver()
+        )
+        if self.settings.timeout_ms is not None:
+            solver.set("timeout", self.settings.timeout_ms)
+        self.solver = solver
+        self.translator = DialectToZ3()
+        self.cache = cache
+        self.options = {}
+        if self.settings.memory_mb is not None:
+            # Z3 only has a global memory limit, shared by all its contexts
+            _z3.set_param("memory_max_size", self.settings.memory_mb)
+
+    def set_option(self, name: str, value: object):
+        """Set an option of the solver, part of the cache key of every query."""
+        _untyped(self.solver).set(name, value)
+        self.options[name] = value
+
+    def _cache_key(
+        self, module: ModuleOp, assumptions: Sequence[SSAValue] | None = None
+    ) -> str:
+        stream = StringIO()
+        print_to_smtlib(module, stream)
+        parts: list[object] = [
+            _z3.get_full_version(),
+            self.settings,
+            sorted(self.options.items()),
+        ]
+        if assumptions is not None:
+            # Assumptions are identified by the position of their declaration
+            positions: dict[object, int] = {op: i for i, op in enumerate(module.ops)}
+            parts.append([positions.get(a.owner, -1) for a in assumptions])
+        return SolverCache.key(stream.getvalue(), *parts)
+
+    def _check(
+        self, *assumptions: z3.ExprRef
+    ) -> tuple[z3.CheckSatResult, Callable[[z3.ExprRef], z3.ExprRef]]:
+        """
+        Check the assertions under the assumptions, returning the result and a
+        function evaluating terms in the model, only valid if the result is sat.
+        """
+        if self.settings.portfolio:
+            return self._race(assumptions)
+        try:
+            result: z3.CheckSatResult = _untyped(self.solver).check(*assumptions)
+        except z3.Z3Exception:
+            # e.g. out of memory
+            result = z3.unknown
+        return result, lambda term: _model_eval(self.solver, term)
+
+    def _race(
+        self, assumptions: Sequence[z3.ExprRef]
+    ) -> tuple[z3.CheckSatResult, Callable[[z3.ExprRef], z3.ExprRef]]:
+        entries = self.settings.portfolio
+        contexts = [_z3.Context() for _ in entries]
+        # The terms are translated up front, as a context is not thread safe
+        asserted: Any = self.solver.assertions()
+        assertions: list[Any] = list(asserted)
+        solvers: list[z3.Solver] = []
+        literals: list[list[Any]] = []
+        for entry, ctx in zip(entries, contexts):
+            solver = (
+                _z3.Solver(ctx=ctx)
+                if entry.tactic is None
+                else _z3.Tactic(entry.tactic, ctx).solver()
+            )
+            solver.set("random_seed", entry.seed)
+            if self.settings.timeout_ms is not None:
+                solver.set("timeout", self.settings.timeout_ms)
+            solver.add(*[assertion.translate(ctx) for assertion in assertions])
+            solvers.append(solver)
+            literals.append(
+                [_untyped(literal).translate(ctx) for literal in assumptions]
+            )
+
+        def check(i: int) -> z3.CheckSatResult:
+            try:
+                return _untyped(solvers[i]).check(*literals[i])
+            except z3.Z3Exception:
+                # e.g. a tactic not supporting the query
+                return z3.unknown
+
+        result = z3.unknown
+        winner: int | None = None
+        with ThreadPoolExecutor(len(entries)) as pool:
+            futures = {pool.submit(check, i): i for i in range(len(entries))}
+            pending = set(futures)
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result() != z3.unknown and winner is None:
+                        result, winner = future.result(), futures[future]
+            for i, ctx in enumerate(contexts):
+                if i != winner:
+                    ctx.interrupt()
+
+        if winner is None:
+            return z3.unknown, lambda term: term
+        solver, ctx = solvers[winner], contexts[winner]
+        return result, lambda term: _model_eval(solver, term, ctx)
+
+    def push(self):
+        self.solver.push()
+
+    def pop(self):
+        self.solver.pop()
+
+    def _run_script(
+        self, module: ModuleOp, evals: list[z3.ExprRef] | None = None
+    ) -> list[z3.CheckSatResult]:
+        results: list[z3.CheckSatResult] = []
+        for op in module.ops:
+            if isinstance(op, DeclareConstOp | DeclareFunOp | DefineFunOp):
+                self.translator.declare(op)
+            elif isinstance(op, AssertOp):
+                _untyped(self.solver).add(self.translator.expr(op.op))
+            elif isinstance(op, CheckSatOp):
+                results.append(self._check()[0])
+            elif isinstance(op, EvalOp):
+                # Only prints a value of the model, nothing to check
+                if evals is not None:
+                    evals.append(self.translator.expr(op.expr))
+            elif isinstance(op, SMTLibScriptOp):
+                raise ValueError(f"Unsupported script operation {op.name}")
+        return results
+
+    def add_script(self, module: ModuleOp) -> list[z3.CheckSatResult]:
+        """
+        Run the script ops of a module in the current scope, returning the result
+        of each check-sat.
+        """
+        try:
+            return self._run_script(module)
+        finally:
+            self.translator.reset()
+
+    def check_script(self, module: ModuleOp) -> list[z3.CheckSatResult]:
+        """Run a script in a scope of its own."""
+        if self.cache is None:
+            return self._check_script(module)
+
+        key = self._cache_key(module)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return [_RESULTS[result] for result in cached[0]]
+        results = self._check_script(module)
+        self.cache.put(key, [str(result) for result in results], [[] for _ in results])
+        return results
+
+    def _check_script(self, module: ModuleOp) -> list[z3.CheckSatResult]:
+        self.push()
+        try:
+            return self.add_script(module)
+        finally:
+            self.pop()
+
+    def check_assumptions(
+        self, module: ModuleOp, assumptions: Sequence[SSAValue]
+    ) -> list[tuple[z3.CheckSatResult, list[ModelValue]]]:
+        """
+        Run a script in a scope of its own, and check it under each of the
+        assumptions in turn, boolean constants declared by the script. An
+        assumption the script no longer declares, e.g. after dead code
+        elimination, constrains nothing.
+
+        Each result comes with the model values of the eval ops of the script,
+        which are only set when the script is sat under the assumption.
+        """
+        if self.cache is None:
+            return self._check_assumptions(module, assumptions)
+
+        key = self._cache_key(module, assumptions)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return [(_RESULTS[result], values) for result, values in zip(*cached)]
+        results = self._check_assumptions(module, assumptions)
+        self.cache.put(
+            key,
+            [str(result) for result, _ in results],
+            [values for _, values in results],
+        )
+        return results
+
+    def _check_assumptions(
+        self, module: ModuleOp, assumptions: Sequence[SSAValue]
+    ) -> list[tuple[z3.CheckSatResult, list[ModelValue]]]:
+        self.push()
+        try:
+            evals: list[z3.ExprRef] = []
+            self._run_script(module, evals)
+            literals = [
+                (
+                    self.translator.values[assumption]
+                    if assumption in self.translator.values
+                    else self.translator.const(assumption)
+                )
+                for assumption in assumptions
+            ]
+            results: list[tuple[z3.CheckSatResult, list[ModelValue]]] = []
+            for literal in literals:
+                result, model_eval = self._check(literal)
+                values: list[ModelValue] = []
+                if result == z3.sat:
+                    values = [_model_value(model_eval(term)) for term in evals]
+                results.append((result, values))
+            return results
+        finally:
+            self.translator.reset()
+            self.pop()
+
+    def is_unsat(self, module: ModuleOp) -> bool:
+        """Whether a check-sat of the script is unsat, as when it verifies."""
+        return self.check_unsat(module) is True
+
+    def check_unsat(self, module: ModuleOp) -> bool | None:
+        """
+        Whether a check-sat of the script is unsat, or None if the others are
+        not all sat, e.g. on a timeout.
+        """
+        results = self.check_script(module)
+        if z3.unsat in results:
+            return True
+        if z3.unknown in results:
+            return None
+        return False
+
+    def is_unsat_under(
+        self, module: ModuleOp, assumptions: Sequence[SSAValue]
+    ) -> list[bool]:
+        """Whether the script is unsat under each assumption, see check_assumptions."""
+        return [
+            unsat is True for unsat, _ in self.check_unsat_under(module, assumptions)
+        ]
+
+    def check_unsat_under(
+        self, module: ModuleOp, assumptions: Sequence[SSAValue]
+    ) -> list[tuple[bool | None, list[ModelValue]]]:
+        """
+        Whether the script is unsat under each assumption, or None if unknown,
+        with the model values of its eval ops, see check_assumptions.
+        """
+        return [
+            (None if result == z3.unknown else result == z3.unsat, values)
+            for result, values in self.check_assumptions(module, assumptions)
+        ]
+
+
+_solver: Z3Solver | None = None
+_bitblast_solver: Z3Solver | None = None
+_solver_cache: SolverCache | None = None
+_solver_cache_configured = False
+_solver_settings = SolverSettings()
+
+
+def configure_solver(settings: SolverSettings) -> None:
+    """Set the budget of the queries of the solver of this process."""
+    global _solver, _bitblast_solver, _solver_settings
+    _solver_settings = settings
+    if _solver is not None:
+        _solver = Z3Solver(_solver.cache, settings)
+    _bitblast_solver = None
+
+
+def get_solver_settings() -> SolverSettings:
+    return _solver_settings
+
+
+def configure_solver_cache(enabled: bool, root: Path | None = None) -> None:
+    """
+    Whether the solver of this process caches its results on disk, under root
+    or solver_cache_root(). Setting XDSL_SMT_SOLVER_CACHE=1 enables the cache
+    of every process, including worker processes.
+    """
+    global _solver_cache, _solver_cache_configured
+    _solver_cache = SolverCache(root) if enabled else None
+    _solver_cache_configured = True
+    for solver in [_solver, _bitblast_solver]:
+        if solver is not None:
+            solver.cache = _solver_cache
+
+
+def get_solver(width: int | None = None) -> Z3Solver:
+    """
+    The solver of this process, created on first use. Queries of a bitwidth up
+    to the bitblast_max_width of the settings get a solver bit-blasting them,
+    which must only be given quantifier-free bitvector queries.
+    """
+    global _solver, _bitblast_solver
+    if not _solver_cache_configured:
+        configure_solver_cache(os.environ.get("XDSL_SMT_SOLVER_CACHE") == "1")
+    if width is not None and width <= _solver_settings.bitblast_max_width:
+        if _bitblast_solver is None:
+            settings = replace(_solver_settings, portfolio=(), tactic=BITBLAST_TACTIC)
+            _bitblast_solver = Z3Solver(_solver_cache, settings)
+        return _bitblast_solver
+    if _solver is None:
+        _solver = Z3Solver(_solver_cache, _solver_settings)
+    return _solver
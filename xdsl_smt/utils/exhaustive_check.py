@@ -0,0 +1,183 @@
+"""
+Exhaustive checking of small SMT dialect scripts, as a replacement for a solver.
+
+A script of declared constants and assertions over booleans and bitvectors of
+a few bits is checked by evaluating its assertions on every assignment of its
+constants with the vectorized evaluator, which at small bitwidths is faster
+than starting a solver session. Scripts with too many input bits, or with
+operations the evaluator does not support, are left to the solver.
+"""
+
+from typing import Sequence
+
+import numpy as np
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.dialects.func import FuncOp, ReturnOp
+from xdsl.ir import Block, Operation, Region, SSAValue
+
+from xdsl_smt.dialects import smt_bitvector_dialect as bv
+from xdsl_smt.dialects.smt_dialect import (
+    AssertOp,
+    BoolType,
+    DeclareConstOp,
+    EvalOp,
+)
+from xdsl_smt.dialects.smt_utils_dialect import PairOp
+from xdsl_smt.interpreters.vectorized import Array, VectorizedFunction
+from xdsl_smt.utils.solver_cache import ModelValue
+
+MAX_INPUT_BITS = 24
+"The largest number of bits of the constants of a script checked exhaustively"
+
+CHUNK_BITS = 16
+"The inputs are evaluated by chunks of 2**CHUNK_BITS, bounding the memory used"
+
+
+def _num_bits(const: DeclareConstOp) -> int:
+    ty = const.res.type
+    if isinstance(ty, BoolType):
+        return 1
+    if isinstance(ty, bv.BitVectorType):
+        return ty.width.data
+    raise ValueError(f"Unsupported type: {ty}")
+
+
+class ExhaustiveScript:
+    """
+    The assertions of a script as a single vectorized function of the constants
+    they depend on, and of boolean parameters, e.g. the assumptions of a check,
+    which are set rather than enumerated. Constants no assertion depends on,
+    e.g. the poison flags of unused arguments, are not enumerated and are 0 in
+    the models.
+
+    Raises ValueError on scripts it cannot check.
+    """
+
+    consts: list[DeclareConstOp]
+    "The enumerated constants of the assertions, the first arguments of the function"
+    bits: list[int]
+    params: list[SSAValue]
+    "The parameters, the last arguments of the function"
+    function: VectorizedFunction
+    "The operand of every assertion, given the constants and parameters"
+    evals: list[SSAValue]
+    "The values of the eval ops of the script"
+
+    def __init__(self, module: ModuleOp, params: Sequence[SSAValue] = ()):
+        asserts = [op for op in module.ops if isinstance(op, AssertOp)]
+        self.evals = [op.expr for op in module.ops if isinstance(op, EvalOp)]
+
+        needed: set[Operation] = set()
+        worklist = [op.op for op in asserts]
+        while worklist:
+            value = worklist.pop()
+            if not isinstance(value.owner, Operation) or value.owner in needed:
+                continue
+            needed.add(value.owner)
+            worklist.extend(value.owner.operands)
+
+        self.params = list(params)
+        self.consts = [
+            op
+            for op in module.ops
+            if isinstance(op, DeclareConstOp)
+            and op in needed
+            and op.res not in self.params
+        ]
+        self.bits = [_num_bits(const) for const in self.consts]
+        if sum(self.bits) > MAX_INPUT_BITS:
+            raise ValueError(f"Too many input bits: {sum(self.bits)}")
+
+        arg_types = [const.res.type for const in self.consts]
+        arg_types += [BoolType()] * len(self.params)
+        block = Block(arg_types=arg_types)
+        mapping: dict[SSAValue, SSAValue] = dict(
+            zip([const.res for const in self.consts] + self.params, block.args)
+        )
+        for op in module.ops:
+            if op in needed and not isinstance(op, DeclareConstOp):
+                block.add_op(op.clone(value_mapper=mapping))
+        block.add_op(ReturnOp(*(mapping[op.op] for op in asserts)))
+        func = FuncOp("main", (arg_types, [BoolType()] * len(asserts)), Region(block))
+        self.function = VectorizedFunction(func)
+
+    def inputs(self, begin: int, end: int) -> list[Array]:
+        """
+        The values of the constants on inputs begin to end, where the bits of
+        input i hold the constants, the last one in the lowest bits.
+        """
+        index = np.arange(begin, end, dtype=np.uint64)
+        values: list[Array] = []
+        shift = sum(self.bits)
+        for const, bits in zip(self.consts, self.bits):
+            shift -= bits
+            value = (index >> np.uint64(shift)) & np.uint64((1 << bits) - 1)
+            if isinstance(const.res.type, BoolType):
+                value = value.astype(np.bool_)
+            values.append(value)
+        return values
+
+    def model(self, inputs: list[Array], i: int) -> list[ModelValue]:
+        "The values of the eval ops on input i of inputs, like in a Z3 model"
+        consts: dict[SSAValue, ModelValue] = {
+            const.res: value[i].item() for const, value in zip(self.consts, inputs)
+        }
+
+        def value_of(value: SSAValue) -> ModelValue:
+            if value in consts:
+                return consts[value]
+            if isinstance(value.owner, PairOp):
+                return (value_of(value.owner.first), value_of(value.owner.second))
+            if isinstance(value.owner, DeclareConstOp):
+                return False if isinstance(value.type, BoolType) else 0
+            raise ValueError(f"Unsupported eval of {value}")
+
+        return [value_of(value) for value in self.evals]
+
+    def find_models(
+        self, params: Sequence[Sequence[bool]]
+    ) -> list[list[ModelValue] | None]:
+        """
+        For each assignment of the parameters, the values of the eval ops on the
+        first input satisfying every assertion, or None if there is none.
+
+        The assignments are evaluated together along a leading axis, so the
+        operations not depending on the parameters are evaluated only once.
+        """
+        models: list[list[ModelValue] | None] = [None] * len(params)
+        columns = [np.array(column, np.bool_)[:, None] for column in zip(*params)]
+        num_inputs = 1 << sum(self.bits)
+        for begin in range(0, num_inputs, 1 << CHUNK_BITS):
+            end = min(num_inputs, begin + (1 << CHUNK_BITS))
+            inputs = self.inputs(begin, end)
+            sat = np.ones((len(params), end - begin), np.bool_)
+            for holds in self.function(inputs + columns):
+                sat &= holds
+            for i, row in enumerate(sat):
+                found = np.flatnonzero(row)
+                if models[i] is None and len(found):
+                    models[i] = self.model(inputs, int(found[0]))
+            if all(model is not None for model in models):
+                break
+        return models
+
+
+def check_unsat_under_exhaustive(
+    module: ModuleOp, assumptions: Sequence[SSAValue]
+) -> list[tuple[bool | None, list[ModelValue]]] | None:
+    """
+    Like Z3Solver.check_unsat_under, whether the script is unsat under each
+    assumption, with the values of its eval ops otherwise, or None if the
+    script cannot be checked exhaustively.
+    """
+    try:
+        script = ExhaustiveScript(module, assumptions)
+        models = script.find_models(
+            [
+                [param is assumption for param in assumptions]
+                for assumption in assumptions
+            ]
+        )
+    except ValueError:
+        return None
+    return [(True, []) if model is None else (False, model) for model in models]
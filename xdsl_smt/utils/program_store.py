@@ -0,0 +1,118 @@
+"""
+An append-only on-disk store of the programs classified by an enumerator.
+
+The enumeration of equivalent programs proceeds by program size, and each size
+step classifies its programs as canonical or illegal. Rather than keeping the
+programs of all steps in memory until the end, each step appends its programs
+to the store, and checkpoints it. A run that is interrupted can then be resumed
+from the last completed step.
+
+A store is a directory holding:
+
+    canonicals.jsonl          one JSON string per canonical program
+    illegals.jsonl            one JSON string per illegal program
+    exclude-subpatterns.mlir  the patterns of the illegal programs
+    checkpoint.json           {"version": 1, "size": 3, "offsets": {...}}
+
+Programs are stored as their MLIR text in generic format. The checkpoint holds
+the last completed size, and the length of each file at that point, so that
+data appended by an incomplete step is dropped on resume.
+"""
+
+import json
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, Iterator
+
+STORE_VERSION = 1
+
+CANONICALS = "canonicals.jsonl"
+ILLEGALS = "illegals.jsonl"
+EXCLUDE_SUBPATTERNS = "exclude-subpatterns.mlir"
+CHECKPOINT = "checkpoint.json"
+
+
+class ProgramStore:
+    """
+    Programs stored under a root dir. Opening a store without resuming clears
+    it, resuming it drops everything appended after its checkpoint. Resuming a
+    store whose files are shorter than its checkpoint raises a ValueError.
+    """
+
+    root: Path
+    size: int
+    "The last completed size, -1 if no step completed"
+    files: dict[str, BinaryIO]
+
+    def __init__(self, root: Path, resume: bool = False):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.size = -1
+        offsets = {name: 0 for name in (CANONICALS, ILLEGALS, EXCLUDE_SUBPATTERNS)}
+        if resume and (root / CHECKPOINT).exists():
+            checkpoint = json.loads((root / CHECKPOINT).read_text())
+            if checkpoint["version"] != STORE_VERSION:
+                raise ValueError(f"Unsupported store version in {root}")
+            self.size = checkpoint["size"]
+            offsets = checkpoint["offsets"]
+            for name, offset in offsets.items():
+                path = root / name
+                if offset > (path.stat().st_size if path.exists() else 0):
+                    raise ValueError(f"{path} is shorter than its checkpoint")
+        else:
+            # A checkpoint left by a previous run does not match the new files
+            (root / CHECKPOINT).unlink(missing_ok=True)
+        self.files = {}
+        for name, offset in offsets.items():
+            file = open(root / name, "ab")
+            file.truncate(offset)
+            # truncate keeps the position, which checkpoint reads as the length
+            file.seek(offset)
+            self.files[name] = file
+
+    @property
+    def exclude_subpatterns(self) -> Path:
+        "The patterns of all illegal programs, separated by // -----"
+        return self.root / EXCLUDE_SUBPATTERNS
+
+    def _append(self, name: str, text: str) -> None:
+        self.files[name].write(text.encode())
+
+    def add_canonical(self, program: str) -> None:
+        self._append(CANONICALS, json.dumps(program) + "\n")
+
+    def add_illegal(self, program: str, pattern: str) -> None:
+        self._append(ILLEGALS, json.dumps(program) + "\n")
+        self._append(EXCLUDE_SUBPATTERNS, pattern + "\n// -----\n")
+
+    def checkpoint(self, size: int) -> None:
+        "Mark all programs up to size as stored"
+        offsets: dict[str, int] = {}
+        for name, file in self.files.items():
+            file.flush()
+            os.fsync(file.fileno())
+            offsets[name] = file.tell()
+        # The checkpoint is replaced atomically, as in the solver cache
+        with NamedTemporaryFile(
+            "w", dir=self.root, prefix="tmp-", suffix=".json", delete=False
+        ) as f:
+            json.dump({"version": STORE_VERSION, "size": size, "offsets": offsets}, f)
+        os.replace(f.name, self.root / CHECKPOINT)
+        self.size = size
+
+    def _programs(self, name: str) -> Iterator[str]:
+        self.files[name].flush()
+        with open(self.root / name) as f:
+            for line in f:
+                yield json.loads(line)
+
+    def canonicals(self) -> Iterator[str]:
+        return self._programs(CANONICALS)
+
+    def illegals(self) -> Iterator[str]:
+        return self._programs(ILLEGALS)
+
+    def close(self) -> None:
+        for file in self.files.values():
+            file.close()
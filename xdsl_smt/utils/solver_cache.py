@@ -0,0 +1,100 @@
+"""
+A persistent on-disk cache of solver results.
+
+Queries are keyed by a hash of their SMT-LIB script, together with the solver
+version and options, so that a query asked again, by the same or by another
+run, is answered without calling the solver. Passes such as canonicalization
+make many queries byte-identical, e.g. across the bitwidths verify-pdl
+specializes a pattern to, or when re-verifying a stable solution.
+
+Each entry holds the result of every check of the query, and the model values
+found with them, as JSON:
+
+    {"results": ["unsat", "sat", ...], "models": [[...], [...], ...]}
+
+Model values are integers, booleans or lists standing for tuples.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import cast
+
+CACHE_VERSION = 1
+
+ModelValue = int | bool | tuple["ModelValue", ...]
+"""A value of a model, pairs are tuples of their elements."""
+
+
+def solver_cache_root() -> Path:
+    "$XDSL_SMT_CACHE_DIR/solver, by default under ~/.cache/xdsl-smt"
+    cache_dir = os.environ.get("XDSL_SMT_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(Path.home(), ".cache", "xdsl-smt")
+    return Path(cache_dir, "solver")
+
+
+def _from_json(value: object) -> ModelValue:
+    if isinstance(value, list):
+        return tuple(_from_json(v) for v in cast(list[object], value))
+    if not isinstance(value, int):
+        raise TypeError(f"Unexpected model value {value}")
+    return value
+
+
+class SolverCache:
+    """
+    Solver results stored under a root dir, in <root>/<key[:2]>/<key>.json.
+
+    Entries are written to a temporary file and moved into place, so that
+    concurrent runs never read a partial entry. Entries that do not parse,
+    e.g. of an older format, are treated as missing.
+    """
+
+    root: Path
+    hits: int
+    misses: int
+
+    def __init__(self, root: Path | None = None):
+        self.root = solver_cache_root() if root is None else root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(script: str, *parts: object) -> str:
+        "The key of a script, parts hold e.g. the solver version and options"
+        key = "\n".join([str(CACHE_VERSION)] + [str(part) for part in parts])
+        return hashlib.sha256((key + "\n" + script).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> tuple[list[str], list[list[ModelValue]]] | None:
+        "The results of each check of a query and their model values"
+        try:
+            entry = json.loads(self._path(key).read_text())
+            results = [str(result) for result in entry["results"]]
+            models = [[_from_json(v) for v in model] for model in entry["models"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        if len(results) != len(models):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results, models
+
+    def put(self, key: str, results: list[str], models: list[list[ModelValue]]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        with NamedTemporaryFile(
+            "w", dir=path.parent, prefix="tmp-", suffix=".json", delete=False
+        ) as f:
+            json.dump({"results": results, "models": models}, f)
+        os.replace(f.name, path)
+
+    def __str__(self) -> str:
+        return f"{self.root}: {self.hits} hits, {self.misses} misses"
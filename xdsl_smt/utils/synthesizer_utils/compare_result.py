@@ -33,6 +33,12 @@ class PerBitRes:
     r"sound_dis(f,g) := \sum{a, f(a) is sound} d(f(a) /\ g(a), best(a)) + \sum{a, f(a) is unsound} d(g(a), best(a))"
     "sound_dis is equal to dist if f is sound."
 
+    cex: bool = False
+    """
+    Whether the inputs are counterexamples found by the verifier, which only
+    count towards the metrics over all bitwidths, not the low/med or high ones
+    """
+
     def __str__(self):
         s = ""
         s += f"bw: {self.bitwidth:<3}"
@@ -110,11 +116,15 @@ class EvalResult:
         return [
             res
             for res in self.per_bit_res
-            if res.bitwidth in EvalResult.lbws | EvalResult.mbws
+            if res.bitwidth in EvalResult.lbws | EvalResult.mbws and not res.cex
         ]
 
     def get_high_res(self) -> list[PerBitRes]:
-        return [res for res in self.per_bit_res if res.bitwidth in EvalResult.hbws]
+        return [
+            res
+            for res in self.per_bit_res
+            if res.bitwidth in EvalResult.hbws and not res.cex
+        ]
 
     def get_unsolved_cases(self) -> int:
         return self.unsolved_cases
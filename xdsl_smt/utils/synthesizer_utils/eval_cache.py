@@ -0,0 +1,95 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable
+
+from xdsl.dialects.func import FuncOp
+
+from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult
+from xdsl_smt.utils.synthesizer_utils.function_with_condition import (
+    FunctionWithCondition,
+)
+
+
+class EvalCache:
+    """
+    LRU cache of evaluation results.
+
+    A result is keyed by the canonical form of the candidate (its body and
+    condition after dead code elimination, without names and attributes), the
+    fingerprint of the solution set it is evaluated against and the data
+    directory holding the test vectors.
+    """
+
+    data_dir: str
+    eliminate_dead_code: Callable[[FuncOp], FuncOp]
+    capacity: int
+    hits: int
+    misses: int
+    results: OrderedDict[str, EvalResult]
+
+    def __init__(
+        self,
+        data_dir: str,
+        eliminate_dead_code: Callable[[FuncOp], FuncOp],
+        capacity: int = 65536,
+    ):
+        self.data_dir = data_dir
+        self.eliminate_dead_code = eliminate_dead_code
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.results = OrderedDict()
+
+    def canonical_str(self, func: FuncOp) -> str:
+        "Print func with dead code removed and without its name, attributes and value names"
+        canonical = FuncOp("f", func.function_type, region=func.body.clone())
+        self.eliminate_dead_code(canonical)
+        for op in canonical.walk():
+            for res in op.results:
+                res.name_hint = None
+            for region in op.regions:
+                for block in region.blocks:
+                    for arg in block.args:
+                        arg.name_hint = None
+        return str(canonical)
+
+    def candidate_str(self, candidate: FunctionWithCondition) -> str:
+        cond_str = "" if candidate.cond is None else self.canonical_str(candidate.cond)
+        return f"{self.canonical_str(candidate.func)}\n{cond_str}"
+
+    def fingerprint(self, solutions: list[FunctionWithCondition]) -> str:
+        "The solution set is a meet of its solutions, so their order does not matter"
+        solution_strs = sorted(self.candidate_str(s) for s in solutions)
+        return hashlib.sha256("\0".join(solution_strs).encode()).hexdigest()
+
+    def key(self, candidate: FunctionWithCondition | None, fingerprint: str) -> str:
+        "The key of a candidate, None stands for the top transfer function"
+        candidate_str = "top" if candidate is None else self.candidate_str(candidate)
+        key_str = "\0".join([candidate_str, fingerprint, self.data_dir])
+        return hashlib.sha256(key_str.encode()).hexdigest()
+
+    def get(self, key: str) -> EvalResult | None:
+        res = self.results.get(key)
+        if res is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return res
+
+    def put(self, key: str, res: EvalResult):
+        self.results[key] = res
+        self.results.move_to_end(key)
+        while len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+
+    def clear(self):
+        "Drop all results, e.g. after the test vectors in data_dir changed"
+        self.results.clear()
+
+    def get_hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return 0 if lookups == 0 else self.hits / lookups
+
+    def __str__(self) -> str:
+        return f"hits: {self.hits}, misses: {self.misses}, hit rate: {self.get_hit_rate() * 100:.2f}%, size: {len(self.results)}"
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult, PerBitRes
+
+Bitset = npt.NDArray[np.uint8]
+"A set of inputs, packed with np.packbits(..., bitorder='little')"
+
+
+@dataclass
+class EvalOutcomes:
+    """
+    The outcome of (f MEET F) on every single input, for candidate transformers f
+    and a set of sound transformers F, where EvalResult only holds the sums.
+
+    The inputs of all bitwidths are laid out one after the other, the inputs of
+    segment i have bitwidth bitwidths[i] and are offsets[i]:offsets[i + 1],
+    cex[i] marks segments of counterexample inputs (see PerBitRes.cex).
+    Arrays over candidates have a leading candidate axis, and sets of inputs
+    are packed bitsets, so they can be combined with np.bitwise_and/or and
+    counted with count.
+    """
+
+    bitwidths: list[int]
+    offsets: list[int]
+    cex: list[bool]
+
+    solved: Bitset
+    "Inputs on which F alone gets exact"
+
+    base_dist: npt.NDArray[np.float64]
+    r"d(g(a), best(a))"
+
+    sound: Bitset
+    "Inputs on which (f MEET F) gets sound"
+
+    exact: Bitset
+    "Inputs on which (f MEET F) gets exact"
+
+    dist: npt.NDArray[np.float64]
+    r"d(f(a) /\ g(a), best(a))"
+
+    @property
+    def num_candidates(self) -> int:
+        return self.dist.shape[0]
+
+    @property
+    def num_inputs(self) -> int:
+        return self.base_dist.shape[0]
+
+    def unpack(self, bits: Bitset) -> npt.NDArray[np.bool_]:
+        "A bool per input"
+        return np.unpackbits(
+            bits, axis=-1, count=self.num_inputs, bitorder="little"
+        ).astype(np.bool_)
+
+    @staticmethod
+    def count(bits: Bitset) -> npt.NDArray[np.uint64]:
+        "The number of inputs in each set"
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.uint64)
+
+    def mask(self, bitwidths: set[int]) -> Bitset:
+        "The set of non-counterexample inputs of the given bitwidths"
+        bools = np.zeros(self.num_inputs, np.bool_)
+        segments = zip(self.bitwidths, self.cex, self.offsets, self.offsets[1:])
+        for bw, cex, begin, end in segments:
+            bools[begin:end] = bw in bitwidths and not cex
+        return np.packbits(bools, bitorder="little")
+
+    def low_med_mask(self) -> Bitset:
+        "The inputs exacts and unsolved cases are counted on, see EvalResult"
+        return self.mask(EvalResult.lbws | EvalResult.mbws)
+
+    def get_unsolved_cases(self) -> int:
+        return int(self.count(~self.solved & self.low_med_mask()))
+
+    @property
+    def sound_dist(self) -> npt.NDArray[np.float64]:
+        "The distance of (f MEET F) where it is sound and of F elsewhere"
+        return np.where(self.unpack(self.sound), self.dist, self.base_dist)
+
+    def get_improve(self) -> npt.NDArray[np.float64]:
+        "base_dist - sound_dist of each candidate, its potential improve before normalization"
+        return self.base_dist.sum() - self.sound_dist.sum(axis=1)
+
+    def get_result(self, i: int) -> EvalResult:
+        "The EvalResult of candidate i, as the eval engine would report it"
+        sound = self.unpack(self.sound[i])
+        exact = self.unpack(self.exact[i])
+        unsolved = ~self.unpack(self.solved)
+        sound_dist = np.where(sound, self.dist[i], self.base_dist)
+        per_bit_res: list[PerBitRes] = []
+        segments = zip(self.bitwidths, self.cex, self.offsets, self.offsets[1:])
+        for bw, cex, begin, end in segments:
+            segment = slice(begin, end)
+            per_bit_res.append(
+                PerBitRes(
+                    all_cases=end - begin,
+                    bitwidth=bw,
+                    sounds=int(sound[segment].sum()),
+                    exacts=int(exact[segment].sum()),
+                    dist=float(self.dist[i, segment].sum()),
+                    base_dist=float(self.base_dist[segment].sum()),
+                    unsolved_cases=int(unsolved[segment].sum()),
+                    unsolved_exacts=int((exact & unsolved)[segment].sum()),
+                    sound_dist=float(sound_dist[segment].sum()),
+                    cex=cex,
+                )
+            )
+        return EvalResult(per_bit_res)
+
+    @staticmethod
+    def merge(
+        outcomes: list["EvalOutcomes"], indices: list[list[int]], num_candidates: int
+    ) -> "EvalOutcomes":
+        """
+        Combine outcomes of disjoint groups of candidates evaluated against the
+        same F, candidate j of outcomes[i] becomes candidate indices[i][j].
+        """
+        first = outcomes[0]
+        merged = EvalOutcomes(
+            first.bitwidths,
+            first.offsets,
+            first.cex,
+            first.solved,
+            first.base_dist,
+            np.zeros((num_candidates, first.sound.shape[-1]), np.uint8),
+            np.zeros((num_candidates, first.exact.shape[-1]), np.uint8),
+            np.zeros((num_candidates, first.num_inputs), np.float64),
+        )
+        for outcome, index in zip(outcomes, indices):
+            merged.sound[index] = outcome.sound
+            merged.exact[index] = outcome.exact
+            merged.dist[index] = outcome.dist
+        return merged
@@ -0,0 +1,124 @@
+from typing import Callable
+
+import numpy as np
+import numpy.typing as npt
+
+from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult
+from xdsl_smt.utils.synthesizer_utils.eval_outcomes import EvalOutcomes
+from xdsl_smt.utils.synthesizer_utils.function_with_condition import (
+    FunctionWithCondition,
+)
+
+
+class LazyGreedySelection:
+    """
+    Greedily picks the candidate with the largest improvement over the solutions
+    picked so far, while evaluating as few candidates as possible.
+
+    The improvement of a candidate on a test vector only shrinks as solutions
+    are added, so its improvement from the last time it was evaluated (at
+    first, its improvement over top) is a bound, as is the distance the current
+    solutions leave on that vector. These bounds are computed in-process from
+    the per vector outcomes, and only candidates whose bound beats the best
+    improvement found so far are evaluated against the current solutions.
+
+    The bounds hold when the improvement is submodular, as it is for domains in
+    which the meet intersects sets of facts, e.g. KnownBits. For other domains
+    the selection may differ from the plain greedy one, so it is only used for
+    those domains.
+    """
+
+    outcomes_func: Callable[
+        [list[FunctionWithCondition], list[FunctionWithCondition]], EvalOutcomes
+    ]
+    batch_size: int
+    solutions: list[FunctionWithCondition]
+
+    rows: dict[int, int]
+    "The row of each candidate (by id) in the arrays below"
+
+    improve: npt.NDArray[np.float64]
+    "The last improvement computed for each candidate on each test vector"
+
+    dist: npt.NDArray[np.float64]
+    "The distance of the current solutions on each test vector"
+
+    current: dict[int, tuple[EvalOutcomes, int, float]]
+    "Outcomes, their row and the improvement of candidates (by id) evaluated against the current solutions"
+
+    def __init__(
+        self,
+        outcomes_func: Callable[
+            [list[FunctionWithCondition], list[FunctionWithCondition]],
+            EvalOutcomes,
+        ],
+        candidates: list[FunctionWithCondition],
+        batch_size: int = 8,
+    ):
+        self.outcomes_func = outcomes_func
+        self.batch_size = batch_size
+        self.solutions = []
+        self.rows = {id(cand): i for i, cand in enumerate(candidates)}
+
+        outcomes = outcomes_func(candidates, [])
+        self.improve = np.maximum(outcomes.base_dist - outcomes.sound_dist, 0)
+        self.dist = outcomes.base_dist
+        self.current = {}
+
+    def pick(
+        self, candidates: list[FunctionWithCondition]
+    ) -> tuple[FunctionWithCondition, EvalResult] | None:
+        """
+        The candidate improving the current solutions the most, together with its
+        result against them. None if the current solutions are already exact.
+        """
+        if not candidates or self.dist.sum() == 0:
+            return None
+
+        rows = [self.rows[id(cand)] for cand in candidates]
+        bounds = np.minimum(self.improve[rows], self.dist).sum(axis=1)
+
+        best: tuple[float, int] | None = None
+        order = [int(i) for i in np.argsort(-bounds, kind="stable")]
+        while order:
+            if best is not None and bounds[order[0]] < best[0]:
+                break
+            batch = order[: self.batch_size]
+            order = order[self.batch_size :]
+
+            to_eval = [i for i in batch if id(candidates[i]) not in self.current]
+            if to_eval:
+                outcomes = self.outcomes_func(
+                    [candidates[i] for i in to_eval], self.solutions
+                )
+                improve = outcomes.base_dist - outcomes.sound_dist
+                for k, i in enumerate(to_eval):
+                    self.improve[rows[i]] = improve[k]
+                    self.current[id(candidates[i])] = (
+                        outcomes,
+                        k,
+                        float(improve[k].sum()),
+                    )
+
+            for i in batch:
+                _, _, improve = self.current[id(candidates[i])]
+                # ties go to the earlier candidate, like max() does
+                if best is None or (improve, -i) > (best[0], -best[1]):
+                    best = (improve, i)
+
+        assert best is not None
+        cand = candidates[best[1]]
+        outcomes, k, _ = self.current[id(cand)]
+        return cand, outcomes.get_result(k)
+
+    def may_improve(self, cand: FunctionWithCondition) -> bool:
+        "Whether pick may return cand with a non-zero improvement, as its bound is positive"
+        row = self.rows[id(cand)]
+        return bool(np.minimum(self.improve[row], self.dist).sum() > 0)
+
+    def add(self, cand: FunctionWithCondition):
+        "Add a candidate returned by pick to the solutions"
+        outcomes, k, _ = self.current[id(cand)]
+        self.dist = outcomes.dist[k]
+        self.solutions.append(cand)
+        self.current = {}
@@ -0,0 +1,301 @@
+"""
+Soundness verification of transfer functions on a pool of processes, with the
+bitwidths of a single transfer function, or the transfer functions of a batch,
+checked concurrently.
+"""
+
+import multiprocessing
+import os
+from io import StringIO
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from xdsl.context import Context
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.dialects.func import FuncOp
+from xdsl.ir import Dialect
+from xdsl.parser import Parser
+from xdsl.printer import Printer
+
+from xdsl_smt.utils.dialect_to_z3 import (
+    SolverSettings,
+    configure_solver,
+    get_solver_settings,
+)
+from xdsl_smt.utils.synthesizer_utils.verifier_utils import (
+    Counterexample,
+    find_counterexamples,
+)
+
+_num_workers = 1
+_pool: ProcessPoolExecutor | None = None
+_pool_pid = 0
+
+_worker_ctx: Context | None = None
+"The context of a worker process, with the dialects of the parent's one"
+
+_worker_funcs: tuple[str, list[FuncOp]] | None = None
+"The functions last parsed by a worker, checked at every bitwidth in turn"
+
+
+def configure_verifier_workers(num_workers: int) -> None:
+    """
+    Set the number of processes verify_transfer_function_parallel checks
+    bitwidths on. With a single worker the bitwidths are checked in-process.
+    The workers of a previous configuration are shut down, so that each run
+    starts with workers that have not cached the lowerings of another one.
+    """
+    global _num_workers, _pool
+
+    num_workers = max(num_workers, 1)
+    if _pool is not None:
+        if _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    _num_workers = num_workers
+
+
+def _init_worker(
+    dialects: list[Dialect], allow_unregistered: bool, settings: SolverSettings
+) -> None:
+    global _worker_ctx
+    _worker_ctx = Context(allow_unregistered)
+    for dialect in dialects:
+        _worker_ctx.load_dialect(dialect)
+    configure_solver(settings)
+
+
+def _get_pool(ctx: Context) -> ProcessPoolExecutor | None:
+    global _pool, _pool_pid
+
+    if _num_workers == 1:
+        return None
+    # a forked child must not share the workers of its parent
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(
+            _num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                list(ctx.loaded_dialects),
+                ctx.allow_unregistered,
+                get_solver_settings(),
+            ),
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _kill_pool() -> None:
+    """
+    Terminate the workers of the pool and drop it, so that the next check
+    starts a new one. ProcessPoolExecutor cannot interrupt a running job, nor
+    terminate its workers through its public API.
+    """
+    global _pool
+
+    if _pool is None:
+        return
+    processes = list(
+        (_pool._processes or {}).values()  # pyright: ignore[reportPrivateUsage]
+    )
+    _pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    _pool = None
+
+
+def _print_funcs(funcs: list[FuncOp]) -> str:
+    """
+    Print functions for a worker in the generic format, as the custom format of
+    the comb concrete ops does not parse back on transfer integers.
+    """
+    stream = StringIO()
+    Printer(stream, print_generic_format=True).print_op(
+        ModuleOp([func.clone() for func in funcs])
+    )
+    return stream.getvalue()
+
+
+def _verify_width(funcs_src: str, width: int) -> Counterexample | None:
+    global _worker_funcs
+    assert _worker_ctx is not None
+
+    if _worker_funcs is None or _worker_funcs[0] != funcs_src:
+        module = Parser(_worker_ctx, funcs_src).parse_module()
+        funcs = [func for func in module.ops if isinstance(func, FuncOp)]
+        _worker_funcs = (funcs_src, funcs)
+    transfer_function, concrete_func, *helper_funcs = _worker_funcs[1]
+    (counterexample,) = find_counterexamples(
+        [transfer_function], concrete_func, helper_funcs, _worker_ctx, width, width
+    )
+    return counterexample
+
+
+def _verify_batch(
+    funcs_src: str,
+    num_transfer_functions: int,
+    min_verify_bits: int,
+    max_verify_bits: int,
+) -> list[Counterexample | None]:
+    assert _worker_ctx is not None
+
+    module = Parser(_worker_ctx, funcs_src).parse_module()
+    funcs = [func for func in module.ops if isinstance(func, FuncOp)]
+    transfer_functions = funcs[:num_transfer_functions]
+    concrete_func, *helper_funcs = funcs[num_transfer_functions:]
+    return find_counterexamples(
+        transfer_functions,
+        concrete_func,
+        helper_funcs,
+        _worker_ctx,
+        min_verify_bits,
+        max_verify_bits,
+    )
+
+
+def verify_transfer_function_parallel(
+    transfer_function: FuncOp,
+    concrete_func: FuncOp,
+    helper_funcs: list[FuncOp],
+    ctx: Context,
+    min_verify_bits: int,
+    max_verify_bits: int,
+) -> int:
+    """
+    Like verify_transfer_function, the smallest unsound bitwidth or 0, with
+    each bitwidth checked on the pool of configure_verifier_workers.
+    See find_counterexample_parallel.
+    """
+    counterexample = find_counterexample_parallel(
+        transfer_function,
+        concrete_func,
+        helper_funcs,
+        ctx,
+        min_verify_bits,
+        max_verify_bits,
+    )
+    return 0 if counterexample is None else counterexample.width
+
+
+def find_counterexample_parallel(
+    transfer_function: FuncOp,
+    concrete_func: FuncOp,
+    helper_funcs: list[FuncOp],
+    ctx: Context,
+    min_verify_bits: int,
+    max_verify_bits: int,
+) -> Counterexample | None:
+    """
+    A counterexample at the smallest unsound bitwidth, or None if the transfer
+    function is sound, with each bitwidth checked on the pool of
+    configure_verifier_workers.
+
+    Bitwidths are scheduled from the lowest, which are the cheapest to check.
+    Once a bitwidth is unsound, the pending checks of larger bitwidths are
+    cancelled, and only the smaller bitwidths still running are waited for.
+
+    Checks of larger bitwidths that already started cannot be cancelled, and
+    would keep the workers busy, delaying the checks of the next calls behind
+    them, possibly up to the solver timeout. Rather than waiting for them, the
+    workers are terminated and the next call starts a new pool, as restarting
+    a worker is cheap next to the checks of the largest bitwidths.
+    """
+    pool = _get_pool(ctx)
+    if pool is None:
+        (counterexample,) = find_counterexamples(
+            [transfer_function],
+            concrete_func,
+            helper_funcs,
+            ctx,
+            min_verify_bits,
+            max_verify_bits,
+        )
+        return counterexample
+
+    funcs = [transfer_function, concrete_func, *helper_funcs]
+    funcs_src = _print_funcs(funcs)
+    widths: dict[Future[Counterexample | None], int] = {
+        pool.submit(_verify_width, funcs_src, width): width
+        for width in range(min_verify_bits, max_verify_bits + 1)
+    }
+
+    first: Counterexample | None = None
+    pending = set(widths)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.cancelled():
+                continue
+            counterexample = future.result()
+            if counterexample is not None and (
+                first is None or counterexample.width < first.width
+            ):
+                first = counterexample
+
+        if first is not None:
+            for future in pending:
+                if widths[future] > first.width:
+                    future.cancel()
+            pending = {f for f in pending if widths[f] < first.width}
+
+    if not all(future.done() for future in widths):
+        _kill_pool()
+    return first
+
+
+def find_counterexamples_parallel(
+    transfer_functions: list[FuncOp],
+    concrete_func: FuncOp,
+    helper_funcs: list[FuncOp],
+    ctx: Context,
+    min_verify_bits: int,
+    max_verify_bits: int,
+) -> list[Counterexample | None]:
+    """
+    Like find_counterexamples, a counterexample to each unsound transfer function
+    or None, with the transfer functions split in one batch per worker of
+    configure_verifier_workers.
+    """
+    if len(transfer_functions) == 1:
+        return [
+            find_counterexample_parallel(
+                transfer_functions[0],
+                concrete_func,
+                helper_funcs,
+                ctx,
+                min_verify_bits,
+                max_verify_bits,
+            )
+        ]
+    pool = _get_pool(ctx)
+    if pool is None:
+        return find_counterexamples(
+            transfer_functions,
+            concrete_func,
+            helper_funcs,
+            ctx,
+            min_verify_bits,
+            max_verify_bits,
+        )
+
+    batches = [
+        list(range(i, len(transfer_functions), _num_workers))
+        for i in range(min(_num_workers, len(transfer_functions)))
+    ]
+    futures: list[Future[list[Counterexample | None]]] = []
+    for batch in batches:
+        funcs = [transfer_functions[i] for i in batch] + [concrete_func, *helper_funcs]
+        funcs_src = _print_funcs(funcs)
+        futures.append(
+            pool.submit(
+                _verify_batch, funcs_src, len(batch), min_verify_bits, max_verify_bits
+            )
+        )
+
+    counterexamples: list[Counterexample | None] = [None] * len(transfer_functions)
+    for batch, future in zip(batches, futures):
+        for i, counterexample in zip(batch, future.result()):
+            counterexamples[i] = counterexample
+    return counterexamples
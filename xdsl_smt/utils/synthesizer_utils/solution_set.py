@@ -5,18 +5,30 @@ from typing import Callable
 from abc import ABC, abstractmethod
 import logging
 
+import numpy as np
+
 from xdsl.context import Context
 from xdsl.dialects.builtin import ModuleOp
 from xdsl.dialects.func import FuncOp, CallOp, ReturnOp
 
 from xdsl_smt.utils.synthesizer_utils.compare_result import EvalResult
-from xdsl_smt.utils.synthesizer_utils.verifier_utils import verify_transfer_function
+from xdsl_smt.utils.synthesizer_utils.eval_cache import EvalCache
+from xdsl_smt.utils.synthesizer_utils.eval_outcomes import EvalOutcomes
+from xdsl_smt.utils.synthesizer_utils.lazy_greedy import LazyGreedySelection
+from xdsl_smt.utils.synthesizer_utils.parallel_verifier import (
+    find_counterexample_parallel,
+    find_counterexamples_parallel,
+)
+from xdsl_smt.utils.synthesizer_utils.verifier_utils import Counterexample
 
 from xdsl_smt.utils.synthesizer_utils.function_with_condition import (
     FunctionWithCondition,
 )
 from xdsl_smt.utils.synthesizer_utils.synthesizer_context import SynthesizerContext
 
+LEARN_MIN_NEW_EXACT_PROP = 0.005
+"The proportion of new exacts a solution must bring for learn_weights to learn from it"
+
 
 def rename_functions(lst: list[FunctionWithCondition], prefix: str) -> list[str]:
     func_names: list[str] = []
@@ -31,15 +43,42 @@ def verify_function(
     concrete_op: FuncOp,
     helper_funcs: list[FuncOp],
     ctx: Context,
-) -> int:
+) -> Counterexample | None:
     cur_helper = [func.func]
     if func.cond is not None:
         cur_helper.append(func.cond)
-    return verify_transfer_function(
+    return find_counterexample_parallel(
         func.get_function(), concrete_op, cur_helper + helper_funcs, ctx, 1, 32
     )
 
 
+def verify_functions(
+    funcs: list[FunctionWithCondition],
+    concrete_op: FuncOp,
+    helper_funcs: list[FuncOp],
+    ctx: Context,
+) -> dict[int, Counterexample | None]:
+    """
+    Verify candidates together, sharing a solver session per bitwidth. Returns a
+    counterexample at the smallest unsound bitwidth of each candidate (by id), or
+    None if it is sound.
+    """
+    cur_helper: list[FuncOp] = []
+    for func in funcs:
+        cur_helper.append(func.func)
+        if func.cond is not None:
+            cur_helper.append(func.cond)
+    counterexamples = find_counterexamples_parallel(
+        [func.get_function() for func in funcs],
+        concrete_op,
+        cur_helper + helper_funcs,
+        ctx,
+        1,
+        32,
+    )
+    return {id(func): cex for func, cex in zip(funcs, counterexamples)}
+
+
 class SolutionSet(ABC):
     "This class is an abstract class for maintaining solutions. It supports to generate the meet of solutions"
 
@@ -60,8 +99,27 @@ class SolutionSet(ABC):
         [list[FunctionWithCondition], list[FunctionWithCondition]], list[EvalResult]
     ]
 
+    """
+    list of transfer functions
+    list of base functions
+    Returns the outcome of each transfer function on each test vector
+    """
+    outcomes_func: (
+        Callable[
+            [list[FunctionWithCondition], list[FunctionWithCondition]], EvalOutcomes
+        ]
+        | None
+    )
+
+    "Whether to pick solutions with LazyGreedySelection, which is only exact for submodular improvements"
+    lazy_greedy: bool
+
     tests_sampler: Callable[[list[FunctionWithCondition], int, int], None]
     logger: logging.Logger
+    eval_cache: EvalCache | None
+
+    "Adds the counterexamples found by the verifier to the test vectors"
+    counterexample_func: Callable[[list[Counterexample]], None] | None
 
     def __init__(
         self,
@@ -78,6 +136,16 @@ class SolutionSet(ABC):
         tests_sampler: Callable[[list[FunctionWithCondition], int, int], None],
         logger: logging.Logger,
         is_perfect: bool = False,
+        eval_cache: EvalCache | None = None,
+        outcomes_func: (
+            Callable[
+                [list[FunctionWithCondition], list[FunctionWithCondition]],
+                EvalOutcomes,
+            ]
+            | None
+        ) = None,
+        counterexample_func: Callable[[list[Counterexample]], None] | None = None,
+        lazy_greedy: bool = False,
     ):
         rename_functions(initial_solutions, "partial_solution_")
         self.solutions = initial_solutions
@@ -89,12 +157,54 @@ class SolutionSet(ABC):
         self.logger = logger
         self.precise_set = []
         self.is_perfect = is_perfect
+        self.eval_cache = eval_cache
+        self.outcomes_func = outcomes_func
+        self.counterexample_func = counterexample_func
+        self.lazy_greedy = lazy_greedy
 
     def eval_improve(self, transfers: list[FunctionWithCondition]) -> list[EvalResult]:
-        return self.eval_func(transfers, self.solutions)
+        if self.eval_cache is None:
+            return self.eval_func(transfers, self.solutions)
+
+        # only candidates not scored against the current solutions are sent to
+        # the eval engine, duplicates among them are evaluated once
+        fingerprint = self.eval_cache.fingerprint(self.solutions)
+        to_key: list[FunctionWithCondition | None] = list(transfers) or [None]
+        keys = [self.eval_cache.key(t, fingerprint) for t in to_key]
+        results = [self.eval_cache.get(key) for key in keys]
+
+        misses: dict[str, FunctionWithCondition | None] = {}
+        for key, transfer, res in zip(keys, to_key, results):
+            if res is None:
+                misses.setdefault(key, transfer)
+        fresh: dict[str, EvalResult] = {}
+        if misses:
+            miss_transfers = [t for t in misses.values() if t is not None]
+            for key, res in zip(misses, self.eval_func(miss_transfers, self.solutions)):
+                fresh[key] = res
+                self.eval_cache.put(key, res)
+
+        return [
+            res if res is not None else fresh[key] for key, res in zip(keys, results)
+        ]
 
     def sample_unsolved_tests(self, samples: int, seed: int):
         self.tests_sampler(self.solutions, samples, seed)
+        if self.eval_cache is not None:
+            self.eval_cache.clear()
+
+    def add_counterexamples(self, counterexamples: list[Counterexample]):
+        "Add vectors for counterexamples above the low bitwidths, see counterexample_func"
+        counterexamples = [
+            cex
+            for cex in counterexamples
+            if cex.abs_args and cex.width > max(EvalResult.lbws, default=0)
+        ]
+        if self.counterexample_func is None or not counterexamples:
+            return
+        self.counterexample_func(counterexamples)
+        if self.eval_cache is not None:
+            self.eval_cache.clear()
 
     def sample_unsolved_tests_up_to(self, desired_size: int, seed: int) -> int:
         res = self.eval_improve([])[0]
@@ -206,6 +316,16 @@ class UnsizedSolutionSet(SolutionSet):
         logger: logging.Logger,
         eliminate_dead_code: Callable[[FuncOp], FuncOp],
         is_perfect: bool = False,
+        eval_cache: EvalCache | None = None,
+        outcomes_func: (
+            Callable[
+                [list[FunctionWithCondition], list[FunctionWithCondition]],
+                EvalOutcomes,
+            ]
+            | None
+        ) = None,
+        counterexample_func: Callable[[list[Counterexample]], None] | None = None,
+        lazy_greedy: bool = False,
     ):
         super().__init__(
             initial_solutions,
@@ -215,6 +335,10 @@ class UnsizedSolutionSet(SolutionSet):
             tests_sampler,
             logger,
             is_perfect,
+            eval_cache,
+            outcomes_func,
+            counterexample_func,
+            lazy_greedy,
         )
 
     def handle_inconsistent_result(self, f: FunctionWithCondition):
@@ -251,15 +375,38 @@ class UnsizedSolutionSet(SolutionSet):
         self.logger.info("Reset solution set...")
         num_cond_solutions = 0
 
+        greedy = (
+            None
+            if not self.lazy_greedy or self.outcomes_func is None or not candidates
+            else LazyGreedySelection(self.outcomes_func, candidates)
+        )
+        # Verify the new candidates that may be picked in a single batch
+        to_verify = [
+            cand
+            for cand in new_candidates_sp + new_candidates_c
+            if greedy is None or greedy.may_improve(cand)
+        ]
+        verified = (
+            verify_functions(to_verify, concrete_op, helper_funcs, ctx)
+            if to_verify
+            else {}
+        )
+        counterexamples: list[Counterexample] = []
         while len(candidates) > 0:
-            result = self.eval_improve(candidates)
-            if (
-                result[0].get_base_dist() == 0
-            ):  # current solution set is already perfect
-                break
-            cand, max_improve_res = max(
-                zip(candidates, result), key=lambda x: x[1].get_potential_improve()
-            )
+            if greedy is None:
+                result = self.eval_improve(candidates)
+                if (
+                    result[0].get_base_dist() == 0
+                ):  # current solution set is already perfect
+                    break
+                cand, max_improve_res = max(
+                    zip(candidates, result), key=lambda x: x[1].get_potential_improve()
+                )
+            else:
+                picked = greedy.pick(candidates)
+                if picked is None:  # current solution set is already perfect
+                    break
+                cand, max_improve_res = picked
             if max_improve_res.get_potential_improve() == 0:
                 break
 
@@ -269,14 +416,27 @@ class UnsizedSolutionSet(SolutionSet):
             )
 
             if (cand in new_candidates_sp) or (cand in new_candidates_c):
-                unsound_bit = verify_function(cand, concrete_op, helper_funcs, ctx)
-                if unsound_bit != 0:
+                cex = (
+                    verified[id(cand)]
+                    if id(cand) in verified
+                    else verify_function(cand, concrete_op, helper_funcs, ctx)
+                )
+                if cex is not None and cex.unknown:
+                    # Not known to be sound, so it can not be added either
+                    self.logger.info(
+                        f"Skip a function the verifier gave up on at bit width {cex.width}, body: {body_number}, cond: {cond_number}"
+                    )
+                    candidates.remove(cand)
+                    continue
+                if cex is not None:
+                    unsound_bit = cex.width
                     self.logger.info(
                         f"Skip a unsound function at bit width {unsound_bit}, body: {body_number}, cond: {cond_number}"
                     )
                     # Todo: Remove hard encoded bitwidth
                     if unsound_bit <= 4:
                         self.handle_inconsistent_result(cand)
+                    counterexamples.append(cex)
                     candidates.remove(cand)
                     continue
 
@@ -297,12 +457,16 @@ class UnsizedSolutionSet(SolutionSet):
             )
             candidates.remove(cand)
             self.solutions.append(cand)
+            if greedy is not None:
+                greedy.add(cand)
 
         self.logger.info(
             f"The number of solutions after reseting: {len(self.solutions)}"
         )
         self.logger.info(f"The number of conditional solutions: {num_cond_solutions}")
         self.solutions_size = len(self.solutions)
+        # The next candidates are scored on the inputs these were unsound on
+        self.add_counterexamples(counterexamples)
 
         final_result = self.eval_improve([])[0]
         if final_result.get_unsolved_cases() == 0:
@@ -336,16 +500,29 @@ class UnsizedSolutionSet(SolutionSet):
     def learn_weights(self, context: SynthesizerContext):
         "Set weights in context according to the frequencies of each DSL operation that appear in func in solution set"
         self.logger.info("Improvement by each individual function")
+        new_exact_bounds = (
+            None
+            if self.outcomes_func is None
+            else self.get_new_exact_bounds(self.outcomes_func)
+        )
         learn_form_funcs: list[FuncOp] = []
         for i, sol in enumerate(self.solutions):
+            body_number = sol.func.attributes["number"]
+            cond_number = "None" if sol.cond is None else sol.cond.attributes["number"]
+            if (
+                new_exact_bounds is not None
+                and new_exact_bounds[i] <= LEARN_MIN_NEW_EXACT_PROP
+            ):
+                self.logger.info(
+                    f"\tbody {body_number}, cond {cond_number} : new exact <= {new_exact_bounds[i] * 100:.2f}%, cond?: {sol.cond is not None}, learn?: False"
+                )
+                continue
             cmp_results: list[EvalResult] = self.eval_func(
                 [sol],
                 self.solutions[:i] + self.solutions[i + 1 :],
             )
             res = cmp_results[0]
-            to_learn = res.get_new_exact_prop() > 0.005
-            body_number = sol.func.attributes["number"]
-            cond_number = "None" if sol.cond is None else sol.cond.attributes["number"]
+            to_learn = res.get_new_exact_prop() > LEARN_MIN_NEW_EXACT_PROP
             self.logger.info(
                 f"\tbody {body_number}, cond {cond_number} : #exact {res.get_exacts() - res.get_unsolved_exacts()} -> {res.get_exacts()}, dist_improve: {res.get_potential_improve():3f}%, cond?: {self.solutions[i].cond is not None}, learn?: {to_learn}"
             )
@@ -359,3 +536,27 @@ class UnsizedSolutionSet(SolutionSet):
         for _, weights in context.op_weights.items():
             for key, value in weights.items():
                 self.logger.info(f"\t{key}: {value}")
+
+    def get_new_exact_bounds(
+        self,
+        outcomes_func: Callable[
+            [list[FunctionWithCondition], list[FunctionWithCondition]], EvalOutcomes
+        ],
+    ) -> list[float]:
+        """
+        An upper bound of the new exact prop of each solution against all other
+        solutions, from two evaluations in total. An input can only be new exact
+        if the whole solution set gets exact on it, and no other solution does
+        on its own.
+        """
+        alone = outcomes_func(self.solutions, [])
+        low_med = alone.low_med_mask()
+        all_low_med = int(alone.count(low_med))
+        solved = outcomes_func([], self.solutions).solved & low_med
+
+        bounds: list[float] = []
+        for i in range(len(self.solutions)):
+            others = np.delete(alone.exact, i, axis=0)
+            solved_by_others = np.bitwise_or.reduce(others, axis=0, initial=0)
+            bounds.append(int(alone.count(solved & ~solved_by_others)) / all_low_med)
+        return bounds
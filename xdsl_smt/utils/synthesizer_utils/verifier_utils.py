@@ -1,8 +1,8 @@
-import subprocess
+from dataclasses import dataclass
+from hashlib import sha1
 
 from xdsl.context import Context
 
-from io import StringIO
 
 from xdsl.dialects import comb
 from xdsl.utils.hints import isa
@@ -46,10 +46,12 @@ from xdsl_smt.utils.transfer_function_util import (
 
 from xdsl_smt.utils.transfer_function_check_util import (
     forward_soundness_check,
+    forward_soundness_check_batch,
     backward_soundness_check,
 )
 from xdsl_smt.passes.transfer_unroll_loop import UnrollTransferLoop
-from xdsl_smt.traits.smt_printer import print_to_smtlib
+from xdsl_smt.utils.dialect_to_z3 import ModelValue, get_solver, get_solver_settings
+from xdsl_smt.utils.exhaustive_check import check_unsat_under_exhaustive
 from xdsl_smt.passes.lower_pairs import LowerPairs
 from xdsl.transforms.canonicalize import CanonicalizePass
 from xdsl_smt.semantics.arith_semantics import arith_semantics
@@ -62,25 +64,17 @@ from xdsl_smt.semantics.transfer_semantics import (
 from xdsl_smt.semantics.comb_semantics import comb_semantics
 
 
+def simplify_query(ctx: Context, op: ModuleOp):
+    LowerPairs().apply(ctx, op)
+    CanonicalizePass().apply(ctx, op)
+    DeadCodeElimination().apply(ctx, op)
+
+
 def verify_pattern(ctx: Context, op: ModuleOp) -> bool:
     cloned_op = op.clone()
-    stream = StringIO()
-    LowerPairs().apply(ctx, cloned_op)
-    CanonicalizePass().apply(ctx, cloned_op)
-    DeadCodeElimination().apply(ctx, cloned_op)
-
-    print_to_smtlib(cloned_op, stream)
-    res = subprocess.run(
-        ["z3", "-in"],
-        capture_output=True,
-        input=stream.getvalue(),
-        text=True,
-    )
-
-    if res.returncode != 0:
-        raise Exception(res.stderr)
+    simplify_query(ctx, cloned_op)
 
-    return "unsat" in res.stdout
+    return get_solver().is_unsat(cloned_op)
 
 
 def get_concrete_function(
@@ -196,7 +190,13 @@ def generate_int_attr_arg(int_attr_arg: list[int] | None) -> dict[int, int]:
 
 INSTANCE_CONSTRAINT = "getInstanceConstraint"
 DOMAIN_CONSTRAINT = "getConstraint"
-TMP_MODULE: list[ModuleOp] = []
+LOWERED_FUNCS: dict[tuple[str, int, bool], DefineFunOp] = {}
+"Functions lowered by lower_function, by their hash, width and loop unrolling"
+
+
+def clear_lowered_funcs() -> None:
+    "Drop the lowerings of a previous run, which would otherwise stay in a reused process"
+    LOWERED_FUNCS.clear()
 
 
 def add_poison_to_concrete_function(concrete_func: FuncOp) -> FuncOp:
@@ -229,21 +229,55 @@ def add_poison_to_concrete_function(concrete_func: FuncOp) -> FuncOp:
     return result_func
 
 
+def lower_function(
+    func: FuncOp, width: int, ctx: Context, unroll_loops: bool = False
+) -> DefineFunOp:
+    """
+    Input: a function with type FuncOp, with no calls to other functions
+    Return: the function lowered to SMT dialect with specified width
+
+    Lowerings are cached for the whole run by the printed function, so the
+    concrete function, the constraints and the other functions shared by all
+    candidates are only lowered once per width. Each call returns a clone of the
+    cached lowering, so that the calls of a query module only ever use the
+    functions of this query, and the cache never holds uses from a query.
+    """
+    key = (sha1(str(func).encode()).hexdigest(), width, unroll_loops)
+    if key not in LOWERED_FUNCS:
+        module = ModuleOp([func.clone()])
+        if unroll_loops:
+            UnrollTransferLoop(width).apply(ctx, module)
+        lower_to_smt_module(module, width, ctx)
+        result_func = module.ops.first
+        assert isinstance(result_func, DefineFunOp)
+        LOWERED_FUNCS[key] = result_func
+    # Inlining the calls rewrites around the callee, so it needs a module too
+    lowered = LOWERED_FUNCS[key].clone()
+    ModuleOp([lowered])
+    return lowered
+
+
+def lower_transfer_function(func: FuncOp, width: int, ctx: Context) -> DefineFunOp:
+    """
+    Input: a transfer function with type FuncOp, with no calls to other functions
+    Return: the function lowered to SMT dialect with specified width, not cached
+    """
+    smt_module = ModuleOp([func.clone()])
+    UnrollTransferLoop(width).apply(ctx, smt_module)
+    lower_to_smt_module(smt_module, width, ctx)
+    smt_transfer_function = smt_module.ops.first
+    assert isinstance(smt_transfer_function, DefineFunOp)
+    return smt_transfer_function
+
+
 def create_smt_function(func: FuncOp, width: int, ctx: Context) -> DefineFunOp:
     """
     Input: a function with type FuncOp
     Return: the function lowered to SMT dialect with specified width
 
-    We might reuse some function with specific width so we save it to global TMP_MODULE
     Class FunctionCollection is the only caller of this function and maintains all generated SMT functions
     """
-
-    global TMP_MODULE
-    TMP_MODULE.append(ModuleOp([func.clone()]))
-    lower_to_smt_module(TMP_MODULE[-1], width, ctx)
-    resultFunc = TMP_MODULE[-1].ops.first
-    assert isinstance(resultFunc, DefineFunOp)
-    return resultFunc
+    return lower_function(func, width, ctx)
 
 
 def soundness_check(
@@ -274,6 +308,48 @@ def soundness_check(
     return verify_pattern(ctx, query_module)
 
 
+def soundness_check_batch(
+    smt_transfer_functions: list[SMTTransferFunction],
+    domain_constraint: FunctionCollection,
+    instance_constraint: FunctionCollection,
+    int_attr: dict[int, int],
+    ctx: Context,
+    width: int | None = None,
+) -> list[tuple[bool | None, list[ModelValue]]]:
+    """
+    Whether each transfer function is sound, or None if the solver gave up, with
+    the values of the abstract and then the concrete arguments it is unsound on.
+
+    Queries of a bitwidth up to the exhaustive_max_width of the solver settings
+    are checked on every input when small enough, see
+    check_unsat_under_exhaustive. Otherwise the bitwidth of the query picks the
+    solver, see get_solver. Queries a bit-blasting solver gives up on are
+    checked again by the default one.
+    """
+    query_module = ModuleOp([])
+    added_ops, assumptions = forward_soundness_check_batch(
+        smt_transfer_functions,
+        domain_constraint,
+        instance_constraint,
+        int_attr,
+    )
+    query_module.body.block.add_ops(added_ops)
+    FunctionCallInline(True, {}).apply(ctx, query_module)
+    simplify_query(ctx, query_module)
+
+    if width is not None and width <= get_solver_settings().exhaustive_max_width:
+        results = check_unsat_under_exhaustive(query_module, assumptions)
+        if results is not None:
+            return results
+
+    results = get_solver(width).check_unsat_under(query_module, assumptions)
+    if get_solver(width) is not get_solver() and any(
+        sound is None for sound, _ in results
+    ):
+        results = get_solver().check_unsat_under(query_module, assumptions)
+    return results
+
+
 def verify_smt_transfer_function(
     smt_transfer_function: SMTTransferFunction,
     domain_constraint: FunctionCollection,
@@ -300,8 +376,72 @@ def verify_smt_transfer_function(
     return True
 
 
+def find_smt_counterexamples(
+    smt_transfer_functions: list[SMTTransferFunction],
+    domain_constraint: FunctionCollection,
+    instance_constraint: FunctionCollection,
+    ctx: Context,
+    width: int | None = None,
+) -> list[tuple[bool | None, list[ModelValue]]]:
+    """
+    Like verify_smt_transfer_function for several transfer functions of the same
+    concrete function, whether each is sound, or None if the solver gave up,
+    with the values of its abstract and then concrete arguments it is unsound on.
+
+    Forward transfer functions are checked in a single solver session, sharing
+    their arguments and constraints, on the solver of the bitwidth of the
+    transfer functions if given. The values of backward transfer functions
+    are not extracted, and are left empty, nor are their unknown results, which
+    are unsound.
+    """
+    if not all(
+        smt_transfer_function.is_forward
+        for smt_transfer_function in smt_transfer_functions
+    ):
+        return [
+            (
+                verify_smt_transfer_function(
+                    smt_transfer_function, domain_constraint, instance_constraint, ctx
+                ),
+                [],
+            )
+            for smt_transfer_function in smt_transfer_functions
+        ]
+
+    int_attr = generate_int_attr_arg(smt_transfer_functions[0].int_attr_arg)
+    # assert current use has no int_attr
+    assert int_attr == {}
+
+    return soundness_check_batch(
+        smt_transfer_functions,
+        domain_constraint,
+        instance_constraint,
+        int_attr,
+        ctx,
+        width,
+    )
+
+
+def verify_smt_transfer_functions(
+    smt_transfer_functions: list[SMTTransferFunction],
+    domain_constraint: FunctionCollection,
+    instance_constraint: FunctionCollection,
+    ctx: Context,
+) -> list[bool]:
+    """
+    Like verify_smt_transfer_function for several transfer functions of the same
+    concrete function, see find_smt_counterexamples.
+    """
+    return [
+        sound is True
+        for sound, _ in find_smt_counterexamples(
+            smt_transfer_functions, domain_constraint, instance_constraint, ctx
+        )
+    ]
+
+
 def build_init_module(
-    transfer_function: FuncOp,
+    transfer_functions: list[FuncOp],
     concrete_func: FuncOp,
     helper_funcs: list[FuncOp],
     ctx: Context,
@@ -309,14 +449,14 @@ def build_init_module(
 ):
     func_name_to_func: dict[str, FuncOp] = {}
     module_op = ModuleOp([])
-    functions: list[FuncOp] = [transfer_function.clone()]
+    functions: list[FuncOp] = [func.clone() for func in transfer_functions]
     if is_custom_concrete_func:
         functions.append(add_poison_to_concrete_function(concrete_func))
     module_op.body.block.add_ops(functions + [func.clone() for func in helper_funcs])
     domain_constraint: FunctionCollection | None = None
     instance_constraint: FunctionCollection | None = None
-    transfer_function_obj: TransferFunction | None = None
-    transfer_function_name = transfer_function.sym_name.data
+    transfer_function_objs: dict[str, TransferFunction] = {}
+    transfer_function_names = {func.sym_name.data for func in transfer_functions}
     for func in module_op.ops:
         assert isinstance(func, FuncOp)
         func_name = func.sym_name.data
@@ -331,9 +471,8 @@ def build_init_module(
         assert return_op.operands[0].type == func.function_type.outputs.data[0]
         # End of check function type
 
-        if func_name == transfer_function_name:
-            assert transfer_function_obj is None
-            transfer_function_obj = TransferFunction(func)
+        if func_name in transfer_function_names:
+            transfer_function_objs[func_name] = TransferFunction(func)
         if func_name == DOMAIN_CONSTRAINT:
             assert domain_constraint is None
             domain_constraint = FunctionCollection(func, create_smt_function, ctx)
@@ -343,21 +482,21 @@ def build_init_module(
 
     assert domain_constraint is not None
     assert instance_constraint is not None
-    assert transfer_function_obj is not None
 
-    func_name_to_func[transfer_function.sym_name.data] = transfer_function
-    if len(func_name_to_func) != len(helper_funcs) + (
-        2 if is_custom_concrete_func else 1
+    for transfer_function in transfer_functions:
+        func_name_to_func[transfer_function.sym_name.data] = transfer_function
+    if len(func_name_to_func) != len(helper_funcs) + len(transfer_functions) + (
+        1 if is_custom_concrete_func else 0
     ):
         print(
             [func.sym_name.data for func in helper_funcs]
-            + [transfer_function.sym_name.data]
+            + [func.sym_name.data for func in transfer_functions]
         )
         raise ValueError("Found function with the same name in the input")
     return (
         module_op,
         func_name_to_func,
-        transfer_function_obj,
+        [transfer_function_objs[func.sym_name.data] for func in transfer_functions],
         domain_constraint,
         instance_constraint,
     )
@@ -368,6 +507,40 @@ def check_custom_concrete_func(concrete_func: FuncOp):
     return not any(isinstance(op, ty) for ty in comb_semantics.keys())
 
 
+@dataclass
+class Counterexample:
+    """
+    An input a transfer function is unsound on: the integers of each abstract
+    argument and of each concrete argument, at the given bitwidth. Boolean
+    fields, e.g. poison flags, are left out. The arguments are empty when the
+    solver gave no model.
+
+    If unknown is set, the solver gave up at this bitwidth, e.g. on a timeout,
+    so the transfer function is not known to be sound, nor to be unsound.
+    """
+
+    width: int
+    abs_args: list[list[int]]
+    crt_args: list[int]
+    unknown: bool = False
+
+    @staticmethod
+    def from_model(width: int, values: list[ModelValue]) -> "Counterexample":
+        def ints(value: ModelValue) -> list[int]:
+            if isinstance(value, bool):
+                return []
+            if isinstance(value, int):
+                return [value]
+            return [i for field in value for i in ints(field)]
+
+        num_args = len(values) // 2
+        return Counterexample(
+            width,
+            [ints(value) for value in values[:num_args]],
+            [i for value in values[num_args:] for i in ints(value)],
+        )
+
+
 def verify_transfer_function(
     transfer_function: FuncOp,
     concrete_func: FuncOp,
@@ -376,83 +549,130 @@ def verify_transfer_function(
     min_verify_bits: int,
     max_verify_bits: int,
 ) -> int:
+    (unsound_width,) = verify_transfer_functions(
+        [transfer_function],
+        concrete_func,
+        helper_funcs,
+        ctx,
+        min_verify_bits,
+        max_verify_bits,
+    )
+    return unsound_width
+
+
+def verify_transfer_functions(
+    transfer_functions: list[FuncOp],
+    concrete_func: FuncOp,
+    helper_funcs: list[FuncOp],
+    ctx: Context,
+    min_verify_bits: int,
+    max_verify_bits: int,
+) -> list[int]:
+    """
+    Verify transfer functions of the same concrete function together, and return
+    the smallest unsound bitwidth of each of them, or 0 if it is sound.
+    See find_counterexamples.
+    """
+    return [
+        0 if counterexample is None else counterexample.width
+        for counterexample in find_counterexamples(
+            transfer_functions,
+            concrete_func,
+            helper_funcs,
+            ctx,
+            min_verify_bits,
+            max_verify_bits,
+        )
+    ]
+
+
+def find_counterexamples(
+    transfer_functions: list[FuncOp],
+    concrete_func: FuncOp,
+    helper_funcs: list[FuncOp],
+    ctx: Context,
+    min_verify_bits: int,
+    max_verify_bits: int,
+) -> list[Counterexample | None]:
+    """
+    Verify transfer functions of the same concrete function together, and return
+    a counterexample at the smallest unsound bitwidth of each of them, or None if
+    it is sound. The counterexample of a transfer function is unknown if the
+    solver gave up at a bitwidth before finding it unsound.
+
+    helper_funcs holds the functions called by any of the transfer functions.
+    At every bitwidth, the transfer functions that are still sound are checked in
+    a single solver session, where the shared arguments, concrete semantics and
+    constraints are only asserted once. Bitwidths up to the exhaustive_max_width
+    of the solver settings are checked on every input, and those up to the
+    bitblast_max_width are bit-blasted to SAT rather than solved by Z3's SMT
+    solver.
+    """
     is_custom_concrete_func = check_custom_concrete_func(concrete_func)
     (
         module_op,
         func_name_to_func,
-        transfer_function_obj,
+        transfer_function_objs,
         domain_constraint,
         instance_constraint,
     ) = build_init_module(
-        transfer_function, concrete_func, helper_funcs, ctx, is_custom_concrete_func
+        transfer_functions, concrete_func, helper_funcs, ctx, is_custom_concrete_func
     )
 
     FunctionCallInline(False, func_name_to_func).apply(ctx, module_op)
 
-    for width in range(min_verify_bits, max_verify_bits + 1):
-        smt_module = module_op.clone()
-
-        # expand for loops
-        unrollTransferLoop = UnrollTransferLoop(width)
-        assert isinstance(smt_module, ModuleOp)
-        unrollTransferLoop.apply(ctx, smt_module)
-        concrete_func_name: str = concrete_func.sym_name.data
-
-        if not is_custom_concrete_func:
-            tmp_concrete_func = None
-            for op in smt_module.ops:
-                # op is a transfer function
-                if isinstance(op, FuncOp) and "applied_to" in op.attributes:
-                    assert isa(
-                        applied_to := op.attributes["applied_to"], ArrayAttr[Attribute]
-                    )
-                    assert isinstance(applied_to.data[0], StringAttr)
-                    concrete_func_name = applied_to.data[0].data
-
-                    extra = None
-                    assert isa(
-                        applied_to := op.attributes["applied_to"], ArrayAttr[Attribute]
-                    )
-                    assert isinstance(applied_to.data[0], StringAttr)
-                    if len(applied_to.data) > 1:
-                        extra = applied_to.data[1]
-                        assert (
-                            isinstance(extra, IntegerAttr)
-                            and "only support for integer attr for the second applied arg for now"
-                        )
-                        extra = extra.value.data
-                    tmp_concrete_func = get_concrete_function(
-                        concrete_func_name, width, extra
+    funcs = {op.sym_name.data: op for op in module_op.ops if isinstance(op, FuncOp)}
+    concrete_func_name: str = concrete_func.sym_name.data
+    concrete_op_name: str | None = None
+    extra = None
+    if not is_custom_concrete_func:
+        for op in funcs.values():
+            # op is a transfer function
+            if "applied_to" in op.attributes:
+                assert isa(
+                    applied_to := op.attributes["applied_to"], ArrayAttr[Attribute]
+                )
+                assert isinstance(applied_to.data[0], StringAttr)
+                concrete_op_name = applied_to.data[0].data
+
+                extra = None
+                if len(applied_to.data) > 1:
+                    extra = applied_to.data[1]
+                    assert (
+                        isinstance(extra, IntegerAttr)
+                        and "only support for integer attr for the second applied arg for now"
                     )
-                    concrete_func_name = tmp_concrete_func.sym_name.data
-
-                    if len(applied_to.data) >= 2:
-                        concrete_func_name += str(extra)
-            assert tmp_concrete_func is not None
-            smt_module.body.block.add_op(tmp_concrete_func)
-
-        assert concrete_func_name is not None
-        lower_to_smt_module(smt_module, width, ctx)
+                    extra = extra.value.data
+        assert concrete_op_name is not None
 
-        func_name_to_smt_func: dict[str, DefineFunOp] = {}
-        for op in smt_module.ops:
-            if isinstance(op, DefineFunOp):
-                op_func_name = op.fun_name
-                assert op_func_name is not None
-                func_name = op_func_name.data
-                func_name_to_smt_func[func_name] = op
+    func_names = [func.sym_name.data for func in transfer_functions]
+    counterexamples: list[Counterexample | None] = [None] * len(transfer_functions)
 
-        func_name = transfer_function.sym_name.data
-        assert func_name is not None
-
-        smt_concrete_func = None
-        if concrete_func_name in func_name_to_smt_func:
-            smt_concrete_func = func_name_to_smt_func[concrete_func_name]
-        assert smt_concrete_func is not None
-
-        smt_transfer_function = None
-        if func_name in func_name_to_smt_func:
-            smt_transfer_function = func_name_to_smt_func[func_name]
+    for width in range(min_verify_bits, max_verify_bits + 1):
+        remaining = [i for i, cex in enumerate(counterexamples) if cex is None]
+        if not remaining:
+            break
+
+        # Only the transfer functions are lowered for every query, the other
+        # functions are the same for all candidates and their lowering is cached
+        if concrete_op_name is None:
+            smt_concrete_func = lower_function(
+                funcs[concrete_func_name], width, ctx, unroll_loops=True
+            )
+        else:
+            tmp_concrete_func = get_concrete_function(concrete_op_name, width, extra)
+            concrete_func_name = tmp_concrete_func.sym_name.data
+            if extra is not None:
+                concrete_func_name += str(extra)
+            smt_concrete_func = lower_function(
+                tmp_concrete_func, width, ctx, unroll_loops=True
+            )
+
+        func_name_to_smt_func = {
+            name: lower_function(funcs[name], width, ctx, unroll_loops=True)
+            for name in ["abs_op_constraint", "op_constraint"]
+            if name in funcs
+        }
 
         abs_op_constraint = func_name_to_smt_func.get("abs_op_constraint", None)
 
@@ -462,28 +682,35 @@ def verify_transfer_function(
         int_attr_arg = None
         int_attr_constraint = None
 
-        smt_transfer_function_obj = SMTTransferFunction(
-            transfer_function_obj,
-            func_name,
-            concrete_func_name,
-            abs_op_constraint,
-            op_constraint,
-            soundness_counterexample,
-            None,
-            int_attr_arg,
-            int_attr_constraint,
-            smt_transfer_function,
-            smt_concrete_func,
-        )
-
-        result = verify_smt_transfer_function(
-            smt_transfer_function_obj,
+        smt_transfer_function_objs = [
+            SMTTransferFunction(
+                transfer_function_objs[i],
+                func_names[i],
+                concrete_func_name,
+                abs_op_constraint,
+                op_constraint,
+                soundness_counterexample,
+                None,
+                int_attr_arg,
+                int_attr_constraint,
+                lower_transfer_function(funcs[func_names[i]], width, ctx),
+                smt_concrete_func,
+            )
+            for i in remaining
+        ]
+
+        results = find_smt_counterexamples(
+            smt_transfer_function_objs,
             domain_constraint,
             instance_constraint,
             ctx,
+            width,
         )
 
-        if not result:
-            return width
+        for i, (sound, values) in zip(remaining, results):
+            if sound is None:
+                counterexamples[i] = Counterexample(width, [], [], unknown=True)
+            elif not sound:
+                counterexamples[i] = Counterexample.from_model(width, values)
 
-    return 0
+    return counterexamples
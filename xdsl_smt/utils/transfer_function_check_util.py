@@ -29,6 +29,8 @@ from ..dialects.smt_dialect import (
     IteOp,
     DistinctOp,
     DeclareConstOp,
+    BoolType,
+    EvalOp,
 )
 from ..dialects.smt_bitvector_dialect import ConstantOp, NotOp, OrOp as BVOrOp
 from ..dialects.smt_utils_dialect import FirstOp, PairType
@@ -143,18 +145,18 @@ def int_attr_check(
         return [true_op, assert_op, CheckSatOp()]
 
 
-def forward_soundness_check(
+def _forward_soundness_premises(
     transfer_function: SMTTransferFunction,
     domain_constraint: FunctionCollection,
     instance_constraint: FunctionCollection,
     int_attr: dict[int, int],
-) -> list[Operation]:
+) -> tuple[list[Operation], list[SSAValue], list[SSAValue], SSAValue, SSAValue]:
     """
-    Returns a list of operations that checks the soundness for a forward transfer function.
-    This property checks for all concrete result, they must be included by the abstract value result
-    produced by the transfer function.
+    Returns the operations declaring abstract arguments, the concrete arguments they include, and
+    the concrete result on them, together with the abstract arguments, the concrete arguments,
+    the concrete result and the effect they are computed with. These only depend on the concrete function and the
+    constraints, not on the transfer function itself.
     """
-    assert transfer_function.is_forward
     abstract_func = transfer_function.transfer_function
     concrete_func = transfer_function.concrete_function
     abs_op_constraint = transfer_function.abstract_constraint
@@ -173,10 +175,8 @@ def forward_soundness_check(
 
     assert len(abs_args) == len(crt_args)
     arg_widths = get_argument_widths_with_effect(concrete_func)
-    result_width = get_result_width(concrete_func)
 
     effect = ConstantBoolOp(False)
-    constant_bv_0 = ConstantOp(0, 1)
     constant_bv_1 = ConstantOp(1, 1)
 
     abs_arg_include_crt_arg_constraints_ops: list[Operation] = []
@@ -209,41 +209,119 @@ def forward_soundness_check(
             op_constraint, crt_args, constant_bv_1, effect.res
         )
 
-    call_abs_func_op, call_abs_func_first_op = call_function_with_effect(
-        abstract_func, abs_args, effect.res
-    )
     call_crt_func_op, call_crt_func_first_op = call_function_with_effect(
         concrete_func, crt_args_with_poison, effect.res
     )
     call_crt_first_op = FirstOp(call_crt_func_first_op.res)
 
-    abs_result_not_include_crt_result_ops = call_function_and_assert_result_with_effect(
-        instance_constraint.getFunctionByWidth(result_width),
-        [call_abs_func_first_op.res, call_crt_first_op.res],
-        constant_bv_0,
-        effect.res,
-    )
-
     return (
         [effect]
         + abs_arg_ops
         + crt_arg_ops
         + crt_arg_first_ops
-        + [constant_bv_0, constant_bv_1]
+        + [constant_bv_1]
         + abs_domain_constraints_ops
         + abs_arg_include_crt_arg_constraints_ops
         + abs_arg_constraints_ops
         + crt_args_constraints_ops
-        + [
-            call_abs_func_op,
-            call_abs_func_first_op,
-            call_crt_func_op,
-            call_crt_func_first_op,
-            call_crt_first_op,
-        ]
-        + abs_result_not_include_crt_result_ops
-        + [CheckSatOp()]
+        + [call_crt_func_op, call_crt_func_first_op, call_crt_first_op],
+        abs_args,
+        crt_args_with_poison,
+        call_crt_first_op.res,
+        effect.res,
+    )
+
+
+def _forward_soundness_violation(
+    transfer_function: SMTTransferFunction,
+    instance_constraint: FunctionCollection,
+    abs_args: list[SSAValue],
+    crt_result: SSAValue,
+    effect: SSAValue,
+) -> list[Operation]:
+    """
+    Returns the operations asserting that the abstract result of the transfer function on
+    abs_args does not include crt_result.
+    """
+    abstract_func = transfer_function.transfer_function
+    concrete_func = transfer_function.concrete_function
+    assert abstract_func is not None
+    assert concrete_func is not None
+    result_width = get_result_width(concrete_func)
+
+    constant_bv_0 = ConstantOp(0, 1)
+    call_abs_func_op, call_abs_func_first_op = call_function_with_effect(
+        abstract_func, abs_args, effect
+    )
+    abs_result_not_include_crt_result_ops = call_function_and_assert_result_with_effect(
+        instance_constraint.getFunctionByWidth(result_width),
+        [call_abs_func_first_op.res, crt_result],
+        constant_bv_0,
+        effect,
     )
+    return [
+        constant_bv_0,
+        call_abs_func_op,
+        call_abs_func_first_op,
+    ] + abs_result_not_include_crt_result_ops
+
+
+def forward_soundness_check(
+    transfer_function: SMTTransferFunction,
+    domain_constraint: FunctionCollection,
+    instance_constraint: FunctionCollection,
+    int_attr: dict[int, int],
+) -> list[Operation]:
+    """
+    Returns a list of operations that checks the soundness for a forward transfer function.
+    This property checks for all concrete result, they must be included by the abstract value result
+    produced by the transfer function.
+    """
+    assert transfer_function.is_forward
+    premises_ops, abs_args, _, crt_result, effect = _forward_soundness_premises(
+        transfer_function, domain_constraint, instance_constraint, int_attr
+    )
+    violation_ops = _forward_soundness_violation(
+        transfer_function, instance_constraint, abs_args, crt_result, effect
+    )
+    return premises_ops + violation_ops + [CheckSatOp()]
+
+
+def forward_soundness_check_batch(
+    transfer_functions: list[SMTTransferFunction],
+    domain_constraint: FunctionCollection,
+    instance_constraint: FunctionCollection,
+    int_attr: dict[int, int],
+) -> tuple[list[Operation], list[SSAValue]]:
+    """
+    Returns a list of operations that checks the soundness of several forward transfer functions
+    of the same concrete function at once, and a boolean assumption per transfer function.
+    The arguments and their constraints are shared by all transfer functions, and the
+    counterexample to the i-th transfer function is only asserted under the i-th assumption,
+    so that each transfer function is sound iff the operations are unsat under its assumption.
+    The abstract and then the concrete arguments are evaluated, giving the counterexample to a
+    transfer function in the model of its assumption.
+    """
+    assert all(transfer_function.is_forward for transfer_function in transfer_functions)
+    premises_ops, abs_args, crt_args, crt_result, effect = _forward_soundness_premises(
+        transfer_functions[0], domain_constraint, instance_constraint, int_attr
+    )
+    result: list[Operation] = premises_ops + [
+        EvalOp(arg) for arg in abs_args + crt_args
+    ]
+    assumptions: list[SSAValue] = []
+    for transfer_function in transfer_functions:
+        violation_ops = _forward_soundness_violation(
+            transfer_function, instance_constraint, abs_args, crt_result, effect
+        )
+        assert_op = violation_ops.pop()
+        assert isinstance(assert_op, AssertOp)
+        assumption = DeclareConstOp(BoolType())
+        implies = ImpliesOp(assumption.res, assert_op.op)
+        assert_op.erase()
+        result += [assumption] + violation_ops + [implies, AssertOp(implies.result)]
+        assumptions.append(assumption.res)
+    return result, assumptions
 
 
 def backward_soundness_check(